@@ -0,0 +1,233 @@
+from abc import ABC, abstractmethod
+
+from config import SUPABASE_URL, SUPABASE_KEY, CHANGE_FEED
+from database_manager import DatabaseManager
+from menu_catalog import get_catalog, all_catalogs
+from menu_replica import REPLICA_TABLES, row_key, row_venue, key_record
+from models import Category, Dish
+
+# Отслеживаемые таблицы и их ключевые столбцы (у листов, файлов и администраторов — вместе с venue_id)
+WATCHED_TABLES = {table: key_column for table, (key_column, _) in REPLICA_TABLES.items()}
+
+# Как часто опрашивать базу, если Realtime недоступен (в секундах)
+POLL_INTERVAL = 30
+
+# Ключ в кэше DatabaseManager для строк справочных таблиц
+_CACHE_KEYS = {
+    'venues': lambda row: ('venues',),
+    'sheets': lambda row: ('sheet', row_venue(row), row['sheet_type']),
+    'files': lambda row: ('file', row_venue(row), row['file_type']),
+    'admins': lambda row: ('admins', row_venue(row)),
+}
+
+
+class ChangeEvent:
+    """Изменение строки в базе"""
+
+    __slots__ = ('table', 'type', 'record', 'old_record')
+
+    def __init__(self, table, type, record=None, old_record=None):
+        self.table = table
+        self.type = type  # 'INSERT', 'UPDATE' или 'DELETE'
+        self.record = record or {}
+        self.old_record = old_record or {}
+
+    def key(self):
+        """Значение ключевого столбца измененной строки (None, если его нет в событии)"""
+        key_column = WATCHED_TABLES.get(self.table)
+        if key_column is None:
+            return None
+        key = row_key(key_column, self.record) if self.record else None
+        return key if key is not None else row_key(key_column, self.old_record)
+
+    def __repr__(self):
+        return f"ChangeEvent({self.table}, {self.type}, key={self.key()!r})"
+
+
+def apply_change(event):
+    """Обновить копии данных в памяти по событию об изменении строки"""
+    if event.table not in WATCHED_TABLES:
+        return
+
+    key = event.key()
+
+    # Сначала локальная копия: из нее читаются все данные после сброса кэшей
+    DatabaseManager.apply_replica_change(event.table, event.type, event.record, key)
+
+    # У DELETE приходит только первичный ключ, без venue_id — удаляем из каталогов всех заведений.
+    # Строка, перенесенная в другое заведение, так же исчезает из прежнего каталога
+    if event.table == 'dishes':
+        venue_id = row_venue(event.record) if event.type != 'DELETE' and event.record else None
+        for catalog in all_catalogs():
+            if catalog.venue_id != venue_id:
+                catalog.remove_dish(key)
+        if venue_id is not None:
+            get_catalog(venue_id).upsert_dish(Dish.from_row(event.record))
+        return
+
+    if event.table == 'categories':
+        venue_id = row_venue(event.record) if event.type != 'DELETE' and event.record else None
+        for catalog in all_catalogs():
+            if catalog.venue_id != venue_id:
+                catalog.remove_category(key)
+        if venue_id is not None:
+            get_catalog(venue_id).upsert_category(Category.from_row(event.record))
+        return
+
+    # Заведения, листы, файлы, администраторы — сбрасываем кэш. Если ключ неизвестен, сбрасываем весь кэш
+    if key is None:
+        DatabaseManager.invalidate_cache()
+    else:
+        DatabaseManager.invalidate_cache(_CACHE_KEYS[event.table](event.record or event.old_record))
+
+
+def resync_all():
+    """Сбросить все копии данных — после подключения или пропуска событий"""
+    DatabaseManager.invalidate_cache()
+    for catalog in all_catalogs():
+        catalog.invalidate()
+
+
+class ChangeFeed(ABC):
+    """Источник событий об изменениях в базе.
+
+    start(handler) начинает доставлять ChangeEvent в handler, stop() — прекращает.
+    """
+
+    @abstractmethod
+    async def start(self, handler):
+        """Начать доставлять события в handler"""
+
+    async def stop(self):
+        pass
+
+
+class LocalChangeFeed(ChangeFeed):
+    """События внутри процесса: для тестов и для изменений, сделанных самим ботом"""
+
+    def __init__(self):
+        self._handlers = []
+
+    async def start(self, handler):
+        self._handlers.append(handler)
+
+    async def stop(self):
+        self._handlers.clear()
+
+    def publish(self, event):
+        for handler in list(self._handlers):
+            handler(event)
+
+
+class SupabaseRealtimeFeed(ChangeFeed):
+    """События Supabase Realtime (postgres_changes).
+
+    Таблицы должны быть добавлены в публикацию supabase_realtime. События,
+    отправленные, пока соединение было разорвано, не доставляются повторно,
+    поэтому после каждого (пере)подключения канала все копии перечитываются.
+    """
+
+    def __init__(self, url=SUPABASE_URL, key=SUPABASE_KEY, tables=WATCHED_TABLES):
+        self.url = url
+        self.key = key
+        self.tables = list(tables)
+        self._client = None
+        self._channel = None
+        self._handler = None
+
+    async def start(self, handler):
+        # Realtime есть только в асинхронном клиенте
+        from supabase import acreate_client
+
+        self._handler = handler
+        self._client = await acreate_client(self.url, self.key)
+        channel = self._client.channel("cache-invalidation")
+        for table in self.tables:
+            channel.on_postgres_changes("*", schema="public", table=table, callback=self._on_change)
+        await channel.subscribe(self._on_subscribe)
+        self._channel = channel
+
+    def _on_subscribe(self, state, error=None):
+        """Состояние канала: вызывается при подписке и при каждом переподключении"""
+        if state == 'SUBSCRIBED':
+            # События до подписки (или пока соединения не было) потеряны — перечитываем все
+            resync_all()
+            print("✅ Подписка на изменения в базе (Supabase Realtime) активна")
+        else:
+            print(f"⚠️ Канал Supabase Realtime: {getattr(state, 'value', state)}"
+                  + (f" ({error})" if error else ""))
+
+    def _on_change(self, payload):
+        data = payload.get('data', payload)
+        event = ChangeEvent(
+            data.get('table'),
+            data.get('type') or data.get('eventType'),
+            data.get('record') or data.get('new'),
+            data.get('old_record') or data.get('old')
+        )
+        try:
+            self._handler(event)
+        except Exception as e:
+            print(f"❌ Ошибка при обработке изменения {event}: {e}")
+
+    async def stop(self):
+        if self._client is not None:
+            await self._client.remove_all_channels()
+            self._client = None
+
+
+class PollingChangeFeed(ChangeFeed):
+    """Запасной вариант: события из фоновой синхронизации локальной копии.
+
+    Отдельного опроса нет: синхронизация (DatabaseManager.sync_replica) уже читает
+    строки, измененные после курсора (updated_at, ключ), и проверяет удаленные.
+    Найденные ею строки превращаются в INSERT/UPDATE, удаленные ключи — в DELETE.
+    Пока лента запущена, синхронизация идет раз в interval секунд.
+    """
+
+    def __init__(self, interval=POLL_INTERVAL, tables=WATCHED_TABLES):
+        self.interval = interval
+        self.tables = dict(tables)
+        self._handler = None
+
+    def on_sync(self, table, rows, known, removed):
+        """Изменения таблицы, найденные синхронизацией. Возвращает количество событий"""
+        key_column = self.tables.get(table)
+        if key_column is None or self._handler is None:
+            return 0
+        changes = 0
+        for row in rows:
+            event_type = 'UPDATE' if row_key(key_column, row) in known else 'INSERT'
+            self._handler(ChangeEvent(table, event_type, row))
+            changes += 1
+        for key in removed:
+            self._handler(ChangeEvent(table, 'DELETE', old_record=key_record(key_column, key)))
+            changes += 1
+        return changes
+
+    async def start(self, handler):
+        self._handler = handler
+        DatabaseManager.add_replica_listener(self.on_sync, self.interval)
+        print(f"✅ Изменения в базе отслеживаются синхронизацией локальной копии каждые {self.interval} с")
+
+    async def stop(self):
+        DatabaseManager.remove_replica_listener(self.on_sync)
+        self._handler = None
+
+
+async def start_change_feed(mode=CHANGE_FEED):
+    """Запустить отслеживание изменений; если Realtime недоступен — события из синхронизации локальной копии"""
+    if mode == 'off':
+        return None
+
+    if mode == 'realtime':
+        feed = SupabaseRealtimeFeed()
+        try:
+            await feed.start(apply_change)
+            return feed
+        except Exception as e:
+            print(f"⚠️ Supabase Realtime недоступен ({e}), переключаемся на опрос")
+
+    feed = PollingChangeFeed()
+    await feed.start(apply_change)
+    return feed
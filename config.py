@@ -11,6 +11,30 @@ SUPABASE_KEY = os.environ.get("SUPABASE_KEY") or os.getenv("SUPABASE_KEY")
 BOT_TOKEN = os.environ.get("BOT_TOKEN") or os.getenv("BOT_TOKEN")
 ADMIN_ID = int(os.environ.get("ADMIN_ID") or os.getenv("ADMIN_ID", 1466654401))
 
+# Заведение по умолчанию: к нему относятся строки без venue_id и чаты, где заведение еще не выбрано
+DEFAULT_VENUE = os.environ.get("DEFAULT_VENUE") or os.getenv("DEFAULT_VENUE", "main")
+
+# Папка для локальных файлов бота (очередь отзывов и т.п.)
+DATA_DIR = os.environ.get("DATA_DIR") or os.getenv("DATA_DIR", "data")
+
+# Источник событий об изменениях в базе: realtime (Supabase Realtime), polling (опрос по updated_at) или off
+CHANGE_FEED = os.environ.get("CHANGE_FEED") or os.getenv("CHANGE_FEED", "realtime")
+
+# Снимок меню для веб-сервера и других процессов (menu_snapshot.py): publish — бот пишет снимок,
+# read — каталог бота читает меню из снимка, а не из базы (дополнительные процессы бота), off — без снимка
+MENU_SNAPSHOT = os.environ.get("MENU_SNAPSHOT") or os.getenv("MENU_SNAPSHOT", "publish")
+
+# Сколько событий бот обрабатывает одновременно (события одного чата — всегда по очереди)
+MAX_CONCURRENT_UPDATES = int(os.environ.get("MAX_CONCURRENT_UPDATES") or os.getenv("MAX_CONCURRENT_UPDATES", 32))
+
+# Сколько секунд при остановке бота ждать обработки уже принятых событий (Railway дает процессу
+# время между SIGTERM и SIGKILL); остальное время остановки — запись очередей и состояния (warm_state.py)
+SHUTDOWN_DRAIN_TIMEOUT = float(os.environ.get("SHUTDOWN_DRAIN_TIMEOUT") or os.getenv("SHUTDOWN_DRAIN_TIMEOUT", 5))
+
+# Порт для /healthz и /readyz процесса бота (на Railway — PORT сервиса); без него проверки не запускаются
+HEALTH_PORT = os.environ.get("HEALTH_PORT") or os.getenv("PORT")
+HEALTH_PORT = int(HEALTH_PORT) if HEALTH_PORT else None
+
 # Проверка обязательных переменных
 missing_vars = []
 if not SUPABASE_URL:
@@ -0,0 +1,212 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Сколько живет каждое состояние диалога (в секундах). Ожидание ввода снимается
+# быстро, чтобы забытый флаг не перехватил сообщение через несколько часов
+FLOW_TTLS = {
+    'waiting_for_feedback': 15 * 60,
+    'selected_table': 15 * 60,
+    'waiting_for_sheet_update': 10 * 60,
+    'waiting_for_schedule': 10 * 60,
+    'waiting_for_stop_list': 10 * 60,
+    'feedback_list': 60 * 60,
+    'feedback_page_ids': 60 * 60,
+    'menu_filter': 24 * 60 * 60,
+}
+DEFAULT_FLOW_TTL = 60 * 60
+
+# Состояния, которые ждут от пользователя текст или фото
+INPUT_FLOWS = ('waiting_for_feedback', 'selected_table', 'waiting_for_sheet_update', 'waiting_for_schedule',
+               'waiting_for_stop_list')
+
+# Сколько пользователей держать в памяти; при переполнении вытесняются давно неактивные
+MAX_USERS = 10000
+
+# Как часто удалять истекшие состояния (в секундах)
+SWEEP_INTERVAL = 60
+
+_MISSING = object()
+
+
+def _approx_size(value, seen=None):
+    """Примерный размер значения в байтах (с вложенными словарями, списками и __slots__)"""
+    if seen is None:
+        seen = set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_approx_size(k, seen) + _approx_size(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(_approx_size(item, seen) for item in value)
+    else:
+        for slot in getattr(type(value), '__slots__', ()):
+            if hasattr(value, slot):
+                size += _approx_size(getattr(value, slot), seen)
+    return size
+
+
+class ConversationState:
+    """Состояние диалогов с пользователями вместо context.user_data.
+
+    У каждого состояния свой срок жизни (FLOW_TTLS): истекшее считается
+    отсутствующим и удаляется фоновой очисткой. Пользователей в памяти не
+    больше max_users — при переполнении вытесняются те, кто дольше всех не
+    писал боту, поэтому память не растет вместе с числом гостей за день.
+    """
+
+    def __init__(self, max_users=MAX_USERS, ttls=None):
+        self.max_users = max_users
+        self.ttls = FLOW_TTLS if ttls is None else ttls
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evicted_users': 0}
+
+    def _entries(self, user_id, create=False):
+        """Состояния пользователя (под блокировкой); отмечает пользователя как активного"""
+        entries = self._users.get(user_id)
+        if entries is None:
+            if not create:
+                return None
+            entries = self._users[user_id] = {}
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+                self._stats['evicted_users'] += 1
+        else:
+            self._users.move_to_end(user_id)
+        return entries
+
+    def _live(self, entries, user_id, key, now):
+        value, expires_at = entries.get(key, (_MISSING, 0))
+        if value is _MISSING:
+            return _MISSING
+        if expires_at <= now:
+            del entries[key]
+            self._stats['expired'] += 1
+            if not entries:
+                del self._users[user_id]
+            return _MISSING
+        return value
+
+    def get(self, user_id, key, default=None):
+        with self._lock:
+            entries = self._entries(user_id)
+            value = _MISSING if entries is None else self._live(entries, user_id, key, time.monotonic())
+            if value is _MISSING:
+                self._stats['misses'] += 1
+                return default
+            self._stats['hits'] += 1
+            return value
+
+    def set(self, user_id, key, value):
+        """Сохранить состояние; срок жизни отсчитывается заново"""
+        ttl = self.ttls.get(key, DEFAULT_FLOW_TTL)
+        with self._lock:
+            self._entries(user_id, create=True)[key] = (value, time.monotonic() + ttl)
+
+    def setdefault(self, user_id, key, factory):
+        """Текущее состояние или новое из factory(); срок жизни продлевается при каждом обращении"""
+        with self._lock:
+            entries = self._entries(user_id, create=True)
+            value = self._live(entries, user_id, key, time.monotonic())
+            if value is _MISSING:
+                value = factory()
+                # _live мог удалить опустевшего пользователя
+                entries = self._entries(user_id, create=True)
+            entries[key] = (value, time.monotonic() + self.ttls.get(key, DEFAULT_FLOW_TTL))
+            return value
+
+    def pop(self, user_id, key, default=None):
+        with self._lock:
+            entries = self._entries(user_id)
+            if entries is None:
+                return default
+            value = self._live(entries, user_id, key, time.monotonic())
+            if value is _MISSING:
+                return default
+            del entries[key]
+            if not entries:
+                del self._users[user_id]
+            return value
+
+    def cancel_input(self, user_id):
+        """Перестать ждать ввода от пользователя (он ушел в другое меню)"""
+        for key in INPUT_FLOWS:
+            self.pop(user_id, key)
+
+    def sweep(self):
+        """Удалить истекшие состояния. Возвращает число удаленных"""
+        now = time.monotonic()
+        removed = 0
+        with self._lock:
+            for user_id in list(self._users):
+                entries = self._users[user_id]
+                for key in [key for key, (_, expires_at) in entries.items() if expires_at <= now]:
+                    del entries[key]
+                    removed += 1
+                if not entries:
+                    del self._users[user_id]
+            self._stats['expired'] += removed
+        return removed
+
+    def export(self):
+        """Живые состояния для сохранения между запусками (warm_state.py):
+        [(user_id, ключ, значение, сколько секунд осталось жить)], давно неактивные пользователи — первыми"""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                (user_id, key, value, expires_at - now)
+                for user_id, entries in self._users.items()
+                for key, (value, expires_at) in entries.items()
+                if expires_at > now
+            ]
+
+    def restore(self, entries):
+        """Вернуть состояния из export(). Истекшие пропускаются, срок жизни не длиннее FLOW_TTLS;
+        состояния, появившиеся после запуска, не перезаписываются. Возвращает число восстановленных"""
+        now = time.monotonic()
+        restored = 0
+        with self._lock:
+            for user_id, key, value, ttl_left in entries:
+                ttl_left = min(ttl_left, self.ttls.get(key, DEFAULT_FLOW_TTL))
+                if ttl_left <= 0:
+                    continue
+                user_entries = self._entries(user_id, create=True)
+                if key not in user_entries:
+                    user_entries[key] = (value, now + ttl_left)
+                    restored += 1
+        return restored
+
+    def start(self, interval=SWEEP_INTERVAL):
+        """Фоновая очистка истекших состояний"""
+
+        def sweep_loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print(f"❌ Ошибка при очистке состояний диалогов: {e}")
+
+        threading.Thread(target=sweep_loop, daemon=True).start()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['users'] = len(self._users)
+            stats['max_users'] = self.max_users
+            flows = {}
+            for entries in self._users.values():
+                for key in entries:
+                    flows[key] = flows.get(key, 0) + 1
+            stats['flows'] = flows
+            stats['entries'] = sum(flows.values())
+            stats['approx_bytes'] = _approx_size(self._users)
+        return stats
+
+
+# Состояние диалогов для всего процесса
+conversation_state = ConversationState()
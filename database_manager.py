@@ -1,81 +1,798 @@
-from config import supabase, ADMIN_ID
+from config import supabase, ADMIN_ID, DATA_DIR, DEFAULT_VENUE
+from single_flight import SingleFlight
+from menu_replica import MenuReplica, REPLICA_TABLES, key_record, row_key, row_venue
+from ttl_cache import TTLCache
+from menu_filters import ALLERGENS
+from feedback_rollups import feedback_rollups, bucket_key
+from models import Category, Dish, Feedback, Sheet, StoredFile, Venue, LOCAL_TZ
+import itertools
+import json
+import os
 import threading
 import time
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import pytz
 
+# Одновременные одинаковые запросы на чтение меню выполняются один раз
+_single_flight = SingleFlight()
+
+# Заведения, листы, файлы и администраторы меняются редко: держим их в памяти,
+# а об изменениях в базе узнаем из change_feed. Ключи кэша включают заведение,
+# поэтому один кэш (и один клиент Supabase) обслуживает все заведения
+REFERENCE_CACHE_TTL = 600
+_reference_cache = TTLCache(REFERENCE_CACHE_TTL)
+
+# Заведение по умолчанию, если таблицы venues нет или она пуста
+DEFAULT_VENUE_NAME = "Ресторан"
+
+# Локальная копия меню и справочных таблиц: все чтения идут из нее,
+# а фоновая синхронизация догоняет Supabase по updated_at
+REPLICA_PATH = os.path.join(DATA_DIR, "menu_replica.sqlite3")
+REPLICA_SYNC_INTERVAL = 60
+_replica = MenuReplica(REPLICA_PATH)
+
+# Таблицы без столбца updated_at — их синхронизируем целиком
+_full_sync_tables = set()
+
+# Кому сообщать о строках, найденных синхронизацией (опрос изменений, change_feed.PollingChangeFeed),
+# и как часто синхронизировать: подписчик может попросить чаще, чем REPLICA_SYNC_INTERVAL
+_replica_listeners = []
+_replica_sync_interval = REPLICA_SYNC_INTERVAL
+_replica_sync_wakeup = threading.Event()
+
+# Сколько строк отправлять одним запросом при массовой записи
+BULK_BATCH_SIZE = 500
+
+# PostgREST отдает не больше 1000 строк на запрос (max-rows по умолчанию): большие выборки читаем страницами
+SELECT_PAGE_SIZE = 1000
+
+# Сколько отзывов читать одним запросом при пересчете статистики
+FEEDBACK_PAGE_SIZE = 1000
+
+
+# Время приготовления блюд, у которых не заполнен столбец dishes.cooking_time.
+# Заполнить столбец можно через menu_io.py: экспорт подставляет эти значения
+DEFAULT_COOKING_TIME = 15
+DEFAULT_COOKING_TIMES = {
+    # Закуски
+    'Чиз кимчи ролл': 20,
+    'Гедза': 20,
+    'Пегодя': 30,
+    'Дамплинги': 30,
+    'Запеченые мидии': 25,
+    'Токпоки': 20,
+    'Токпоки чиз': 15,
+    'Токпокки с беконом в сливочном соусе': 20,
+    'Хемуль токпоки': 20,
+    'Куриные крылья по корейски': 20,
+    'Кимпап с лососем': 20,
+    'Кимпап': 20,
+    'Кимпаб с креветкой': 20,
+    'Кимпаб с курицей': 20,
+    'Морепродукты в сливочном соусе': 20,
+    'Сунде': 20,
+    'Чирим куби': 20,
+    # Супы - все 20 минут
+    'Кукси': 20,
+    'Кальбитан': 20,
+    'Юккедян': 20,
+    'Тямпон': 20,
+    'Говяжий бульон': 20,
+    'Том ям': 20,
+    'Солонтан': 20,
+    'Кимчи тиге': 20,
+    'Кимчи рамен': 20,
+    'Тубу тиге': 20,
+    'Рыбный суп': 20,
+    'Хемуль тендян тиге': 20,
+    'Ккори комптан': 20,
+    'Суп грибной с лапшой': 20,
+    # Горячие блюда
+    'Сями по-домашнему': 35,
+    'Кальби поккым': 20,
+    'Одино поккым': 20,
+    'Согоги поккым': 20,
+    'Чикен ви': 20,
+    'Пулькоги': 20,
+    'Медальоны из говядины': 30,
+    'Теди кальби': 20,
+    'Самгепсаль': 30,
+    'Кимчи чеюк поккым': 20,
+    'Чок паль': 20,
+    'Тубу со свининой': 20,
+    'Мясо по-домашнему': 20,
+    'Утка по-корейски': 20,
+    'Утка в фирменном соусе': 30,
+    'Свиная грудинка': 20,
+    'Лосось том ям': 20,
+    'Спайси чиккен': 20,
+    'Кади поккым': 25,
+    'Лосось терияки': 40,
+    'Сибас': 35,
+    'Дорадо': 35,
+    'Ла кальби': 30,
+    'Поссам': 30,
+    'Свинина в кисло сладком соусе': 30,
+    # Блюда с рисом
+    'Пибимпаб': 20,
+    'Чиккен пибимпаб': 20,
+    'Пулькоги пибимпаб': 20,
+    'Кимчи пибимпаб': 20,
+    'Чиз кимчи пибимпаб': 20,
+    'Сеу поккым паб': 20,
+    'Хемуль поккым': 20,
+    'Бургер с курицей': 30,
+    'Бургер с лососем': 30,
+    'Бургер с говядиной': 30,
+    # Блюда с лапшой
+    'Лапша с морепродуктами': 20,
+    'Лапша с курицей': 20,
+    'Лапша с говядиной': 20,
+    'Чапче': 20,
+    'Лапша том ям': 20,
+    # Десерты
+    'Чизкейк классический': 10,
+    'Чизкейк запеченый': 10,
+    'Медовый': 10,
+    'Штрудель яблочный': 40,
+    'Мороженое': 15,
+    'Шоколадный фондан': 15,
+    'Жаренное мороженое': 15,
+    'Моти вишня/манго-маракуй/малина': 10,
+    'Сладкий ролл': 20,
+    # Роллы - все 20 минут
+    'Бали': 20,
+    'Одзу': 20,
+    'Азиатский': 20,
+    'Риет ролл': 20,
+    'Ассан': 20,
+    'Грин': 20,
+    'Голден маки': 20,
+    'Кабуки': 20,
+    'Яки сяке рору': 20,
+    'Йоджи': 20,
+    'Калифорния с лососем': 20,
+    'Калифорния с креветками': 20,
+    'Калифорния с угрем': 20,
+    'Канада': 20,
+    'Мега': 20,
+    'Норито': 20,
+    'Роял': 20,
+    'Сицилийский': 20,
+    'Угорь в кунжуте': 20,
+    'Филадельфия': 20,
+    'Футомаки': 20,
+    'Эби унаги маки': 20,
+    'Сяке кадо': 20,
+    'Дракон маки': 20,
+    'Пинк сяке рору': 20,
+    'Кайсен маки': 20,
+    'Дон бекон': 20,
+    'Аляска': 20,
+    'Прайм ролл': 20,
+    'Чеддер ролл': 20,
+    # Бизнес ланч - все 15 минут
+    'Коу Слоу С Запеченым Лососем': 15,
+    'Коу слоу': 15,
+    'Меги ча': 15,
+    'Спаржа': 15,
+    'Кимчи': 15,
+    'Морковь ча': 15,
+    'Салат из стеклянной лапши': 15,
+    'Салат из куриной грудки с овощами': 15,
+    'Рамен': 15,
+    'Борщ': 15,
+    'Кукси (холодный суп)': 15,
+    'Рыбный суп': 15,
+    'Пибимпаб (без бульона)': 15,
+    'Курочка В Томатном Соусе': 15,
+    'Отбивная Из Свинины': 15,
+    'Удон С Курицей': 15,
+    'Сэндвич С Запеченым Лососем': 15,
+}
+
 
 class DatabaseManager:
 
     @staticmethod
-    def get_categories():
-        """Получить все категории"""
+    def get_categories(venue_id=DEFAULT_VENUE):
+        """Получить все категории заведения"""
         try:
-            response = supabase.table("categories").select("*").order("sort_order").execute()
-            return response.data
+            return _single_flight.do(('categories', venue_id), lambda: DatabaseManager._fetch_categories(venue_id))
         except Exception as e:
             print(f"Error getting categories: {e}")
             return []
 
+    @staticmethod
+    def _fetch_categories(venue_id):
+        if _replica.is_ready():
+            rows = _replica.get_categories(venue_id)
+        else:
+            rows = (supabase.table("categories")
+                    .select("*")
+                    .eq("venue_id", venue_id)
+                    .order("sort_order")
+                    .execute()).data
+        return [Category.from_row(row) for row in rows]
+
     @staticmethod
     def get_dishes_by_category(category_id):
         """Получить блюда по категории"""
         try:
-            response = (supabase.table("dishes")
-                        .select("*")
-                        .eq("category_id", category_id)
-                        .eq("is_available", True)
-                        .order("sort_order")
-                        .execute())
-            return response.data
+            return _single_flight.do(
+                ('dishes_by_category', category_id),
+                lambda: DatabaseManager._fetch_dishes_by_category(category_id)
+            )
         except Exception as e:
             print(f"Error getting dishes: {e}")
             return []
 
+    @staticmethod
+    def _fetch_dishes_by_category(category_id):
+        if _replica.is_ready():
+            rows = _replica.get_dishes_by_category(category_id)
+        else:
+            rows = (supabase.table("dishes")
+                    .select("*")
+                    .eq("category_id", category_id)
+                    .eq("is_available", True)
+                    .order("sort_order")
+                    .execute()).data
+        return [Dish.from_row(row) for row in rows]
+
+    @staticmethod
+    def get_all_dishes(venue_id=DEFAULT_VENUE):
+        """Получить все блюда заведения, включая недоступные"""
+        try:
+            return _single_flight.do(('all_dishes', venue_id), lambda: DatabaseManager._fetch_all_dishes(venue_id))
+        except Exception as e:
+            print(f"Error getting all dishes: {e}")
+            return []
+
+    @staticmethod
+    def _fetch_all_dishes(venue_id):
+        if _replica.is_ready():
+            rows = _replica.get_all_dishes(venue_id)
+        else:
+            rows = supabase.table("dishes").select("*").eq("venue_id", venue_id).order("sort_order").execute().data
+        return [Dish.from_row(row) for row in rows]
+
     @staticmethod
     def get_dish(dish_id):
         """Получить блюдо по ID"""
         try:
-            response = supabase.table("dishes").select("*").eq("id", dish_id).execute()
-            return response.data[0] if response.data else None
+            return _single_flight.do(('dish', dish_id), lambda: DatabaseManager._fetch_dish(dish_id))
         except Exception as e:
             print(f"Error getting dish: {e}")
             return None
 
     @staticmethod
-    def get_sheet(sheet_type):
+    def _fetch_dish(dish_id):
+        if _replica.is_ready():
+            row = _replica.get_row('dishes', dish_id)
+        else:
+            rows = supabase.table("dishes").select("*").eq("id", dish_id).execute().data
+            row = rows[0] if rows else None
+        return Dish.from_row(row) if row else None
+
+    @staticmethod
+    def set_dishes_availability(dish_ids, is_available, venue_id=DEFAULT_VENUE):
+        """Поставить блюда заведения на стоп (is_available=False) или вернуть в меню одним запросом.
+
+        Возвращает измененные блюда (models.Dish) или None при ошибке базы.
+        """
+        if not dish_ids:
+            return []
+        try:
+            response = (supabase.table("dishes")
+                        .update({"is_available": is_available})
+                        .in_("id", list(dish_ids))
+                        .eq("venue_id", venue_id)
+                        .execute())
+        except Exception as e:
+            print(f"❌ Ошибка при изменении наличия блюд: {e}")
+            return None
+
+        rows = response.data or []
+        print(f"✅ {'Возвращено в меню' if is_available else 'Поставлено на стоп'}: {len(rows)} блюд")
+        # Ответ на update — сами строки: локальную копию обновляем без повторного чтения
+        try:
+            if rows:
+                _replica.upsert_rows('dishes', rows)
+        except Exception as e:
+            print(f"❌ Ошибка при обновлении локальной копии dishes: {e}")
+        return [Dish.from_row(row) for row in rows]
+
+    @staticmethod
+    def ping():
+        """Проверка связи с Supabase (для /readyz)"""
+        try:
+            supabase.table("categories").select("id").limit(1).execute()
+            return True
+        except Exception as e:
+            print(f"❌ Supabase недоступен: {e}")
+            return False
+
+    # --- ЗАВЕДЕНИЯ ---
+
+    @staticmethod
+    def get_venues():
+        """Все заведения по порядку; без таблицы venues — одно заведение по умолчанию.
+
+        Если список прочитать не удалось, отдается прежний (даже устаревший): при сбое
+        базы чаты не переключаются на заведение по умолчанию.
+        """
+        try:
+            return DatabaseManager._cached(('venues',), DatabaseManager._fetch_venues)
+        except Exception as e:
+            print(f"❌ Ошибка при получении списка заведений: {e}")
+            return _reference_cache.peek(('venues',)) or [Venue(DEFAULT_VENUE, DEFAULT_VENUE_NAME)]
+
+    @staticmethod
+    def venues_loaded():
+        """Список заведений уже в кэше: get_venues() не пойдет ни в базу, ни в локальную копию"""
+        return _reference_cache.has(('venues',))
+
+    @staticmethod
+    def _fetch_venues():
+        """Заведения из локальной копии или из Supabase. Ошибка базы пробрасывается — такой
+        результат не кэшируется; одно заведение по умолчанию — только если таблицы venues нет"""
+        if _replica.is_ready():
+            rows = _replica.get_venues()
+        else:
+            try:
+                rows = supabase.table("venues").select("*").order("sort_order").execute().data
+            except Exception as e:
+                if not _is_missing_table(e):
+                    raise
+                print(f"ℹ️ Таблицы venues нет ({e}), используется одно заведение")
+                rows = []
+        return [Venue.from_row(row) for row in rows] or [Venue(DEFAULT_VENUE, DEFAULT_VENUE_NAME)]
+
+    @staticmethod
+    def restore_venues(venues):
+        """Положить в кэш список заведений, сохраненный прошлым запуском (warm_state.py)"""
+        if venues:
+            _reference_cache.set(('venues',), venues)
+
+    @staticmethod
+    def refresh_venues():
+        """Перечитать список заведений, не сбрасывая кэш: до ответа базы читатели видят прежний"""
+        try:
+            _reference_cache.set(('venues',), DatabaseManager._fetch_venues())
+        except Exception as e:
+            print(f"❌ Ошибка при обновлении списка заведений: {e}")
+        return DatabaseManager.get_venues()
+
+    @staticmethod
+    def get_venue(venue_id):
+        """Заведение по id (None, если такого нет)"""
+        return next((venue for venue in DatabaseManager.get_venues() if venue.id == venue_id), None)
+
+    @staticmethod
+    def get_default_venue():
+        venues = DatabaseManager.get_venues()
+        return next((venue for venue in venues if venue.id == DEFAULT_VENUE), venues[0])
+
+    @staticmethod
+    def venue_timezone(venue_id):
+        """Часовой пояс заведения (для неизвестного заведения — часовой пояс по умолчанию)"""
+        venue = DatabaseManager.get_venue(venue_id)
+        return venue.tz if venue else LOCAL_TZ
+
+    @staticmethod
+    def get_single_flight_stats():
+        """Сколько запросов на чтение было объединено"""
+        return _single_flight.get_stats()
+
+    @staticmethod
+    def _cached(key, fetch):
+        """Значение из кэша справочных данных; одновременные промахи объединяются в один запрос"""
+        return _reference_cache.get(key, lambda: _single_flight.do(key, fetch))
+
+    @staticmethod
+    def invalidate_cache(key=None):
+        """Сбросить кэш справочных данных: ('sheet', заведение, тип), ('file', заведение, тип),
+        ('admins', заведение), ('venues',) или весь"""
+        _reference_cache.invalidate(key)
+
+    @staticmethod
+    def get_cache_stats():
+        return _reference_cache.get_stats()
+
+    # --- ДАННЫЕ ДЛЯ ОТСЛЕЖИВАНИЯ ИЗМЕНЕНИЙ ---
+
+    @staticmethod
+    def get_rows_changed_since(table, cursor, columns="*"):
+        """Строки таблицы локальной копии, измененные после cursor, по порядку (updated_at, ключ).
+
+        cursor — (updated_at последней полученной строки, ключи полученных строк с этим updated_at)
+        или None (все строки). Строки с тем же updated_at, что у курсора, запрашиваются снова: пачка,
+        записанная одним запросом, получает одно значение now(), и строгое сравнение пропустило бы
+        ее остаток. Уже полученные из них отбрасываются по ключам курсора. Читается страницами
+        по SELECT_PAGE_SIZE.
+        """
+        key_column = REPLICA_TABLES[table][0]
+        key_columns = list(key_column) if isinstance(key_column, tuple) else [key_column]
+        since, seen = cursor or (None, ())
+        received = []
+        try:
+            page_since, skip = since, 0
+            while True:
+                query = supabase.table(table).select(columns).order("updated_at")
+                for column in key_columns:
+                    query = query.order(column)
+                if page_since:
+                    query = query.gte("updated_at", page_since)
+                page = query.range(skip, skip + SELECT_PAGE_SIZE - 1).execute().data
+                received.extend(page)
+                if len(page) < SELECT_PAGE_SIZE:
+                    break
+                # Следующая страница начинается с updated_at последней строки: строки, измененные
+                # во время чтения, уходят в конец и не сдвигают еще не прочитанные
+                last = page[-1].get('updated_at')
+                if last is None:
+                    skip = len(received)
+                    continue
+                if last != page_since:
+                    page_since, skip = last, 0
+                skip += sum(1 for row in page if row.get('updated_at') == page_since)
+        except Exception as e:
+            print(f"❌ Ошибка при получении изменений таблицы {table}: {e}")
+            return None
+
+        if since is None or not seen:
+            return received
+        seen = set(seen)
+        return [row for row in received
+                if row.get('updated_at') != since or row_key(key_column, row) not in seen]
+
+    @staticmethod
+    def _select_pages(make_query):
+        """Все строки запроса страницами по SELECT_PAGE_SIZE; make_query() строит упорядоченный запрос"""
+        rows = []
+        while True:
+            page = make_query().range(len(rows), len(rows) + SELECT_PAGE_SIZE - 1).execute().data
+            rows.extend(page)
+            if len(page) < SELECT_PAGE_SIZE:
+                return rows
+
+    @staticmethod
+    def _key_columns(table):
+        key_column = REPLICA_TABLES[table][0] if table in REPLICA_TABLES else 'id'
+        return list(key_column) if isinstance(key_column, tuple) else [key_column]
+
+    @staticmethod
+    def get_all_rows(table, venue_id=None, missing_ok=False):
+        """Все строки таблицы (или только строки заведения) напрямую из Supabase.
+        missing_ok — если таблицы нет, вернуть пустой список, а не None"""
+
+        def make_query():
+            query = supabase.table(table).select("*")
+            if venue_id is not None:
+                query = query.eq("venue_id", venue_id)
+            for column in DatabaseManager._key_columns(table):
+                query = query.order(column)
+            return query
+
+        try:
+            return DatabaseManager._select_pages(make_query)
+        except Exception as e:
+            if missing_ok and _is_missing_table(e):
+                return []
+            print(f"❌ Ошибка при получении таблицы {table}: {e}")
+            return None
+
+    @staticmethod
+    def get_row_keys(table, key_column):
+        """Множество ключей всех строк таблицы (чтобы заметить удаленные строки); ключи — как в row_key.
+
+        Читается страницами, поэтому при изменениях во время чтения может оказаться неполным:
+        отсутствие ключа проверяйте через get_existing_keys, прежде чем удалять строку.
+        """
+        columns = list(key_column) if isinstance(key_column, tuple) else [key_column]
+
+        def make_query():
+            query = supabase.table(table).select(",".join(columns))
+            for column in columns:
+                query = query.order(column)
+            return query
+
+        try:
+            return {row_key(key_column, row) for row in DatabaseManager._select_pages(make_query)}
+        except Exception as e:
+            print(f"❌ Ошибка при получении ключей таблицы {table}: {e}")
+            return None
+
+    @staticmethod
+    def get_existing_keys(table, key_column, keys):
+        """Какие из ключей (как в row_key) есть в таблице — точечными запросами пачками. None при ошибке"""
+        keys = list(keys)
+        columns = list(key_column) if isinstance(key_column, tuple) else [key_column]
+        # У составного ключа ищем по заведению: в ключе все значения — строки, а листов,
+        # файлов и администраторов у заведения немного
+        lookup = columns[0]
+        values = [key_record(key_column, key)[lookup] for key in keys]
+        if isinstance(key_column, tuple):
+            values = list(set(values))
+        existing = set()
+        try:
+            for start in range(0, len(values), BULK_BATCH_SIZE):
+                response = (supabase.table(table)
+                            .select(",".join(columns))
+                            .in_(lookup, values[start:start + BULK_BATCH_SIZE])
+                            .execute())
+                existing.update(row_key(key_column, row) for row in response.data)
+            return existing & set(keys)
+        except Exception as e:
+            print(f"❌ Ошибка при проверке ключей таблицы {table}: {e}")
+            return None
+
+    @staticmethod
+    def get_key_venues(table, key_column, keys):
+        """{ключ: заведение} для тех ключей из списка, что уже есть в таблице (пачками). None при ошибке"""
+        keys = list(keys)
+        owners = {}
+        try:
+            for start in range(0, len(keys), BULK_BATCH_SIZE):
+                response = (supabase.table(table)
+                            .select(f"{key_column},venue_id")
+                            .in_(key_column, keys[start:start + BULK_BATCH_SIZE])
+                            .execute())
+                owners.update({row[key_column]: row_venue(row) for row in response.data})
+            return owners
+        except Exception as e:
+            print(f"❌ Ошибка при проверке ключей таблицы {table}: {e}")
+            return None
+
+    # --- МАССОВАЯ ЗАПИСЬ (ИМПОРТ МЕНЮ) ---
+
+    @staticmethod
+    def upsert_rows(table, rows, on_conflict):
+        """Вставить или обновить строки пачками по BULK_BATCH_SIZE (один запрос на пачку).
+
+        Возвращает записанные строки или None при ошибке.
+        """
+        written = []
+        try:
+            for start in range(0, len(rows), BULK_BATCH_SIZE):
+                batch = rows[start:start + BULK_BATCH_SIZE]
+                response = supabase.table(table).upsert(batch, on_conflict=on_conflict).execute()
+                written.extend(response.data)
+            return written
+        except Exception as e:
+            print(f"❌ Ошибка при записи строк в таблицу {table}: {e}")
+            return None
+
+    @staticmethod
+    def insert_rows(table, rows):
+        """Вставить новые строки (ключ назначит база) пачками. Возвращает вставленные строки или None"""
+        written = []
+        try:
+            for start in range(0, len(rows), BULK_BATCH_SIZE):
+                response = supabase.table(table).insert(rows[start:start + BULK_BATCH_SIZE]).execute()
+                written.extend(response.data)
+            return written
+        except Exception as e:
+            print(f"❌ Ошибка при вставке строк в таблицу {table}: {e}")
+            return None
+
+    @staticmethod
+    def delete_rows(table, key_column, keys):
+        """Удалить строки по списку ключей пачками"""
+        keys = list(keys)
+        try:
+            for start in range(0, len(keys), BULK_BATCH_SIZE):
+                supabase.table(table).delete().in_(key_column, keys[start:start + BULK_BATCH_SIZE]).execute()
+            return True
+        except Exception as e:
+            print(f"❌ Ошибка при удалении строк из таблицы {table}: {e}")
+            return False
+
+    # --- ЛОКАЛЬНАЯ КОПИЯ (РЕПЛИКА) ---
+
+    @staticmethod
+    def sync_replica():
+        """Догнать локальную копию: новые и измененные строки по (updated_at, ключ), удаленные — по ключам"""
+        for table, (key_column, _) in REPLICA_TABLES.items():
+            try:
+                DatabaseManager._sync_replica_table(table, key_column)
+            except Exception as e:
+                print(f"❌ Ошибка при синхронизации локальной копии таблицы {table}: {e}")
+
+    @staticmethod
+    def _sync_replica_table(table, key_column):
+        known = _replica.get_keys(table)
+        if table in _full_sync_tables:
+            rows = None
+        else:
+            cursor = _parse_cursor(_replica.get_cursor(table))
+            rows = DatabaseManager.get_rows_changed_since(table, cursor)
+
+        if rows is None:
+            # Нет столбца updated_at (или ошибка) — перечитываем таблицу целиком
+            # Таблицы venues может не быть (бот с одним заведением) — тогда копия просто пустая
+            rows = DatabaseManager.get_all_rows(table, missing_ok=(table == 'venues'))
+            if rows is None:
+                return
+            _full_sync_tables.add(table)
+            _replica.replace_table(table, rows)
+            _replica.mark_synced(table, None)
+            if table in ('venues', 'sheets', 'files', 'admins'):
+                _reference_cache.invalidate()
+            return
+
+        if rows:
+            _replica.upsert_rows(table, rows)
+            with_time = [row for row in rows if row.get('updated_at')]
+            if with_time:
+                last = with_time[-1]['updated_at']
+                seen = [row_key(key_column, row) for row in with_time if row['updated_at'] == last]
+                if cursor and cursor[0] == last:
+                    seen = list(cursor[1]) + [key for key in seen if key not in cursor[1]]
+                cursor = (last, seen)
+        # Курсор не зависит от удалений: строки записаны в копию, даже если ключи прочитать не удалось
+        _replica.mark_synced(table, _format_cursor(cursor))
+
+        removed = set()
+        keys = DatabaseManager.get_row_keys(table, key_column)
+        if keys is not None:
+            candidates = known - keys - {row_key(key_column, row) for row in rows}
+            if candidates:
+                # Список ключей читается страницами и может быть неполным — удаляем только те строки,
+                # которых точно нет в базе
+                existing = DatabaseManager.get_existing_keys(table, key_column, candidates)
+                if existing is not None:
+                    removed = candidates - existing
+            if removed:
+                _replica.delete_keys(table, removed)
+
+        # Заведения, листы, файлы и администраторы закэшированы — сбрасываем кэш при изменениях
+        if (rows or removed) and table in ('venues', 'sheets', 'files', 'admins'):
+            _reference_cache.invalidate()
+
+        if rows or removed:
+            for listener in list(_replica_listeners):
+                try:
+                    listener(table, rows, known, removed)
+                except Exception as e:
+                    print(f"❌ Ошибка в подписчике синхронизации локальной копии ({table}): {e}")
+
+    @staticmethod
+    def add_replica_listener(listener, interval=None):
+        """Сообщать listener(table, rows, known, removed) об изменениях, найденных синхронизацией:
+        rows — новые и измененные строки, known — ключи в копии до синхронизации, removed — удаленные ключи.
+        interval — синхронизировать не реже, чем раз в столько секунд"""
+        global _replica_sync_interval
+        _replica_listeners.append(listener)
+        if interval and interval < _replica_sync_interval:
+            _replica_sync_interval = interval
+            _replica_sync_wakeup.set()
+
+    @staticmethod
+    def remove_replica_listener(listener):
+        global _replica_sync_interval
+        if listener in _replica_listeners:
+            _replica_listeners.remove(listener)
+        if not _replica_listeners:
+            _replica_sync_interval = REPLICA_SYNC_INTERVAL
+
+    @staticmethod
+    def _refresh_replica_row(table, match):
+        """Перечитать одну строку в локальную копию после записи в базу. match — {столбец ключа: значение}"""
+        key_column = REPLICA_TABLES[table][0]
+        key = row_key(key_column, match)
+        try:
+            query = supabase.table(table).select("*")
+            for column, value in match.items():
+                query = query.eq(column, value)
+            response = query.execute()
+            if response.data:
+                _replica.upsert_rows(table, response.data)
+            else:
+                _replica.delete_keys(table, [key])
+        except Exception as e:
+            print(f"❌ Ошибка при обновлении локальной копии {table}/{key}: {e}")
+
+    @staticmethod
+    def apply_replica_change(table, event_type, record, key):
+        """Применить событие об изменении строки к локальной копии"""
+        if table not in REPLICA_TABLES:
+            return
+        try:
+            if event_type == 'DELETE':
+                if key is not None:
+                    _replica.delete_keys(table, [key])
+            elif record:
+                _replica.upsert_rows(table, [record])
+        except Exception as e:
+            print(f"❌ Ошибка при применении изменения к локальной копии {table}: {e}")
+
+    @staticmethod
+    def is_replica_ready():
+        """Локальная копия хотя бы раз синхронизирована: меню и справочные данные читаются без Supabase"""
+        try:
+            return _replica.is_ready()
+        except Exception as e:
+            print(f"❌ Ошибка при проверке локальной копии: {e}")
+            return False
+
+    @staticmethod
+    def get_replica_status():
+        """Готовность локальной копии, число строк и отставание по таблицам"""
+        try:
+            return {'ready': _replica.is_ready(), 'tables': _replica.get_status()}
+        except Exception as e:
+            print(f"❌ Ошибка при получении состояния локальной копии: {e}")
+            return {'ready': False, 'tables': {}}
+
+    @staticmethod
+    def get_sheet(sheet_type, venue_id=DEFAULT_VENUE):
         try:
-            response = supabase.table("sheets").select("*").eq("sheet_type", sheet_type).execute()
-            return response.data[0] if response.data else None
+            return DatabaseManager._cached(
+                ('sheet', venue_id, sheet_type),
+                lambda: DatabaseManager._fetch_sheet(sheet_type, venue_id)
+            )
         except Exception as e:
             print(f"Error getting sheet: {e}")
             return None
 
     @staticmethod
-    def update_sheet(sheet_type, content, user_id):
+    def _fetch_sheet(sheet_type, venue_id):
+        if _replica.is_ready():
+            row = _replica.get_row('sheets', f"{venue_id}:{sheet_type}")
+        else:
+            rows = (supabase.table("sheets")
+                    .select("*")
+                    .eq("venue_id", venue_id)
+                    .eq("sheet_type", sheet_type)
+                    .execute()).data
+            row = rows[0] if rows else None
+        return Sheet.from_row(row) if row else None
+
+    @staticmethod
+    def update_sheet(sheet_type, content, user_id, venue_id=DEFAULT_VENUE):
         try:
             response = (supabase.table("sheets")
                         .update({"content": content, "updated_by": user_id})
+                        .eq("venue_id", venue_id)
                         .eq("sheet_type", sheet_type)
                         .execute())
+            DatabaseManager._refresh_replica_row('sheets', {'venue_id': venue_id, 'sheet_type': sheet_type})
+            _reference_cache.invalidate(('sheet', venue_id, sheet_type))
             return True
         except Exception as e:
             print(f"Error updating sheet: {e}")
             return False
 
     @staticmethod
-    def get_file(file_type):
+    def get_file(file_type, venue_id=DEFAULT_VENUE):
         try:
-            response = supabase.table("files").select("*").eq("file_type", file_type).execute()
-            return response.data[0] if response.data else None
+            return DatabaseManager._cached(
+                ('file', venue_id, file_type),
+                lambda: DatabaseManager._fetch_file(file_type, venue_id)
+            )
         except Exception as e:
             print(f"Error getting file: {e}")
             return None
 
     @staticmethod
-    def update_file(file_type, file_id, user_id, file_name=""):
+    def _fetch_file(file_type, venue_id):
+        if _replica.is_ready():
+            row = _replica.get_row('files', f"{venue_id}:{file_type}")
+        else:
+            rows = (supabase.table("files")
+                    .select("*")
+                    .eq("venue_id", venue_id)
+                    .eq("file_type", file_type)
+                    .execute()).data
+            row = rows[0] if rows else None
+        return StoredFile.from_row(row) if row else None
+
+    @staticmethod
+    def update_file(file_type, file_id, user_id, file_name="", venue_id=DEFAULT_VENUE):
         try:
-            print(f"🔄 Обновление файла в базе: type={file_type}, file_id={file_id[:20]}..., user={user_id}")
+            print(f"🔄 Обновление файла в базе: venue={venue_id}, type={file_type}, file_id={file_id[:20]}..., user={user_id}")
 
             # Проверяем, что file_id не пустой
             if not file_id or not file_id.strip():
@@ -83,7 +800,11 @@ class DatabaseManager:
                 return False
 
             # Сначала проверяем, существует ли запись
-            existing = supabase.table("files").select("*").eq("file_type", file_type).execute()
+            existing = (supabase.table("files")
+                        .select("*")
+                        .eq("venue_id", venue_id)
+                        .eq("file_type", file_type)
+                        .execute())
 
             if existing.data:
                 # Обновляем существующую запись
@@ -93,12 +814,14 @@ class DatabaseManager:
                     "updated_by": user_id,
                     "file_name": file_name
                 })
+                            .eq("venue_id", venue_id)
                             .eq("file_type", file_type)
                             .execute())
             else:
                 # Создаем новую запись
                 response = (supabase.table("files")
                             .insert({
+                    "venue_id": venue_id,
                     "file_type": file_type,
                     "file_id": file_id,
                     "updated_by": user_id,
@@ -106,6 +829,8 @@ class DatabaseManager:
                 })
                             .execute())
 
+            DatabaseManager._refresh_replica_row('files', {'venue_id': venue_id, 'file_type': file_type})
+            _reference_cache.invalidate(('file', venue_id, file_type))
             print(f"✅ Файл успешно обновлен/добавлен")
             return True
         except Exception as e:
@@ -113,59 +838,75 @@ class DatabaseManager:
             return False
 
     @staticmethod
-    def is_admin(user_id):
+    def is_admin(user_id, venue_id=DEFAULT_VENUE):
+        """Администратор заведения (у каждого заведения свой список; ADMIN_ID — администратор всех заведений)"""
+        if user_id == ADMIN_ID:
+            return True
         try:
-            response = supabase.table("admins").select("*").eq("user_id", user_id).execute()
-            return len(response.data) > 0
+            admins = DatabaseManager._cached(('admins', venue_id), lambda: DatabaseManager._fetch_admins(venue_id))
+            return any(admin['user_id'] == user_id for admin in admins)
         except Exception as e:
             print(f"Error checking admin: {e}")
             # Если таблицы admins нет, проверяем по ADMIN_ID из config
             return user_id == ADMIN_ID
 
     @staticmethod
-    def add_admin(user_id, username="", full_name=""):
-        """Добавить администратора"""
+    def add_admin(user_id, username="", full_name="", venue_id=DEFAULT_VENUE):
+        """Добавить администратора заведения"""
         try:
             response = supabase.table("admins").insert({
+                "venue_id": venue_id,
                 "user_id": user_id,
                 "username": username,
                 "full_name": full_name
             }).execute()
 
-            print(f"✅ Администратор {user_id} добавлен в базу")
+            DatabaseManager._refresh_replica_row('admins', {'venue_id': venue_id, 'user_id': user_id})
+            _reference_cache.invalidate(('admins', venue_id))
+            print(f"✅ Администратор {user_id} добавлен в базу (заведение {venue_id})")
             return True
         except Exception as e:
             print(f"❌ Ошибка при добавлении администратора: {e}")
             return False
 
     @staticmethod
-    def remove_admin(user_id):
-        """Удалить администратора"""
+    def remove_admin(user_id, venue_id=DEFAULT_VENUE):
+        """Удалить администратора заведения"""
         try:
-            response = supabase.table("admins").delete().eq("user_id", user_id).execute()
-            print(f"✅ Администратор {user_id} удален из базы")
+            response = supabase.table("admins").delete().eq("venue_id", venue_id).eq("user_id", user_id).execute()
+            DatabaseManager._refresh_replica_row('admins', {'venue_id': venue_id, 'user_id': user_id})
+            _reference_cache.invalidate(('admins', venue_id))
+            print(f"✅ Администратор {user_id} удален из базы (заведение {venue_id})")
             return True
         except Exception as e:
             print(f"❌ Ошибка при удалении администратора: {e}")
             return False
 
     @staticmethod
-    def get_all_admins():
-        """Получить всех администраторов"""
+    def get_all_admins(venue_id=DEFAULT_VENUE):
+        """Получить всех администраторов заведения"""
         try:
-            response = supabase.table("admins").select("*").execute()
-            return response.data
+            return DatabaseManager._cached(('admins', venue_id), lambda: DatabaseManager._fetch_admins(venue_id))
         except Exception as e:
             print(f"❌ Ошибка при получении списка администраторов: {e}")
             return []
 
+    @staticmethod
+    def _fetch_admins(venue_id):
+        if _replica.is_ready():
+            return _replica.get_rows('admins', venue_id)
+        response = supabase.table("admins").select("*").eq("venue_id", venue_id).execute()
+        return response.data
+
     # --- СИСТЕМА ОБРАТНОЙ СВЯЗИ С ВЫБОРОМ СТОЛА ---
 
     @staticmethod
-    def add_feedback(user_id, username, full_name, message, table_number, message_type='feedback'):
+    def add_feedback(user_id, username, full_name, message, table_number, message_type='feedback',
+                     venue_id=DEFAULT_VENUE):
         """Добавить отзыв или обратную связь с номером стола"""
         try:
             response = supabase.table("feedback").insert({
+                "venue_id": venue_id,
                 "user_id": user_id,
                 "username": username,
                 "full_name": full_name,
@@ -176,51 +917,238 @@ class DatabaseManager:
             }).execute()
 
             print(f"✅ Отзыв от пользователя {user_id} (стол {table_number}) добавлен в базу")
+            if response.data:
+                feedback_rollups.record(response.data[0].get('created_at') or datetime.now(timezone.utc),
+                                        table_number, message_type, venue_id,
+                                        DatabaseManager.venue_timezone(venue_id))
             return True
         except Exception as e:
             print(f"❌ Ошибка при добавлении отзыва: {e}")
             return False
 
     @staticmethod
-    def get_all_feedback(status=None):
-        """Получить все отзывы (для админов)"""
+    def add_feedback_batch(rows):
+        """Записать пачку отзывов одним запросом.
+
+        У каждого отзыва есть client_id (уникальный столбец в таблице feedback),
+        поэтому уже записанные отзывы при повторной отправке пропускаются.
+        """
         try:
-            query = supabase.table("feedback").select("*").order("created_at", desc=True)
+            (supabase.table("feedback")
+             .upsert(rows, on_conflict="client_id", ignore_duplicates=True)
+             .execute())
+
+            print(f"✅ В базу записано отзывов: {len(rows)}")
+            return True
+        except Exception as e:
+            print(f"❌ Ошибка при записи пачки отзывов: {e}")
+            return False
+
+    @staticmethod
+    def get_all_feedback(status=None, venue_id=DEFAULT_VENUE):
+        """Получить все отзывы заведения (для админов)"""
+        try:
+            query = supabase.table("feedback").select("*").eq("venue_id", venue_id).order("created_at", desc=True)
 
             if status:
                 query = query.eq("status", status)
 
             response = query.execute()
-            return response.data
+            return [Feedback.from_row(row) for row in response.data]
+        except Exception as e:
+            print(f"❌ Ошибка при получении отзывов: {e}")
+            return []
+
+    @staticmethod
+    def _filter_feedback(query, feedback_ids=None, status=None, table_number=None,
+                         created_from=None, created_to=None, venue_id=None):
+        """Добавить к запросу условия по отзывам: список id, статус, стол, период [created_from, created_to)
+        и заведение"""
+        if venue_id is not None:
+            query = query.eq("venue_id", venue_id)
+        if feedback_ids is not None:
+            query = query.in_("id", list(feedback_ids))
+        if status:
+            query = query.eq("status", status)
+        if table_number is not None:
+            query = query.eq("table_number", table_number)
+        if created_from:
+            query = query.gte("created_at", _format_timestamp(created_from))
+        if created_to:
+            query = query.lt("created_at", _format_timestamp(created_to))
+        return query
+
+    @staticmethod
+    def get_feedback(limit=None, offset=0, **conditions):
+        """Получить отзывы по условиям одним запросом (новые сначала)"""
+        try:
+            if conditions.get('feedback_ids') is not None and not conditions['feedback_ids']:
+                return []
+
+            query = supabase.table("feedback").select("*").order("created_at", desc=True)
+            query = DatabaseManager._filter_feedback(query, **conditions)
+            if limit:
+                query = query.range(offset, offset + limit - 1)
+
+            response = query.execute()
+            return [Feedback.from_row(row) for row in response.data]
         except Exception as e:
             print(f"❌ Ошибка при получении отзывов: {e}")
             return []
 
     @staticmethod
-    def get_feedback_stats():
-        """Получить статистику по отзывам"""
+    def get_feedback_by_id(feedback_id, venue_id=None):
+        """Получить один отзыв (только если он относится к заведению venue_id, когда оно задано)"""
+        feedback = DatabaseManager.get_feedback(feedback_ids=[feedback_id], venue_id=venue_id)
+        return feedback[0] if feedback else None
+
+    @staticmethod
+    def update_feedback_status_bulk(new_status, **conditions):
+        """Обновить статус у всех отзывов, подходящих под условия, одним запросом.
+
+        Возвращает количество обновленных отзывов.
+        """
+        if not any(value is not None for value in conditions.values()):
+            print("❌ Массовое обновление отзывов без условий запрещено")
+            return 0
+        if conditions.get('feedback_ids') is not None and not conditions['feedback_ids']:
+            return 0
+
+        try:
+            query = supabase.table("feedback").update({"status": new_status})
+            response = DatabaseManager._filter_feedback(query, **conditions).execute()
+
+            updated_count = len(response.data) if response.data else 0
+            print(f"✅ Статус '{new_status}' установлен для {updated_count} отзывов")
+            return updated_count
+        except Exception as e:
+            print(f"❌ Ошибка при массовом обновлении статуса отзывов: {e}")
+            return 0
+
+    @staticmethod
+    def delete_feedback_bulk(**conditions):
+        """Удалить все отзывы, подходящие под условия, одним запросом.
+
+        Возвращает количество удаленных отзывов.
+        """
+        if not any(value is not None for value in conditions.values()):
+            print("❌ Массовое удаление отзывов без условий запрещено")
+            return 0
+        if conditions.get('feedback_ids') is not None and not conditions['feedback_ids']:
+            return 0
+
+        try:
+            query = supabase.table("feedback").delete()
+            response = DatabaseManager._filter_feedback(query, **conditions).execute()
+
+            deleted_count = len(response.data) if response.data else 0
+            print(f"✅ Удалено {deleted_count} отзывов")
+            return deleted_count
+        except Exception as e:
+            print(f"❌ Ошибка при массовом удалении отзывов: {e}")
+            return 0
+
+    @staticmethod
+    def get_feedback_after(after_id, limit, columns="*", **conditions):
+        """Страница отзывов с id больше after_id, по возрастанию id (постраничное чтение без offset)"""
+        query = supabase.table("feedback").select(columns).order("id").limit(limit)
+        query = DatabaseManager._filter_feedback(query, **conditions)
+        if after_id is not None:
+            query = query.gt("id", after_id)
+        return query.execute().data
+
+    @staticmethod
+    def iter_feedback(columns="*", page_size=FEEDBACK_PAGE_SIZE, **conditions):
+        """Все отзывы по условиям, по возрастанию id. В памяти держится одна страница.
+
+        Отдает строки как есть (словари только с columns), без разбора в Feedback.
+        Столбец id должен входить в columns. Ошибки базы пробрасываются.
+        """
+        after_id = None
+        while True:
+            rows = DatabaseManager.get_feedback_after(after_id, page_size, columns, **conditions)
+            yield from rows
+            if len(rows) < page_size:
+                return
+            after_id = rows[-1]['id']
+
+    @staticmethod
+    def rebuild_feedback_rollups(pending_rows=None):
+        """Пересчитать сводную статистику по всем отзывам в базе, читая их пачками.
+
+        pending_rows() — отзывы, которые еще ждут записи в базу (feedback_queue): они уже учтены
+        в сводке и не должны из нее пропасть. Отзыв считается один раз по client_id, даже если
+        его перенесли в базу во время пересчета. Дни раньше самого старого отзыва в базе (уже
+        удаленные отзывы) остаются как есть.
+        """
+        counts = {}
+        counted_ids = set()
+        first_day = None
+        feedback_rollups.begin_rebuild()
         try:
-            feedback = DatabaseManager.get_all_feedback()
-            total = len(feedback)
-            new_count = len([f for f in feedback if f.get('status') == 'new'])
-            read_count = len([f for f in feedback if f.get('status') == 'read'])
+            timezones = {venue.id: venue.tz for venue in DatabaseManager.get_venues()}
+            # Очередь читается до базы: отзыв, перенесенный между чтениями, окажется в обоих
+            pending = list(pending_rows()) if pending_rows else []
+            rows = DatabaseManager.iter_feedback("id,client_id,created_at,table_number,message_type,venue_id")
+            for row in itertools.chain(rows, pending):
+                if not row.get('created_at') or (row.get('client_id') and row['client_id'] in counted_ids):
+                    continue
+                if row.get('client_id'):
+                    counted_ids.add(row['client_id'])
+                venue_id = row_venue(row)
+                key = bucket_key(row['created_at'], row.get('table_number'), row.get('message_type'),
+                                 venue_id, timezones.get(venue_id, LOCAL_TZ))
+                counts[key] = counts.get(key, 0) + 1
+                if first_day is None or key[1] < first_day:
+                    first_day = key[1]
 
+            if first_day is not None:
+                feedback_rollups.replace_since(first_day, counts, counted_ids)
+            else:
+                feedback_rollups.end_rebuild()
+            print(f"✅ Статистика отзывов пересчитана: {sum(counts.values())} отзывов")
+            return True
+        except Exception as e:
+            feedback_rollups.end_rebuild()
+            print(f"❌ Ошибка при пересчете статистики отзывов: {e}")
+            return False
+
+    @staticmethod
+    def get_feedback_stats(venue_id=DEFAULT_VENUE):
+        """Получить статистику по отзывам заведения.
+
+        Считает база (count=exact, head=True): строки отзывов не передаются, и счет не упирается
+        в ограничение PostgREST на число строк в ответе. Статусов два — прочитанные это остальные.
+        """
+        try:
+            total = DatabaseManager._count_feedback(venue_id)
+            new_count = DatabaseManager._count_feedback(venue_id, status='new')
             return {
                 'total': total,
                 'new': new_count,
-                'read': read_count
+                'read': total - new_count
             }
         except Exception as e:
             print(f"❌ Ошибка при получении статистики отзывов: {e}")
             return {'total': 0, 'new': 0, 'read': 0}
 
     @staticmethod
-    def update_feedback_status(feedback_id, status):
-        """Обновить статус отзыва"""
+    def _count_feedback(venue_id, status=None):
+        query = supabase.table("feedback").select("id", count="exact", head=True).eq("venue_id", venue_id)
+        if status is not None:
+            query = query.eq("status", status)
+        return query.execute().count or 0
+
+    @staticmethod
+    def update_feedback_status(feedback_id, status, venue_id=None):
+        """Обновить статус отзыва (только отзыва заведения venue_id, когда оно задано)"""
         try:
-            response = supabase.table("feedback").update({
+            query = supabase.table("feedback").update({
                 "status": status
-            }).eq("id", feedback_id).execute()
+            }).eq("id", feedback_id)
+            if venue_id is not None:
+                query = query.eq("venue_id", venue_id)
+            response = query.execute()
 
             return True
         except Exception as e:
@@ -228,10 +1156,13 @@ class DatabaseManager:
             return False
 
     @staticmethod
-    def delete_feedback(feedback_id):
-        """Удалить отзыв"""
+    def delete_feedback(feedback_id, venue_id=None):
+        """Удалить отзыв (только отзыв заведения venue_id, когда оно задано)"""
         try:
-            response = supabase.table("feedback").delete().eq("id", feedback_id).execute()
+            query = supabase.table("feedback").delete().eq("id", feedback_id)
+            if venue_id is not None:
+                query = query.eq("venue_id", venue_id)
+            response = query.execute()
             print(f"✅ Отзыв {feedback_id} удален")
             return True
         except Exception as e:
@@ -256,8 +1187,8 @@ class DatabaseManager:
             return 0
 
     @staticmethod
-    def format_saratov_time(utc_time_str):
-        """Форматирует время в Саратовский часовой пояс"""
+    def format_saratov_time(utc_time_str, tz=None):
+        """Форматирует время в Саратовский часовой пояс (или в часовой пояс заведения tz)"""
         try:
             if not utc_time_str:
                 return "время неизвестно"
@@ -265,8 +1196,8 @@ class DatabaseManager:
             # Парсим UTC время из базы данных
             utc_time = datetime.fromisoformat(utc_time_str.replace('Z', '+00:00'))
 
-            # Конвертируем в Саратовское время (UTC+4)
-            saratov_tz = pytz.timezone('Europe/Saratov')
+            # Конвертируем в Саратовское время (UTC+4) или во время заведения
+            saratov_tz = tz or pytz.timezone('Europe/Saratov')
             saratov_time = utc_time.astimezone(saratov_tz)
 
             # Форматируем в удобный вид
@@ -296,171 +1227,59 @@ class DatabaseManager:
         if not allergens:
             return ""
 
-        allergen_map = {
-            'Яйца': '🥚',
-            'Кунжут': '⚫',
-            'Лактоза': '🥛',
-            'Орехи': '🥜',
-            'Рыба': '🐟',
-            'Морепродукты': '🦐',
-            'Глютен': '🌾',
-            'Соя': '🫘'
-        }
-
         formatted = []
         for allergen in allergens.split(','):
             allergen = allergen.strip()
-            emoji = allergen_map.get(allergen, '⚠️')
+            emoji = ALLERGENS.get(allergen, '⚠️')
             formatted.append(f"{emoji} {allergen}")
 
         return " | ".join(formatted)
 
     @staticmethod
-    def format_cooking_time(dish_name=None):
-        """Форматирует время приготовления в зависимости от блюда"""
-        # Времена приготовления для разных блюд
-        cooking_times = {
-            # Закуски
-            'Чиз кимчи ролл': 20,
-            'Гедза': 20,
-            'Пегодя': 30,
-            'Дамплинги': 30,
-            'Запеченые мидии': 25,
-            'Токпоки': 20,
-            'Токпоки чиз': 15,
-            'Токпокки с беконом в сливочном соусе': 20,
-            'Хемуль токпоки': 20,
-            'Куриные крылья по корейски': 20,
-            'Кимпап с лососем': 20,
-            'Кимпап': 20,
-            'Кимпаб с креветкой': 20,
-            'Кимпаб с курицей': 20,
-            'Морепродукты в сливочном соусе': 20,
-            'Сунде': 20,
-            'Чирим куби': 20,
-            # Супы - все 20 минут
-            'Кукси': 20,
-            'Кальбитан': 20,
-            'Юккедян': 20,
-            'Тямпон': 20,
-            'Говяжий бульон': 20,
-            'Том ям': 20,
-            'Солонтан': 20,
-            'Кимчи тиге': 20,
-            'Кимчи рамен': 20,
-            'Тубу тиге': 20,
-            'Рыбный суп': 20,
-            'Хемуль тендян тиге': 20,
-            'Ккори комптан': 20,
-            'Суп грибной с лапшой': 20,
-            # Горячие блюда
-            'Сями по-домашнему': 35,
-            'Кальби поккым': 20,
-            'Одино поккым': 20,
-            'Согоги поккым': 20,
-            'Чикен ви': 20,
-            'Пулькоги': 20,
-            'Медальоны из говядины': 30,
-            'Теди кальби': 20,
-            'Самгепсаль': 30,
-            'Кимчи чеюк поккым': 20,
-            'Чок паль': 20,
-            'Тубу со свининой': 20,
-            'Мясо по-домашнему': 20,
-            'Утка по-корейски': 20,
-            'Утка в фирменном соусе': 30,
-            'Свиная грудинка': 20,
-            'Лосось том ям': 20,
-            'Спайси чиккен': 20,
-            'Кади поккым': 25,
-            'Лосось терияки': 40,
-            'Сибас': 35,
-            'Дорадо': 35,
-            'Ла кальби': 30,
-            'Поссам': 30,
-            'Свинина в кисло сладком соусе': 30,
-            # Блюда с рисом
-            'Пибимпаб': 20,
-            'Чиккен пибимпаб': 20,
-            'Пулькоги пибимпаб': 20,
-            'Кимчи пибимпаб': 20,
-            'Чиз кимчи пибимпаб': 20,
-            'Сеу поккым паб': 20,
-            'Хемуль поккым': 20,
-            'Бургер с курицей': 30,
-            'Бургер с лососем': 30,
-            'Бургер с говядиной': 30,
-            # Блюда с лапшой
-            'Лапша с морепродуктами': 20,
-            'Лапша с курицей': 20,
-            'Лапша с говядиной': 20,
-            'Чапче': 20,
-            'Лапша том ям': 20,
-            # Десерты
-            'Чизкейк классический': 10,
-            'Чизкейк запеченый': 10,
-            'Медовый': 10,
-            'Штрудель яблочный': 40,
-            'Мороженое': 15,
-            'Шоколадный фондан': 15,
-            'Жаренное мороженое': 15,
-            'Моти вишня/манго-маракуй/малина': 10,
-            'Сладкий ролл': 20,
-            # Роллы - все 20 минут
-            'Бали': 20,
-            'Одзу': 20,
-            'Азиатский': 20,
-            'Риет ролл': 20,
-            'Ассан': 20,
-            'Грин': 20,
-            'Голден маки': 20,
-            'Кабуки': 20,
-            'Яки сяке рору': 20,
-            'Йоджи': 20,
-            'Калифорния с лососем': 20,
-            'Калифорния с креветками': 20,
-            'Калифорния с угрем': 20,
-            'Канада': 20,
-            'Мега': 20,
-            'Норито': 20,
-            'Роял': 20,
-            'Сицилийский': 20,
-            'Угорь в кунжуте': 20,
-            'Филадельфия': 20,
-            'Футомаки': 20,
-            'Эби унаги маки': 20,
-            'Сяке кадо': 20,
-            'Дракон маки': 20,
-            'Пинк сяке рору': 20,
-            'Кайсен маки': 20,
-            'Дон бекон': 20,
-            'Аляска': 20,
-            'Прайм ролл': 20,
-            'Чеддер ролл': 20,
-            # Бизнес ланч - все 15 минут
-            'Коу Слоу С Запеченым Лососем': 15,
-            'Коу слоу': 15,
-            'Меги ча': 15,
-            'Спаржа': 15,
-            'Кимчи': 15,
-            'Морковь ча': 15,
-            'Салат из стеклянной лапши': 15,
-            'Салат из куриной грудки с овощами': 15,
-            'Рамен': 15,
-            'Борщ': 15,
-            'Кукси (холодный суп)': 15,
-            'Рыбный суп': 15,
-            'Пибимпаб (без бульона)': 15,
-            'Курочка В Томатном Соусе': 15,
-            'Отбивная Из Свинины': 15,
-            'Удон С Курицей': 15,
-            'Сэндвич С Запеченым Лососем': 15,
-            # Остальные блюда - 15 минут по умолчанию
-        }
+    def format_cooking_time(dish_name=None, minutes=None):
+        """Форматирует время приготовления блюда.
 
-        minutes = cooking_times.get(dish_name, 15)
+        minutes — значение столбца dishes.cooking_time; если оно не заполнено,
+        время берется из DEFAULT_COOKING_TIMES по названию блюда.
+        """
+        if minutes is None:
+            minutes = DEFAULT_COOKING_TIMES.get(dish_name, DEFAULT_COOKING_TIME)
         return f"⏱️ {minutes} мин"
 
+
+def _is_missing_table(error):
+    """Ошибка PostgREST «таблицы нет» (а не сбой сети или базы)"""
+    code = getattr(error, 'code', None)
+    message = str(error)
+    return (code in ('42P01', 'PGRST205') or 'does not exist' in message
+            or 'Could not find the table' in message)
+
+
+def _parse_cursor(value):
+    """Курсор синхронизации из локальной копии: (updated_at, [ключи строк с этим updated_at]) или None.
+    Курсор прежнего формата (только updated_at) читается как (updated_at, [])"""
+    if not value:
+        return None
+    try:
+        updated_at, keys = json.loads(value)
+        return updated_at, keys
+    except (ValueError, TypeError):
+        return value, []
+
+
+def _format_cursor(cursor):
+    return json.dumps(list(cursor), ensure_ascii=False) if cursor else None
+
+
+def _format_timestamp(value):
+    """datetime или строка -> строка для сравнения с created_at"""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.isoformat()
+    return value
+
+
 # --- ФОНОВАЯ ЗАДАЧА ДЛЯ ОЧИСТКИ ---
 
 def start_cleanup_scheduler():
@@ -485,5 +1304,31 @@ def start_cleanup_scheduler():
     print("✅ Фоновая задача автоочистки запущена")
 
 
+def start_replica_sync():
+    """Запустить фоновую синхронизацию локальной копии меню"""
+
+    def sync_task():
+        while True:
+            try:
+                DatabaseManager.sync_replica()
+            except Exception as e:
+                print(f"❌ Ошибка в фоновой синхронизации локальной копии: {e}")
+            # Подписчик, попросивший синхронизировать чаще, будит поток раньше срока
+            _replica_sync_wakeup.wait(_replica_sync_interval)
+            _replica_sync_wakeup.clear()
+
+    sync_thread = threading.Thread(target=sync_task, daemon=True)
+    sync_thread.start()
+    print("✅ Фоновая синхронизация локальной копии меню запущена")
+
+
+def start_feedback_rollups(pending_rows=None):
+    """Собрать сводную статистику отзывов в фоне, если ее еще нет (первый запуск)"""
+    if not feedback_rollups.is_empty():
+        return
+    threading.Thread(target=DatabaseManager.rebuild_feedback_rollups, args=(pending_rows,), daemon=True).start()
+    print("🔄 Сводная статистика отзывов собирается в фоне")
+
+
 # Запускаем очистку при импорте
 start_cleanup_scheduler()
\ No newline at end of file
@@ -0,0 +1,89 @@
+import csv
+import gzip
+import io
+import tempfile
+
+from database_manager import DatabaseManager
+
+# Столбцы выгрузки: столбец в базе -> заголовок в файле
+EXPORT_COLUMNS = {
+    'id': "ID",
+    'created_at': "Дата",
+    'table_number': "Стол",
+    'message_type': "Тип",
+    'status': "Статус",
+    'user_id': "ID пользователя",
+    'username': "Username",
+    'full_name': "Имя",
+    'message': "Текст",
+}
+
+# До этого размера файл собирается в памяти, дальше — во временном файле на диске
+EXPORT_SPOOL_SIZE = 5 * 1024 * 1024
+
+try:
+    from openpyxl import Workbook
+except ImportError:
+    Workbook = None
+
+
+def feedback_rows(tz=None, **conditions):
+    """Строки выгрузки по одной: отзывы читаются из базы постранично; время — в часовом поясе tz"""
+    columns = ",".join(EXPORT_COLUMNS)
+    for row in DatabaseManager.iter_feedback(columns, **conditions):
+        values = [row.get(column) for column in EXPORT_COLUMNS]
+        values[1] = DatabaseManager.format_saratov_time(row.get('created_at'), tz)
+        yield values
+
+
+def _write_csv(rows, spool):
+    # gzip поверх временного файла: строки сжимаются по мере записи
+    with gzip.GzipFile(fileobj=spool, mode='wb') as compressed:
+        # utf-8-sig — чтобы Excel правильно открыл кириллицу
+        with io.TextIOWrapper(compressed, encoding='utf-8-sig', newline='') as text:
+            writer = csv.writer(text)
+            writer.writerow(EXPORT_COLUMNS.values())
+            count = 0
+            for values in rows:
+                writer.writerow(values)
+                count += 1
+    return count
+
+
+def _write_xlsx(rows, spool):
+    # write_only — openpyxl не держит лист в памяти
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Отзывы")
+    sheet.append(list(EXPORT_COLUMNS.values()))
+    count = 0
+    for values in rows:
+        sheet.append(values)
+        count += 1
+    workbook.save(spool)
+    return count
+
+
+def export_feedback(file_format='csv', tz=None, **conditions):
+    """Выгрузить отзывы по условиям в CSV (gzip) или XLSX.
+
+    Возвращает (файл, расширение, число отзывов); файл открыт и перемотан в начало,
+    закрыть его должен вызывающий. Без openpyxl XLSX заменяется на CSV.
+    """
+    if file_format == 'xlsx' and Workbook is None:
+        file_format = 'csv'
+
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
+    try:
+        rows = feedback_rows(tz, **conditions)
+        if file_format == 'xlsx':
+            count = _write_xlsx(rows, spool)
+            extension = 'xlsx'
+        else:
+            count = _write_csv(rows, spool)
+            extension = 'csv.gz'
+    except Exception:
+        spool.close()
+        raise
+
+    spool.seek(0)
+    return spool, extension, count
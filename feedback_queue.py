@@ -0,0 +1,175 @@
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timezone
+
+from config import DATA_DIR, DEFAULT_VENUE
+from database_manager import DatabaseManager
+from feedback_rollups import feedback_rollups
+
+# Файл очереди отзывов, которые еще не записаны в базу
+SPOOL_PATH = os.path.join(DATA_DIR, "feedback_spool.sqlite3")
+
+# Сколько отзывов отправлять в базу одним запросом
+FLUSH_BATCH_SIZE = 100
+
+# Пауза между попытками записи при ошибках базы (растет до максимума)
+RETRY_DELAY = 1
+MAX_RETRY_DELAY = 60
+
+
+class FeedbackQueue:
+    """Очередь отзывов с записью в базу в фоне.
+
+    Отзыв сначала сохраняется в локальный SQLite-файл (с fsync), и гость сразу
+    получает ответ. Фоновый поток пачками переносит отзывы в таблицу feedback
+    и повторяет попытки, пока база недоступна. У каждого отзыва есть client_id,
+    поэтому повторная отправка после сбоя не создает дублей. Отзывы переживают
+    перезапуск процесса и недоступность базы.
+    """
+
+    def __init__(self, path=SPOOL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._connection = None
+        self._stats = {'submitted': 0, 'flushed': 0, 'failed_flushes': 0, 'last_error': None}
+
+    def _connect(self):
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            # FULL — fsync при каждом коммите, отзыв не потеряется при сбое питания
+            connection.execute("PRAGMA synchronous=FULL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS spool (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    client_id TEXT NOT NULL UNIQUE,
+                    payload TEXT NOT NULL
+                )
+            """)
+            self._connection = connection
+        return self._connection
+
+    def submit(self, user_id, username, full_name, message, table_number, message_type='feedback',
+               venue_id=DEFAULT_VENUE):
+        """Сохранить отзыв в очередь. Возвращает client_id или None, если записать не удалось"""
+        client_id = str(uuid.uuid4())
+        row = {
+            "client_id": client_id,
+            "venue_id": venue_id,
+            "user_id": user_id,
+            "username": username,
+            "full_name": full_name,
+            "message": message,
+            "table_number": table_number,
+            "message_type": message_type,
+            "status": 'new',
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
+
+        try:
+            with self._lock:
+                self._connect().execute(
+                    "INSERT INTO spool (client_id, payload) VALUES (?, ?)",
+                    (client_id, json.dumps(row, ensure_ascii=False))
+                )
+                self._stats['submitted'] += 1
+        except Exception as e:
+            print(f"❌ Ошибка при сохранении отзыва в очередь: {e}")
+            return None
+
+        print(f"📥 Отзыв от пользователя {user_id} (заведение {venue_id}, стол {table_number}) поставлен в очередь")
+        feedback_rollups.record(row['created_at'], table_number, message_type, venue_id,
+                                DatabaseManager.venue_timezone(venue_id), client_id)
+        self._wakeup.set()
+        return client_id
+
+    def pending_rows(self):
+        """Отзывы, еще не записанные в базу (для пересчета сводной статистики)"""
+        with self._lock:
+            rows = self._connect().execute("SELECT payload FROM spool ORDER BY seq").fetchall()
+        return [json.loads(payload) for payload, in rows]
+
+    def pending_count(self):
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def flush(self):
+        """Перенести накопленные отзывы в базу. Возвращает True, если очередь опустела"""
+        while True:
+            with self._lock:
+                rows = self._connect().execute(
+                    "SELECT seq, payload FROM spool ORDER BY seq LIMIT ?", (FLUSH_BATCH_SIZE,)
+                ).fetchall()
+            if not rows:
+                return True
+
+            payloads = [json.loads(payload) for _, payload in rows]
+            if not DatabaseManager.add_feedback_batch(payloads):
+                with self._lock:
+                    self._stats['failed_flushes'] += 1
+                    self._stats['last_error'] = datetime.now(timezone.utc).isoformat()
+                return False
+
+            with self._lock:
+                self._connect().execute("DELETE FROM spool WHERE seq <= ?", (rows[-1][0],))
+                self._stats['flushed'] += len(rows)
+
+    def _run(self):
+        delay = RETRY_DELAY
+        while not self._stopping.is_set():
+            self._wakeup.wait(timeout=MAX_RETRY_DELAY)
+            self._wakeup.clear()
+
+            try:
+                flushed = self.flush()
+            except Exception as e:
+                print(f"❌ Ошибка в фоновой записи отзывов: {e}")
+                flushed = False
+
+            if flushed:
+                delay = RETRY_DELAY
+            else:
+                # База недоступна — ждем и пробуем снова
+                self._stopping.wait(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY)
+                self._wakeup.set()
+
+    def start(self):
+        """Запустить фоновую запись; отзывы, оставшиеся с прошлого запуска, отправятся сразу"""
+        if self._thread is not None:
+            return
+        self._connect()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._wakeup.set()
+        print("✅ Фоновая запись отзывов запущена")
+
+    def stop(self, timeout=10):
+        """Остановить фоновую запись и попробовать отправить остаток очереди"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"❌ Не удалось отправить очередь отзывов при остановке: {e}")
+
+    def get_stats(self):
+        stats = dict(self._stats)
+        stats['pending'] = self.pending_count()
+        return stats
+
+
+# Общая очередь отзывов для всего процесса
+feedback_queue = FeedbackQueue()
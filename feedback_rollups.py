@@ -0,0 +1,173 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from config import DATA_DIR, DEFAULT_VENUE
+from models import LOCAL_TZ, parse_timestamp
+
+# Файл со сводной статистикой отзывов
+ROLLUPS_PATH = os.path.join(DATA_DIR, "feedback_rollups.sqlite3")
+
+
+def bucket_key(created_at, table_number, message_type, venue_id=DEFAULT_VENUE, tz=LOCAL_TZ):
+    """Ячейка сводки для отзыва: (заведение, день, стол, час, тип); дни и часы — по времени заведения"""
+    if isinstance(created_at, str):
+        created_at = parse_timestamp(created_at)
+    local = created_at.astimezone(tz)
+    return venue_id, local.strftime("%Y-%m-%d"), str(table_number or ''), local.hour, message_type or 'feedback'
+
+
+def local_today(tz=LOCAL_TZ):
+    return datetime.now(tz).date()
+
+
+class FeedbackRollups:
+    """Сводная статистика отзывов: число отзывов по заведению, дню, столу, часу и типу.
+
+    Каждый новый отзыв увеличивает один счетчик, поэтому запрос статистики
+    за период читает не больше (дней × столов × часов × типов) строк — сколько
+    бы отзывов ни было в истории. Старые отзывы удаляются из базы через
+    30 дней, а сводка за прошлые дни остается.
+    """
+
+    def __init__(self, path=ROLLUPS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = None
+        # Отзывы, учтенные во время пересчета: {client_id: ячейка}; None — пересчета нет
+        self._journal = None
+
+    def _connect(self):
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(rollup)")]
+            if columns and 'venue_id' not in columns:
+                # Сводка, собранная до появления заведений, относится к заведению по умолчанию
+                connection.execute("ALTER TABLE rollup RENAME TO rollup_single_venue")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS rollup (
+                    venue_id TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    table_number TEXT NOT NULL,
+                    hour INTEGER NOT NULL,
+                    message_type TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (venue_id, day, table_number, hour, message_type)
+                )
+            """)
+            if columns and 'venue_id' not in columns:
+                connection.execute(
+                    """INSERT INTO rollup SELECT ?, day, table_number, hour, message_type, count
+                       FROM rollup_single_venue""",
+                    (DEFAULT_VENUE,)
+                )
+                connection.execute("DROP TABLE rollup_single_venue")
+            self._connection = connection
+        return self._connection
+
+    def record(self, created_at, table_number, message_type='feedback', venue_id=DEFAULT_VENUE, tz=LOCAL_TZ,
+               client_id=None):
+        """Учесть один новый отзыв; tz — часовой пояс заведения, client_id — ключ отзыва
+        (по нему пересчет не учитывает отзыв дважды)"""
+        key = bucket_key(created_at, table_number, message_type, venue_id, tz)
+        try:
+            with self._lock:
+                self._connect().execute(
+                    """INSERT INTO rollup (venue_id, day, table_number, hour, message_type, count)
+                       VALUES (?, ?, ?, ?, ?, 1)
+                       ON CONFLICT (venue_id, day, table_number, hour, message_type)
+                       DO UPDATE SET count = count + 1""",
+                    key
+                )
+                if self._journal is not None:
+                    self._journal[client_id or object()] = key
+        except Exception as e:
+            print(f"❌ Ошибка при обновлении статистики отзывов: {e}")
+
+    def begin_rebuild(self):
+        """Начать пересчет: отзывы, учтенные до replace_since, запоминаются, чтобы он их не стер"""
+        with self._lock:
+            self._journal = {}
+
+    def end_rebuild(self):
+        """Пересчет не удался — сводка остается как есть"""
+        with self._lock:
+            self._journal = None
+
+    def replace_since(self, first_day, counts, counted_ids=()):
+        """Заменить сводку начиная с дня first_day пересчитанными счетчиками {ячейка: число}.
+
+        Отзывы, учтенные record() после begin_rebuild(), добавляются к пересчитанным, если их
+        client_id нет в counted_ids (отзывы, уже вошедшие в counts).
+        """
+        with self._lock:
+            journal, self._journal = self._journal or {}, None
+            counts = dict(counts)
+            counted_ids = set(counted_ids)
+            for client_id, key in journal.items():
+                # Ячейки раньше first_day не пересчитываются — там record() уже учел отзыв
+                if client_id not in counted_ids and key[1] >= first_day:
+                    counts[key] = counts.get(key, 0) + 1
+
+            connection = self._connect()
+            connection.execute("BEGIN")
+            try:
+                connection.execute("DELETE FROM rollup WHERE day >= ?", (first_day,))
+                connection.executemany(
+                    """INSERT INTO rollup (venue_id, day, table_number, hour, message_type, count)
+                       VALUES (?, ?, ?, ?, ?, ?)""",
+                    [key + (count,) for key, count in counts.items()]
+                )
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+
+    def is_empty(self):
+        with self._lock:
+            return self._connect().execute("SELECT 1 FROM rollup LIMIT 1").fetchone() is None
+
+    def summary(self, days=None, venue_id=DEFAULT_VENUE, tz=LOCAL_TZ):
+        """Статистика заведения за последние days дней (включая сегодня) или за все время"""
+        where, params = "WHERE venue_id = ?", (venue_id,)
+        if days is not None:
+            where += " AND day >= ?"
+            params += ((local_today(tz) - timedelta(days=days - 1)).isoformat(),)
+
+        def grouped(column):
+            return self._connect().execute(
+                f"SELECT {column}, SUM(count) FROM rollup {where} GROUP BY 1", params
+            ).fetchall()
+
+        with self._lock:
+            by_table = grouped("table_number")
+            by_hour = grouped("hour")
+            # strftime('%w'): 0 — воскресенье
+            by_weekday = grouped("CAST(strftime('%w', day) AS INTEGER)")
+            by_type = grouped("message_type")
+            first_day = self._connect().execute(f"SELECT MIN(day) FROM rollup {where}", params).fetchone()[0]
+
+        hours = [0] * 24
+        for hour, count in by_hour:
+            hours[hour] = count
+        weekdays = [0] * 7
+        for weekday, count in by_weekday:
+            weekdays[(weekday - 1) % 7] = count  # понедельник — первый
+
+        return {
+            'total': sum(count for _, count in by_type),
+            'first_day': first_day,
+            'by_table': sorted(by_table, key=lambda item: -item[1]),
+            'by_hour': hours,
+            'by_weekday': weekdays,
+            'by_type': sorted(by_type, key=lambda item: -item[1]),
+        }
+
+
+# Общая сводка для всего процесса
+feedback_rollups = FeedbackRollups()
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# /readyz отвечает 503, если цикл событий отстает сильнее (в секундах)
+MAX_LOOP_LAG = 0.5
+
+# /healthz отвечает 503, если цикл событий не отзывался дольше (в секундах) — процесс завис
+LIVENESS_TIMEOUT = 30
+
+# Как часто замерять отставание цикла событий и за сколько последних замеров брать максимум
+LAG_PROBE_INTERVAL = 1.0
+LAG_WINDOW = 10
+
+# Результат проверки зависимости (например, запроса к Supabase) переиспользуется это время
+CHECK_TTL = 15
+
+
+class HealthMonitor:
+    """Состояние процесса для /healthz и /readyz.
+
+    - liveness: процесс отвечает, а цикл событий (если он есть) не завис;
+    - readiness: кэши прогреты, зависимости доступны, цикл событий не перегружен.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = time.monotonic()
+        self.warm = False
+        self.stopping = False
+        self.loop_lag = None
+        self._lags = deque(maxlen=LAG_WINDOW)
+        self._heartbeat = None
+        self._checks = {}
+        self._required = {}
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def add_check(self, name, check, required=None):
+        """check() возвращает True, если зависимость доступна.
+
+        required() решает, проваливает ли недоступная зависимость готовность; без него — всегда.
+        Необязательная проверка только показывается в ответе /readyz.
+        """
+        self._checks[name] = check
+        if required is not None:
+            self._required[name] = required
+
+    def mark_warm(self):
+        self.warm = True
+
+    def mark_stopping(self):
+        """Процесс останавливается: /readyz отвечает 503, чтобы на него больше не слали запросы"""
+        self.stopping = True
+
+    async def watch_event_loop(self, interval=LAG_PROBE_INTERVAL):
+        """Замерять отставание цикла событий: насколько позже заказанного просыпается sleep"""
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            # Худший замер за последние LAG_WINDOW замеров: одиночный всплеск не теряется сразу
+            self._lags.append(max(0.0, now - started - interval))
+            self.loop_lag = max(self._lags)
+            self._heartbeat = now
+
+    def _run_check(self, name):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._results.get(name)
+            if cached and now - cached[0] < CHECK_TTL:
+                return cached[1]
+        try:
+            ok = bool(self._checks[name]())
+        except Exception as e:
+            print(f"❌ Проверка {name} не прошла: {e}")
+            ok = False
+        with self._lock:
+            self._results[name] = (now, ok)
+        return ok
+
+    def _is_required(self, name):
+        required = self._required.get(name)
+        if required is None:
+            return True
+        try:
+            return bool(required())
+        except Exception as e:
+            print(f"❌ Не удалось решить, обязательна ли проверка {name}: {e}")
+            return True
+
+    def liveness(self):
+        heartbeat_age = None if self._heartbeat is None else time.monotonic() - self._heartbeat
+        ok = heartbeat_age is None or heartbeat_age < LIVENESS_TIMEOUT
+        return ok, {
+            'status': 'ok' if ok else 'stalled',
+            'process': self.name,
+            'uptime_seconds': round(time.monotonic() - self.started_at),
+            'event_loop_heartbeat_age': None if heartbeat_age is None else round(heartbeat_age, 1),
+        }
+
+    def readiness(self):
+        checks = {name: self._run_check(name) for name in self._checks}
+        checks_ok = all(passed or not self._is_required(name) for name, passed in checks.items())
+        lag_ok = self.loop_lag is None or self.loop_lag < MAX_LOOP_LAG
+        alive, _ = self.liveness()
+        ok = self.warm and not self.stopping and alive and lag_ok and checks_ok
+        return ok, {
+            'status': 'ready' if ok else 'stopping' if self.stopping else 'not_ready',
+            'process': self.name,
+            'warm': self.warm,
+            'event_loop_lag': None if self.loop_lag is None else round(self.loop_lag, 3),
+            'checks': checks,
+        }
+
+
+def write_health_response(handler, monitor, path):
+    """Ответить на /healthz или /readyz из любого BaseHTTPRequestHandler. False — путь не наш"""
+    path = path.split('?', 1)[0]
+    if path == '/healthz':
+        ok, payload = monitor.liveness()
+    elif path == '/readyz':
+        ok, payload = monitor.readiness()
+    else:
+        return False
+
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    handler.send_response(200 if ok else 503)
+    handler.send_header('Content-Type', 'application/json; charset=utf-8')
+    handler.send_header('Content-Length', str(len(body)))
+    handler.send_header('Cache-Control', 'no-store')
+    handler.end_headers()
+    handler.wfile.write(body)
+    return True
+
+
+def start_health_server(monitor, port):
+    """Отдельный HTTP-сервер с /healthz и /readyz (для процесса бота) в фоновом потоке"""
+
+    class HealthHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if not write_health_response(self, monitor, self.path):
+                self.send_error(404)
+
+        def log_message(self, format, *args):
+            # Проверки приходят каждые несколько секунд — не засоряем лог
+            pass
+
+    server = ThreadingHTTPServer(("", port), HealthHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"✅ Проверки /healthz и /readyz доступны на порту {port}")
+    return server
@@ -0,0 +1,288 @@
+import json
+import threading
+import time
+
+from config import DEFAULT_VENUE, MENU_SNAPSHOT
+from database_manager import DatabaseManager
+from menu_changes import menu_change_log
+from menu_search import MenuSearchIndex
+from menu_snapshot import menu_snapshot, venue_menu, write_snapshot
+from models import Category, Dish
+from screen_cache import ScreenCache
+
+# Как часто перечитывать меню (в секундах). Чтение идет из локальной копии,
+# поэтому это дешево; изменения из базы также приходят через change_feed
+CATALOG_TTL = 60
+
+# Как часто бот проверяет, не пора ли записать новый снимок меню (в секундах)
+SNAPSHOT_PUBLISH_INTERVAL = 5
+
+
+class MenuCatalog:
+    """Копия меню одного заведения в памяти: категории и блюда (models.Category,
+    models.Dish), поисковый индекс и кэш готовых экранов.
+
+    Методы чтения отдают то, что уже в памяти, и в базу не ходят. Меню
+    перечитывает refresh() — из обработчиков бота в потоке
+    (restaurant_bot.load_catalog), не чаще раза в CATALOG_TTL секунд. При каждом
+    изменении данных увеличивается version; неизменившиеся блюда остаются
+    теми же объектами, а поисковый индекс обновляется только для изменившихся.
+
+    При MENU_SNAPSHOT=read меню берется из снимка (menu_snapshot.py), который
+    пишет основной процесс бота, и перечитывается, только когда снимок меняется.
+    """
+
+    def __init__(self, venue_id=DEFAULT_VENUE, ttl=CATALOG_TTL):
+        self.venue_id = venue_id
+        self.ttl = ttl
+        self.version = 0
+        self.categories = []
+        self.dishes = {}
+        self.search_index = MenuSearchIndex()
+        self.screens = ScreenCache()
+        self._loaded_at = None
+        self._snapshot_etag = None
+        self._lock = threading.RLock()
+
+    def is_stale(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl
+
+    def needs_refresh(self):
+        """Пора вызвать refresh(): меню устарело, а при MENU_SNAPSHOT=read — пора проверить снимок"""
+        return MENU_SNAPSHOT == 'read' or self.is_stale()
+
+    def refresh(self, force=False):
+        """Перечитать меню из базы, если копия устарела. Возвращает True, если меню изменилось"""
+        if MENU_SNAPSHOT == 'read':
+            return self.refresh_from_snapshot()
+        if not force and not self.is_stale():
+            return False
+
+        # Читаем без блокировки каталога: одновременные обновления (из разных обработчиков)
+        # объединяются в DatabaseManager в одно чтение
+        version = self.version
+        categories = DatabaseManager.get_categories(self.venue_id)
+        dishes = DatabaseManager.get_all_dishes(self.venue_id)
+
+        with self._lock:
+            # Каталог изменили, пока шло чтение (стоп-лист, событие из базы или другое обновление):
+            # прочитанное могло устареть. Пустой ответ — скорее всего ошибка базы.
+            # В обоих случаях оставляем текущую копию до следующего обновления
+            if self.version != version or (not categories and not dishes):
+                self._loaded_at = time.monotonic()
+                return False
+
+            return self.load(categories, dishes)
+
+    def refresh_from_snapshot(self):
+        """Загрузить меню из снимка, если снимок заведения изменился"""
+        # Сравниваем только etag из заголовка: байты меню копируются, лишь когда оно изменилось
+        if menu_snapshot.get_etag(self.venue_id) in (None, self._snapshot_etag):
+            return False
+
+        with self._lock:
+            found = menu_snapshot.get_bytes(self.venue_id)
+            if found is None or found[1] == self._snapshot_etag:
+                return False
+            body, etag = found
+            menu = json.loads(body)
+            changed = self.load(
+                [Category.from_row(row) for row in menu['categories']],
+                [Dish.from_row(row) for row in menu['dishes']],
+            )
+            self._snapshot_etag = etag
+            return changed
+
+    def snapshot(self, venue):
+        """JSON меню для снимка: категории и все блюда в порядке меню"""
+        with self._lock:
+            return venue_menu(venue, self.categories, list(self.dishes.values()))
+
+    def load(self, categories, dishes):
+        """Заменить содержимое каталога. Возвращает True, если меню изменилось"""
+        with self._lock:
+            # Неизмененные блюда оставляем прежними объектами
+            dishes_by_id = {
+                dish.id: self.dishes[dish.id] if self.dishes.get(dish.id) == dish else dish
+                for dish in dishes
+            }
+            changed = categories != self.categories or dishes_by_id != self.dishes
+
+            self.categories = categories
+            self.dishes = dishes_by_id
+            self.search_index.sync([dish for dish in dishes_by_id.values() if dish.is_available])
+            self._loaded_at = time.monotonic()
+
+            if changed:
+                self.version += 1
+            return changed
+
+    def upsert_dish(self, dish):
+        """Добавить или обновить одно блюдо без перечитывания всего меню"""
+        return self.upsert_dishes([dish])
+
+    def upsert_dishes(self, dishes):
+        """Добавить или обновить несколько блюд; версия растет один раз на всю пачку.
+
+        Возвращает True, если хоть одно блюдо изменилось.
+        """
+        with self._lock:
+            changed = [dish for dish in dishes if self.dishes.get(dish.id) != dish]
+            if not changed:
+                return False
+            is_new = any(dish.id not in self.dishes for dish in changed)
+            for dish in changed:
+                self.dishes[dish.id] = dish
+                if dish.is_available:
+                    self.search_index.add_dish(dish)
+                else:
+                    self.search_index.remove_dish(dish.id)
+            if is_new:
+                # Сохраняем порядок меню
+                self.dishes = dict(sorted(self.dishes.items(), key=lambda item: item[1].sort_order))
+            self.version += 1
+            return True
+
+    def remove_dish(self, dish_id):
+        """Удалить блюдо из каталога"""
+        with self._lock:
+            if self.dishes.pop(dish_id, None) is None:
+                return
+            self.search_index.remove_dish(dish_id)
+            self.version += 1
+
+    def upsert_category(self, category):
+        """Добавить или обновить одну категорию"""
+        with self._lock:
+            categories = [c for c in self.categories if c.id != category.id]
+            categories.append(category)
+            categories.sort(key=lambda c: c.sort_order)
+            self.categories = categories
+            self.version += 1
+
+    def remove_category(self, category_id):
+        """Удалить категорию из каталога"""
+        with self._lock:
+            categories = [c for c in self.categories if c.id != category_id]
+            if len(categories) == len(self.categories):
+                return
+            self.categories = categories
+            self.version += 1
+
+    def invalidate(self):
+        """Считать каталог устаревшим: следующий refresh() перечитает его из базы"""
+        with self._lock:
+            if self._loaded_at is not None:
+                self._loaded_at = time.monotonic() - self.ttl
+
+    def get_dish(self, dish_id):
+        return self.dishes.get(dish_id)
+
+    def get_categories(self):
+        return self.categories
+
+    def get_all_dishes(self, category_id=None):
+        """Все блюда в порядке меню, включая недоступные (для стоп-листа)"""
+        return [dish for dish in self.dishes.values() if category_id is None or dish.category_id == category_id]
+
+    def find_dishes(self, name):
+        """Блюда по названию: точное совпадение без учета регистра, иначе — все, где оно входит в название"""
+        name = name.strip().casefold()
+        if not name:
+            return []
+        dishes = list(self.dishes.values())
+        exact = [dish for dish in dishes if dish.name.casefold() == name]
+        return exact or [dish for dish in dishes if name in dish.name.casefold()]
+
+    def get_category(self, category_id):
+        return next((category for category in self.categories if category.id == category_id), None)
+
+    def filter_dishes(self, menu_filter, category_id=None):
+        """Доступные блюда, подходящие под фильтр, в порядке меню"""
+        return [
+            dish for dish in self.dishes.values()
+            if dish.is_available
+            and (category_id is None or dish.category_id == category_id)
+            and menu_filter.matches(dish.flags)
+        ]
+
+    def search(self, query, limit=10):
+        """Найти доступные блюда по названию, составу и описанию"""
+        dish_ids = self.search_index.search(query, limit)
+        return [self.dishes[dish_id] for dish_id in dish_ids if dish_id in self.dishes]
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(venue_id=DEFAULT_VENUE):
+    """Каталог заведения; создается при первом обращении. Все каталоги читают
+    из одной локальной копии и одного клиента Supabase"""
+    catalog = _catalogs.get(venue_id)
+    if catalog is None:
+        with _catalogs_lock:
+            catalog = _catalogs.setdefault(venue_id, MenuCatalog(venue_id))
+    return catalog
+
+
+def all_catalogs():
+    """Уже созданные каталоги всех заведений"""
+    return list(_catalogs.values())
+
+
+# Будит поток записи снимка, не дожидаясь SNAPSHOT_PUBLISH_INTERVAL
+_publish_requested = threading.Event()
+
+
+def request_snapshot_publish():
+    """Записать снимок сразу (меню изменили из бота), а не при следующей проверке"""
+    _publish_requested.set()
+
+
+def publish_snapshot():
+    """Записать изменения меню в журнал и снимок меню всех заведений. Возвращает generation снимка.
+
+    Журнал пишется первым: страница со снимком прежней версии получит изменения
+    через /api/menu/changes, даже если запись снимка не удастся.
+    """
+    menus = {}
+    versions = {}
+    for venue in DatabaseManager.get_venues():
+        catalog = get_catalog(venue.id)
+        catalog.refresh()
+        menus[venue.id] = catalog.snapshot(venue)
+        try:
+            versions[venue.id] = menu_change_log.record(venue.id, json.loads(menus[venue.id]))
+        except Exception as e:
+            # Без версии страница просто не будет спрашивать изменения
+            print(f"❌ Ошибка при записи журнала изменений меню {venue.id}: {e}")
+    return write_snapshot(menus, versions=versions)
+
+
+def start_snapshot_publisher(interval=SNAPSHOT_PUBLISH_INTERVAL):
+    """Фоновый поток: записывает новый снимок меню, когда меняется версия какого-либо каталога"""
+    if MENU_SNAPSHOT != 'publish':
+        return None
+
+    def publish_loop():
+        published = None
+        while True:
+            try:
+                versions = []
+                for venue in DatabaseManager.get_venues():
+                    catalog = get_catalog(venue.id)
+                    catalog.refresh()
+                    versions.append((venue.id, venue.name, catalog.version))
+                if versions != published:
+                    generation = publish_snapshot()
+                    published = versions
+                    print(f"✅ Снимок меню записан ({generation})")
+            except Exception as e:
+                print(f"❌ Ошибка при записи снимка меню: {e}")
+            _publish_requested.wait(interval)
+            _publish_requested.clear()
+
+    thread = threading.Thread(target=publish_loop, daemon=True)
+    thread.start()
+    return thread
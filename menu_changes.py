@@ -0,0 +1,171 @@
+"""Журнал изменений меню с версиями для обновления открытых Mini App.
+
+Бот при каждой записи снимка меню (menu_catalog.publish_snapshot) сверяет
+меню заведения с прошлым опубликованным и записывает изменившиеся блюда и
+категории с новой версией. Версия одна на весь журнал и только растет; она
+же пишется в заголовок снимка, поэтому страница знает, с какой версии
+спрашивать изменения.
+
+Веб-сервер отвечает на /api/menu/changes?since=<версия> строками, которые
+изменились после since, — по одной последней на блюдо или категорию. От
+удаленных строк остаются метки (row = NULL); метки старше
+TOMBSTONE_RETENTION удаляются, и клиент с более старой версией получает
+reset — загрузить меню целиком.
+
+Журнал — SQLite-файл в DATA_DIR (WAL): пишет процесс бота, читает веб-сервер.
+Модуль не зависит от config, как и menu_snapshot.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CHANGES_PATH = os.path.join(os.environ.get("DATA_DIR") or "data", "menu_changes.sqlite3")
+
+# Сколько хранить метки удаленных блюд и категорий (в секундах)
+TOMBSTONE_RETENTION = 7 * 24 * 60 * 60
+
+# Виды строк журнала и их списки в меню заведения (menu_snapshot.venue_menu)
+KINDS = {'category': 'categories', 'dish': 'dishes'}
+
+
+def _row_text(row):
+    return json.dumps(row, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+
+class MenuChangeLog:
+    """Последнее состояние каждой строки меню с версией, в которой она изменилась"""
+
+    def __init__(self, path=CHANGES_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = None
+        self._stats = {'recorded_versions': 0, 'queries': 0, 'resets': 0}
+
+    def _connect(self):
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS items (
+                    venue_id TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    item_id INTEGER NOT NULL,
+                    row TEXT,
+                    version INTEGER NOT NULL,
+                    changed_at REAL NOT NULL,
+                    PRIMARY KEY (venue_id, kind, item_id)
+                )
+            """)
+            connection.execute("CREATE INDEX IF NOT EXISTS items_by_version ON items (venue_id, version)")
+            connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._connection = connection
+        return self._connection
+
+    @staticmethod
+    def _meta(connection, key):
+        row = connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def version(self):
+        """Текущая версия журнала (0, если он пуст)"""
+        with self._lock:
+            return self._meta(self._connect(), 'version')
+
+    def record(self, venue_id, menu):
+        """Записать изменения меню заведения (dict из venue_menu) относительно прошлого вызова.
+
+        Возвращает версию журнала после записи; если ничего не изменилось, версия прежняя.
+        """
+        rows = {}
+        for kind, section in KINDS.items():
+            for row in menu[section]:
+                rows[(kind, row['id'])] = _row_text(row)
+
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                current = {
+                    (kind, item_id): row
+                    for kind, item_id, row in connection.execute(
+                        "SELECT kind, item_id, row FROM items WHERE venue_id = ?", (venue_id,))
+                }
+                changed = [(key, row) for key, row in rows.items() if current.get(key) != row]
+                changed += [(key, None) for key, row in current.items() if row is not None and key not in rows]
+                version = self._meta(connection, 'version')
+                if changed:
+                    version += 1
+                    now = time.time()
+                    connection.executemany(
+                        "INSERT OR REPLACE INTO items (venue_id, kind, item_id, row, version, changed_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        [(venue_id, kind, item_id, row, version, now) for (kind, item_id), row in changed],
+                    )
+                    connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (version,))
+                    self._prune(connection, now - TOMBSTONE_RETENTION)
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+            if changed:
+                self._stats['recorded_versions'] += 1
+        return version
+
+    def _prune(self, connection, cutoff):
+        """Удалить старые метки удаления; клиенты старше них получат reset"""
+        pruned = connection.execute(
+            "SELECT MAX(version) FROM items WHERE row IS NULL AND changed_at < ?", (cutoff,)).fetchone()[0]
+        if pruned is None:
+            return
+        connection.execute("DELETE FROM items WHERE row IS NULL AND changed_at < ?", (cutoff,))
+        connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('pruned_version', "
+                           "MAX(?, COALESCE((SELECT value FROM meta WHERE key = 'pruned_version'), 0)))", (pruned,))
+
+    def changes(self, venue_id, since):
+        """Изменения меню заведения после версии since:
+
+            {'version': N, 'categories': [...], 'dishes': [...],
+             'deleted_categories': [id, ...], 'deleted_dishes': [id, ...]}
+
+        (пустые списки не передаются) или {'version': N, 'reset': True}, если since неизвестна журналу.
+        """
+        with self._lock:
+            connection = self._connect()
+            # Версия и строки — из одного снимка базы, даже если бот сейчас пишет
+            connection.execute("BEGIN")
+            try:
+                version = self._meta(connection, 'version')
+                if since > version or since < self._meta(connection, 'pruned_version'):
+                    self._stats['resets'] += 1
+                    return {'version': version, 'reset': True}
+                found = connection.execute(
+                    "SELECT kind, item_id, row FROM items WHERE venue_id = ? AND version > ? ORDER BY version",
+                    (venue_id, since)).fetchall()
+            finally:
+                connection.execute("COMMIT")
+            self._stats['queries'] += 1
+
+        result = {'version': version}
+        for kind, section in KINDS.items():
+            rows = [json.loads(row) for row_kind, _, row in found if row_kind == kind and row is not None]
+            deleted = [item_id for row_kind, item_id, row in found if row_kind == kind and row is None]
+            if rows:
+                result[section] = rows
+            if deleted:
+                result[f'deleted_{section}'] = deleted
+        return result
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['version'] = self.version()
+        return stats
+
+
+# Журнал изменений меню для процесса
+menu_change_log = MenuChangeLog()
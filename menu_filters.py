@@ -0,0 +1,210 @@
+# Битовые маски аллергенов, остроты и особенностей блюд.
+# Строки allergens/features/spiciness разбираются один раз при загрузке меню,
+# после чего фильтр по блюду — это несколько побитовых операций.
+
+# Аллергены и их эмодзи. Порядок задает номер бита — не меняйте его,
+# тот же порядок используется в static/script.js
+ALLERGENS = {
+    'Яйца': '🥚',
+    'Кунжут': '⚫',
+    'Лактоза': '🥛',
+    'Орехи': '🥜',
+    'Рыба': '🐟',
+    'Морепродукты': '🦐',
+    'Глютен': '🌾',
+    'Соя': '🫘',
+}
+
+# Уровни остроты по возрастанию. Регулируемую остроту можно сделать мягкой,
+# поэтому она стоит сразу после "Не острое"
+SPICINESS_LEVELS = [
+    'Не острое',
+    'Острота регулируется',
+    'Менее острое',
+    'Средней остроты',
+    'Острое',
+    'Очень острое',
+]
+
+# Особенности блюд: строка в базе -> как показывать гостю
+FEATURES = {
+    'Подходит детям': '👶 Подходит детям',
+    'Подойдет на общий стол': '👥 Подойдет на общий стол',
+    'Содержит лактозу': '🥛 Содержит лактозу',
+    'Подается с перчатками': '🧤 Подается с перчатками',
+    'Подается с тарелкой теплой воды': '♨️ Подается с тарелкой теплой воды',
+    'Острота не регулируется': '⚡ Острота не регулируется',
+    'Соевый соус средней остроты': '🍶 Соевый соус средней остроты',
+    'Можно подогреть': '🔥 Можно подогреть',
+    'Можно сделать острее': '🌶️ Можно сделать острее',
+    'Спрашивать про рис': '🍚 Спрашивать про рис',
+    'Подается с доп.ингредиентами': '🧂 Подается с дополнительными ингредиентами',
+    'Только на втором этаже': '🏠 Только на втором этаже',
+    'Кимчи средней остроты': '🥬 Кимчи средней остроты',
+    'Острый только спайси соус': '🌶️ Острый только спайси соус',
+    'Спрашивать вес на кухне': '⚖️ Спрашивать вес на кухне',
+    'Подается с топпингом': '🍓 Подается с топпингом',
+    'Топпинг отдельно': '🥄 Топпинг пробивается отдельно',
+    'Подается с мороженым': '🍦 Подается с мороженым',
+    '3 вкуса на выбор': '🎨 3 вкуса на выбор',
+    'Подается с двумя топпингами': '🍫🍓 Подается с двумя топпингами',
+    'Украшается микрозеленью': '🌱 Украшается микрозеленью',
+    'Бизнес ланч': '🏢 Бизнес ланч',
+}
+
+ALLERGEN_BITS = {name: 1 << i for i, name in enumerate(ALLERGENS)}
+SPICINESS_BITS = {name: 1 << i for i, name in enumerate(SPICINESS_LEVELS)}
+FEATURE_BITS = {name: 1 << i for i, name in enumerate(FEATURES)}
+
+# Неизвестный аллерген — отдельный бит, чтобы такие блюда тоже можно было исключить
+UNKNOWN_ALLERGEN_BIT = 1 << len(ALLERGENS)
+
+KID_FRIENDLY = 'Подходит детям'
+
+
+class DishFlags:
+    """Предразобранные признаки блюда"""
+
+    __slots__ = ('allergens', 'spiciness', 'features', 'unknown_allergens')
+
+    def __init__(self, allergens, spiciness, features, unknown_allergens=()):
+        self.allergens = allergens
+        self.spiciness = spiciness
+        self.features = features
+        self.unknown_allergens = unknown_allergens
+
+    def allergen_names(self):
+        names = [name for name, bit in ALLERGEN_BITS.items() if self.allergens & bit]
+        return names + list(self.unknown_allergens)
+
+    def feature_labels(self):
+        return [FEATURES[name] for name, bit in FEATURE_BITS.items() if self.features & bit]
+
+
+def dish_flags(dish):
+    """Разобрать строки блюда в битовые маски (один раз при загрузке меню)"""
+    allergens = 0
+    unknown = []
+    for allergen in (dish.get('allergens') or '').split(','):
+        allergen = allergen.strip()
+        if not allergen:
+            continue
+        bit = ALLERGEN_BITS.get(allergen)
+        if bit is None:
+            allergens |= UNKNOWN_ALLERGEN_BIT
+            unknown.append(allergen)
+        else:
+            allergens |= bit
+
+    features = 0
+    features_text = dish.get('features') or ''
+    if features_text:
+        for name, bit in FEATURE_BITS.items():
+            if name in features_text:
+                features |= bit
+
+    # "Содержит лактозу" в особенностях — тоже аллерген
+    if features & FEATURE_BITS['Содержит лактозу']:
+        allergens |= ALLERGEN_BITS['Лактоза']
+
+    spiciness = SPICINESS_BITS.get(dish.get('spiciness') or 'Не острое', SPICINESS_BITS['Не острое'])
+
+    return DishFlags(allergens, spiciness, features, tuple(unknown))
+
+
+def format_allergen_flags(flags):
+    """Аллергены с эмодзи, как в DatabaseManager.format_allergens, но из маски"""
+    formatted = [f"{ALLERGENS[name]} {name}" for name, bit in ALLERGEN_BITS.items() if flags.allergens & bit]
+    formatted += [f"⚠️ {name}" for name in flags.unknown_allergens]
+    return " | ".join(formatted)
+
+
+class MenuFilter:
+    """Фильтр меню: исключенные аллергены, максимальная острота, обязательные особенности"""
+
+    __slots__ = ('exclude', 'spiciness', 'features')
+
+    ALL_SPICINESS = (1 << len(SPICINESS_LEVELS)) - 1
+
+    def __init__(self, exclude=0, max_spice=None, features=0):
+        self.exclude = exclude
+        self.features = features
+        if max_spice is None:
+            self.spiciness = self.ALL_SPICINESS
+        else:
+            # Все уровни до max_spice включительно
+            self.spiciness = (1 << (max_spice + 1)) - 1
+
+    @property
+    def max_spice(self):
+        if self.spiciness == self.ALL_SPICINESS:
+            return None
+        return self.spiciness.bit_length() - 1
+
+    def is_empty(self):
+        return not self.exclude and not self.features and self.spiciness == self.ALL_SPICINESS
+
+    def matches(self, flags):
+        return (not flags.allergens & self.exclude
+                and flags.spiciness & self.spiciness
+                and flags.features & self.features == self.features)
+
+    @classmethod
+    def parse(cls, text):
+        """Разобрать фильтр вида "exclude=Орехи,Лактоза; max_spice=Средней остроты; kid_friendly".
+
+        max_spice можно указать названием уровня или его номером (0 — не острое).
+        Неизвестные аллергены и уровни остроты вызывают ValueError.
+        """
+        exclude = 0
+        max_spice = None
+        features = 0
+
+        for part in (text or '').split(';'):
+            key, _, value = part.strip().partition('=')
+            key = key.strip()
+            value = value.strip()
+            if not key:
+                continue
+
+            if key == 'exclude':
+                for allergen in value.split(','):
+                    allergen = allergen.strip()
+                    if not allergen:
+                        continue
+                    if allergen not in ALLERGEN_BITS:
+                        raise ValueError(f"Неизвестный аллерген: {allergen}")
+                    exclude |= ALLERGEN_BITS[allergen]
+            elif key == 'max_spice':
+                if value.isdigit() and int(value) < len(SPICINESS_LEVELS):
+                    max_spice = int(value)
+                elif value in SPICINESS_BITS:
+                    max_spice = SPICINESS_LEVELS.index(value)
+                else:
+                    raise ValueError(f"Неизвестный уровень остроты: {value}")
+            elif key == 'kid_friendly':
+                if value.lower() not in ('0', 'false', 'no'):
+                    features |= FEATURE_BITS[KID_FRIENDLY]
+            elif key == 'features':
+                for feature in value.split(','):
+                    feature = feature.strip()
+                    if feature not in FEATURE_BITS:
+                        raise ValueError(f"Неизвестная особенность: {feature}")
+                    features |= FEATURE_BITS[feature]
+            else:
+                raise ValueError(f"Неизвестный параметр фильтра: {key}")
+
+        return cls(exclude, max_spice, features)
+
+    def to_query(self):
+        """Обратное к parse — строка фильтра"""
+        parts = []
+        if self.exclude:
+            parts.append("exclude=" + ",".join(name for name, bit in ALLERGEN_BITS.items() if self.exclude & bit))
+        if self.max_spice is not None:
+            parts.append(f"max_spice={self.max_spice}")
+        if self.features == FEATURE_BITS[KID_FRIENDLY]:
+            parts.append("kid_friendly")
+        elif self.features:
+            parts.append("features=" + ",".join(name for name, bit in FEATURE_BITS.items() if self.features & bit))
+        return "; ".join(parts)
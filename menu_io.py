@@ -0,0 +1,435 @@
+"""Выгрузка и загрузка меню (категории и блюда) в JSON или CSV.
+
+    python menu_io.py export menu.json        # обе таблицы в одном JSON
+    python menu_io.py export menu/            # menu/categories.csv и menu/dishes.csv
+    python menu_io.py import menu.json --dry-run
+    python menu_io.py import menu/ --delete-missing
+    python menu_io.py export menu.json --venue center   # меню другого заведения
+
+При загрузке файл сравнивается с текущими данными, и в базу уходят только
+изменившиеся строки — пачками, по несколько сотен строк на запрос. Если
+какой-то шаг не удался, уже записанные изменения откатываются.
+
+Строки без id — новые, ключ назначит база. Новое блюдо может ссылаться
+только на категорию, у которой уже есть id (в базе или в файле).
+Строки, которых нет в файле, удаляются только с --delete-missing.
+Выгрузка и загрузка работают с меню одного заведения (--venue, по умолчанию
+DEFAULT_VENUE): все строки файла записываются в это заведение. id общие для
+всех заведений, поэтому строки с id другого заведения (выгрузка одного
+заведения, загруженная в другое) добавляются как новые, а ссылки блюд на
+такие категории переводятся на новые id — меню копируется, а не переносится.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+
+from config import DEFAULT_VENUE
+from database_manager import (DatabaseManager, BULK_BATCH_SIZE,
+                              DEFAULT_COOKING_TIMES, DEFAULT_COOKING_TIME)
+from menu_catalog import get_catalog
+
+# Таблицы меню и их ключи в порядке записи: категории раньше блюд, которые на них ссылаются
+MENU_TABLES = {
+    'categories': 'id',
+    'dishes': 'id',
+}
+
+# Столбцы, которые заполняет база: не выгружаются и не сравниваются
+SERVER_COLUMNS = {'created_at', 'updated_at'}
+
+# Ссылки между таблицами меню: таблица -> {столбец: таблица, на ключ которой он ссылается}
+REFERENCES = {
+    'dishes': {'category_id': 'categories'},
+}
+
+# Целочисленные столбцы — на случай, если в базе еще нет ни одного значения для образца
+INTEGER_COLUMNS = {'id', 'category_id', 'sort_order', 'cooking_time'}
+
+# Сколько строк каждого вида показывать в отчете
+REPORT_LIMIT = 20
+
+
+class MenuImportError(Exception):
+    pass
+
+
+class TableDiff:
+    """Разница между файлом и базой для одной таблицы"""
+
+    __slots__ = ('table', 'key_column', 'columns', 'inserts', 'updates', 'missing', 'unchanged', 'sources')
+
+    def __init__(self, table, key_column, columns):
+        self.table = table
+        self.key_column = key_column
+        self.columns = columns
+        self.inserts = []    # строки из файла, которых нет в базе
+        self.updates = []    # (строка в базе, строка из файла, измененные столбцы)
+        self.missing = []    # строки в базе, которых нет в файле
+        self.unchanged = 0
+        self.sources = []    # для каждой вставки без ключа — id из файла (строка другого заведения) или None
+
+    def has_changes(self, delete_missing=False):
+        return bool(self.inserts or self.updates or (delete_missing and self.missing))
+
+    def request_count(self, delete_missing=False):
+        """Сколько запросов на запись потребуется"""
+        new = sum(1 for row in self.inserts if row.get(self.key_column) is None)
+        keyed = len(self.inserts) - new + len(self.updates)
+        deleted = len(self.missing) if delete_missing else 0
+        return sum(-(-count // BULK_BATCH_SIZE) for count in (keyed, new, deleted))
+
+
+# --- ЧТЕНИЕ И ЗАПИСЬ ФАЙЛОВ ---
+
+def _to_csv(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _from_csv(value, column, sample):
+    """Строка из CSV -> значение того же типа, что и в базе"""
+    if value is None or value == '':
+        return None
+    if isinstance(sample, bool):
+        return value.strip().lower() in ('true', '1', 'yes', 'да', '+')
+    if isinstance(sample, int) or (sample is None and column in INTEGER_COLUMNS):
+        return int(value)
+    if isinstance(sample, float):
+        return float(value)
+    if isinstance(sample, (list, dict)):
+        return json.loads(value)
+    return value
+
+
+def _columns(rows):
+    """Все столбцы строк в порядке первого появления"""
+    columns = {}
+    for row in rows:
+        for column in row:
+            columns.setdefault(column, None)
+    return list(columns)
+
+
+def write_menu(path, tables):
+    """Записать таблицы в JSON-файл (path оканчивается на .json) или в папку с CSV"""
+    if path.endswith('.json'):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(tables, f, ensure_ascii=False, indent=2)
+        return
+
+    os.makedirs(path, exist_ok=True)
+    for table, rows in tables.items():
+        columns = _columns(rows)
+        # utf-8-sig — чтобы Excel правильно открыл кириллицу
+        with open(os.path.join(path, f"{table}.csv"), 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({column: _to_csv(row.get(column)) for column in columns})
+
+
+def read_menu(path, current):
+    """Прочитать таблицы из JSON, папки с CSV или одного CSV (categories.csv / dishes.csv).
+
+    Значения из CSV приводятся к типам столбцов в базе (current).
+    """
+    if path.endswith('.json'):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return {table: data[table] for table in MENU_TABLES if table in data}
+
+    if os.path.isdir(path):
+        files = {table: os.path.join(path, f"{table}.csv") for table in MENU_TABLES}
+        files = {table: file for table, file in files.items() if os.path.exists(file)}
+    else:
+        table = os.path.splitext(os.path.basename(path))[0]
+        if table not in MENU_TABLES:
+            raise MenuImportError(f"по имени файла {path} непонятно, какая это таблица")
+        files = {table: path}
+
+    tables = {}
+    for table, file in files.items():
+        samples = {}
+        for row in current[table]:
+            for column, value in row.items():
+                if value is not None:
+                    samples.setdefault(column, value)
+
+        with open(file, encoding='utf-8-sig', newline='') as f:
+            tables[table] = [
+                {column: _from_csv(value, column, samples.get(column)) for column, value in row.items()}
+                for row in csv.DictReader(f)
+            ]
+    return tables
+
+
+# --- ВЫГРУЗКА ---
+
+def load_current(venue_id=DEFAULT_VENUE):
+    """Текущие строки меню заведения напрямую из Supabase (не из локальной копии)"""
+    current = {}
+    for table in MENU_TABLES:
+        rows = DatabaseManager.get_all_rows(table, venue_id)
+        if rows is None:
+            raise MenuImportError(f"не удалось прочитать таблицу {table}")
+        current[table] = sorted(rows, key=lambda row: (row.get('sort_order') or 0, row.get('id') or 0))
+    return current
+
+
+def _strip(row):
+    return {column: value for column, value in row.items() if column not in SERVER_COLUMNS}
+
+
+def export_menu(path, venue_id=DEFAULT_VENUE):
+    tables = {}
+    for table, rows in load_current(venue_id).items():
+        rows = [_strip(row) for row in rows]
+        if table == 'dishes':
+            # Время приготовления, которого еще нет в базе, берем из таблицы по умолчанию
+            for row in rows:
+                if row.get('cooking_time') is None:
+                    row['cooking_time'] = DEFAULT_COOKING_TIMES.get(row.get('name'), DEFAULT_COOKING_TIME)
+        tables[table] = rows
+
+    write_menu(path, tables)
+    return {table: len(rows) for table, rows in tables.items()}
+
+
+# --- ЗАГРУЗКА ---
+
+def _same(a, b):
+    # Пустая строка в CSV и NULL в базе — одно и то же
+    if a in (None, '') and b in (None, ''):
+        return True
+    return a == b
+
+
+def diff_table(table, current_rows, file_rows, foreign_keys=()):
+    """foreign_keys — id строк другого заведения: они вставляются как новые строки без id"""
+    key_column = MENU_TABLES[table]
+    columns = [column for column in _columns(file_rows) if column not in SERVER_COLUMNS]
+    diff = TableDiff(table, key_column, columns)
+    current = {row[key_column]: row for row in current_rows}
+    seen = set()
+
+    for row in file_rows:
+        row = {column: row.get(column) for column in columns}
+        key = row.get(key_column)
+        if key is not None:
+            if key in seen:
+                raise MenuImportError(f"{table}: {key_column}={key} встречается в файле дважды")
+            seen.add(key)
+
+        if key is None or key in foreign_keys:
+            row[key_column] = None
+            diff.inserts.append(row)
+            diff.sources.append(key)
+            continue
+
+        before = current.get(key)
+        if before is None:
+            diff.inserts.append(row)
+            continue
+
+        changed = [column for column in columns if not _same(before.get(column), row[column])]
+        if changed:
+            # Неизмененные столбцы отправляем как есть в базе ('' не превращается в NULL)
+            row.update({column: before[column] for column in columns
+                        if column not in changed and column in before})
+            diff.updates.append((before, row, changed))
+        else:
+            diff.unchanged += 1
+
+    diff.missing = [row for key, row in current.items() if key not in seen]
+    return diff
+
+
+def foreign_keys(tables, current, venue_id):
+    """{таблица: id из файла, которые принадлежат другим заведениям}"""
+    foreign = {}
+    for table, key_column in MENU_TABLES.items():
+        own = {row[key_column] for row in current[table]}
+        keys = {row.get(key_column) for row in tables.get(table, [])} - own - {None}
+        if not keys:
+            continue
+        owners = DatabaseManager.get_key_venues(table, key_column, keys)
+        if owners is None:
+            raise MenuImportError(f"не удалось проверить id строк таблицы {table}")
+        foreign[table] = {key for key, owner in owners.items() if owner != venue_id}
+    return foreign
+
+
+def plan_import(tables, current, foreign=None):
+    """Сравнить файл с базой и проверить ссылки блюд на категории.
+
+    foreign — id строк других заведений (foreign_keys): они станут новыми строками.
+    """
+    foreign = foreign or {}
+    plan = [diff_table(table, current[table], tables[table], foreign.get(table, ()))
+            for table in MENU_TABLES if table in tables]
+
+    if 'dishes' in tables:
+        if 'categories' in tables:
+            category_ids = {row.get('id') for row in tables['categories']}
+        else:
+            category_ids = {row['id'] for row in current['categories']}
+        for row in tables['dishes']:
+            if row.get('category_id') not in category_ids:
+                raise MenuImportError(
+                    f"dishes: у блюда «{row.get('name')}» категория {row.get('category_id')} "
+                    f"не найдена (новой категории нужно задать id)"
+                )
+    return plan
+
+
+def _label(row, key_column):
+    return f"{row.get(key_column) or 'новая'} {row.get('name') or ''}".strip()
+
+
+def format_report(plan, delete_missing=False):
+    lines = []
+    requests = 0
+    for diff in plan:
+        deleted = len(diff.missing) if delete_missing else 0
+        lines.append(
+            f"📋 {diff.table}: +{len(diff.inserts)} ~{len(diff.updates)} -{deleted}, "
+            f"без изменений {diff.unchanged}"
+        )
+        for row in diff.inserts[:REPORT_LIMIT]:
+            lines.append(f"  + {_label(row, diff.key_column)}")
+        for before, row, changed in diff.updates[:REPORT_LIMIT]:
+            lines.append(f"  ~ {_label(before, diff.key_column)}: {', '.join(changed)}")
+        for row in diff.missing[:REPORT_LIMIT]:
+            action = "-" if delete_missing else "? нет в файле (удалится с --delete-missing):"
+            lines.append(f"  {action} {_label(row, diff.key_column)}")
+        hidden = max(0, len(diff.inserts) - REPORT_LIMIT) + max(0, len(diff.updates) - REPORT_LIMIT) \
+            + max(0, len(diff.missing) - REPORT_LIMIT)
+        if hidden:
+            lines.append(f"  ... и еще {hidden}")
+        requests += diff.request_count(delete_missing)
+
+    lines.append(f"Запросов на запись: {requests}")
+    return "\n".join(lines)
+
+
+def apply_plan(plan, delete_missing=False):
+    """Записать изменения; при ошибке откатить уже записанное.
+
+    Порядок: категории и блюда записываются (категории первыми), затем
+    удаляются лишние блюда и только потом лишние категории.
+    """
+    undo = []
+    # id строк другого заведения из файла -> id новых строк, по таблицам
+    new_keys = {}
+
+    def step(result, description):
+        if result is None or result is False:
+            raise MenuImportError(f"не удалось {description}")
+        return result
+
+    try:
+        for diff in plan:
+            for column, target in REFERENCES.get(diff.table, {}).items():
+                renamed = new_keys.get(target)
+                if renamed:
+                    for row in diff.inserts + [row for _, row, _ in diff.updates]:
+                        row[column] = renamed.get(row.get(column), row.get(column))
+
+            keyed = [row for row in diff.inserts if row.get(diff.key_column) is not None]
+            keyed += [row for _, row, _ in diff.updates]
+            if keyed:
+                step(DatabaseManager.upsert_rows(diff.table, keyed, diff.key_column), f"записать {diff.table}")
+                previous = [_strip(before) for before, _, _ in diff.updates]
+                created = [row[diff.key_column] for row in diff.inserts if row.get(diff.key_column) is not None]
+                undo.append((diff, previous, created))
+
+            new = [{column: value for column, value in row.items() if column != diff.key_column}
+                   for row in diff.inserts if row.get(diff.key_column) is None]
+            if new:
+                written = step(DatabaseManager.insert_rows(diff.table, new), f"добавить строки в {diff.table}")
+                undo.append((diff, [], [row[diff.key_column] for row in written]))
+                # Строки возвращаются в порядке вставки
+                new_keys[diff.table] = {source: row[diff.key_column]
+                                        for source, row in zip(diff.sources, written) if source is not None}
+
+        if delete_missing:
+            for diff in reversed(plan):
+                if diff.missing:
+                    keys = [row[diff.key_column] for row in diff.missing]
+                    step(DatabaseManager.delete_rows(diff.table, diff.key_column, keys), f"удалить строки из {diff.table}")
+                    undo.append((diff, [_strip(row) for row in diff.missing], []))
+    except MenuImportError:
+        _rollback(undo)
+        raise
+
+
+def _rollback(undo):
+    print("↩️ Откатываем уже записанные изменения...")
+    ok = True
+    for diff, previous, created in reversed(undo):
+        if created and not DatabaseManager.delete_rows(diff.table, diff.key_column, created):
+            ok = False
+        if previous and DatabaseManager.upsert_rows(diff.table, previous, diff.key_column) is None:
+            ok = False
+    print("✅ Откат выполнен" if ok else "❌ Откат выполнен не полностью — проверьте меню в базе")
+
+
+def import_menu(path, dry_run=False, delete_missing=False, venue_id=DEFAULT_VENUE):
+    """Загрузить меню заведения из файла. Возвращает отчет об изменениях"""
+    current = load_current(venue_id)
+    tables = read_menu(path, current)
+    for rows in tables.values():
+        for row in rows:
+            row['venue_id'] = venue_id
+    plan = plan_import(tables, current, foreign_keys(tables, current, venue_id))
+    report = format_report(plan, delete_missing)
+
+    if dry_run or not any(diff.has_changes(delete_missing) for diff in plan):
+        return report
+
+    apply_plan(plan, delete_missing)
+
+    # Одно обновление локальной копии и каталога на всю загрузку
+    DatabaseManager.sync_replica()
+    get_catalog(venue_id).refresh(force=True)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Выгрузка и загрузка меню")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = commands.add_parser('export', help="выгрузить меню в файл")
+    export_parser.add_argument('path', help="menu.json или папка для categories.csv и dishes.csv")
+    export_parser.add_argument('--venue', default=DEFAULT_VENUE, help="id заведения")
+
+    import_parser = commands.add_parser('import', help="загрузить меню из файла")
+    import_parser.add_argument('path', help="menu.json, папка с CSV или categories.csv / dishes.csv")
+    import_parser.add_argument('--dry-run', action='store_true', help="только показать изменения")
+    import_parser.add_argument('--delete-missing', action='store_true',
+                               help="удалить строки, которых нет в файле")
+    import_parser.add_argument('--venue', default=DEFAULT_VENUE, help="id заведения")
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == 'export':
+            counts = export_menu(args.path, args.venue)
+            print(f"✅ Меню выгружено в {args.path}: " + ", ".join(f"{t} — {n}" for t, n in counts.items()))
+        else:
+            print(import_menu(args.path, args.dry_run, args.delete_missing, args.venue))
+            print("ℹ️ Пробный запуск, база не изменена" if args.dry_run else "✅ Меню загружено")
+    except (MenuImportError, OSError, ValueError) as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
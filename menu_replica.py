@@ -0,0 +1,213 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from config import DEFAULT_VENUE
+
+# Зеркалируемые таблицы: ключевой столбец (или несколько) и столбцы, по которым нужны запросы.
+# Листы, файлы и администраторы у каждого заведения свои — их ключ включает venue_id
+REPLICA_TABLES = {
+    'venues': ('id', ['sort_order']),
+    'categories': ('id', ['venue_id', 'sort_order']),
+    'dishes': ('id', ['venue_id', 'category_id', 'sort_order', 'is_available']),
+    'sheets': (('venue_id', 'sheet_type'), ['venue_id']),
+    'files': (('venue_id', 'file_type'), ['venue_id']),
+    'admins': (('venue_id', 'user_id'), ['venue_id']),
+}
+
+# Версия схемы файла: при изменении REPLICA_TABLES копия пересоздается и синхронизируется заново
+REPLICA_SCHEMA_VERSION = 3
+
+_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_categories_sort ON categories (venue_id, sort_order)",
+    "CREATE INDEX IF NOT EXISTS idx_dishes_category ON dishes (category_id, is_available, sort_order)",
+    "CREATE INDEX IF NOT EXISTS idx_dishes_sort ON dishes (venue_id, sort_order)",
+    "CREATE INDEX IF NOT EXISTS idx_sheets_venue ON sheets (venue_id)",
+    "CREATE INDEX IF NOT EXISTS idx_files_venue ON files (venue_id)",
+    "CREATE INDEX IF NOT EXISTS idx_admins_venue ON admins (venue_id)",
+]
+
+
+def row_venue(row):
+    """Заведение строки; строки, записанные до появления venue_id, относятся к заведению по умолчанию"""
+    return row.get('venue_id') or DEFAULT_VENUE
+
+
+def row_key(key_column, row):
+    """Ключ строки: значение ключевого столбца или 'заведение:значение' для составного ключа"""
+    if isinstance(key_column, tuple):
+        values = [row_venue(row) if column == 'venue_id' else row.get(column) for column in key_column]
+        if any(value is None for value in values):
+            return None
+        return ":".join(str(value) for value in values)
+    return row.get(key_column)
+
+
+def key_record(key_column, key):
+    """Обратно к row_key: {столбец: значение} по ключу (для событий об удалении)"""
+    if isinstance(key_column, tuple):
+        return dict(zip(key_column, str(key).split(":", len(key_column) - 1)))
+    return {key_column: key}
+
+
+def _column_value(row, column):
+    value = row.get(column)
+    if column == 'is_available':
+        return 1 if value is True else 0
+    if column == 'venue_id':
+        return row_venue(row)
+    return value
+
+
+class MenuReplica:
+    """Локальная копия меню и справочных таблиц в SQLite.
+
+    Хранит строки целиком (JSON) плюс столбцы для индексов. Состояние
+    синхронизации (курсор updated_at, время, число строк) хранится в том же
+    файле, поэтому после перезапуска копия сразу готова к чтению — даже
+    если Supabase недоступен.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = None
+        self._ready = False
+
+    def _connect(self):
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            if connection.execute("PRAGMA user_version").fetchone()[0] != REPLICA_SCHEMA_VERSION:
+                # Копия в старом формате — проще собрать заново, чем переносить
+                for table in list(REPLICA_TABLES) + ['sync_state']:
+                    connection.execute(f"DROP TABLE IF EXISTS {table}")
+                connection.execute(f"PRAGMA user_version = {REPLICA_SCHEMA_VERSION}")
+            for table, (_, columns) in REPLICA_TABLES.items():
+                extra = "".join(f", {column}" for column in columns)
+                connection.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} (key PRIMARY KEY{extra}, updated_at TEXT, data TEXT NOT NULL)"
+                )
+            for statement in _INDEXES:
+                connection.execute(statement)
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    table_name TEXT PRIMARY KEY,
+                    cursor TEXT,
+                    synced_at REAL NOT NULL
+                )
+            """)
+            self._connection = connection
+        return self._connection
+
+    # --- ЗАПИСЬ (синхронизация) ---
+
+    def _write_rows(self, connection, table, rows):
+        key_column, columns = REPLICA_TABLES[table]
+        placeholders = ", ".join("?" * (len(columns) + 3))
+        names = ", ".join(["key"] + columns + ["updated_at", "data"])
+        values = [
+            [row_key(key_column, row)] + [_column_value(row, column) for column in columns]
+            + [row.get('updated_at'), json.dumps(row, ensure_ascii=False)]
+            for row in rows
+        ]
+        connection.executemany(f"INSERT OR REPLACE INTO {table} ({names}) VALUES ({placeholders})", values)
+
+    def upsert_rows(self, table, rows):
+        with self._lock:
+            self._write_rows(self._connect(), table, rows)
+
+    def delete_keys(self, table, keys):
+        with self._lock:
+            self._connect().executemany(f"DELETE FROM {table} WHERE key = ?", [(key,) for key in keys])
+
+    def replace_table(self, table, rows):
+        """Полностью заменить содержимое таблицы (для таблиц без updated_at)"""
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN")
+            try:
+                connection.execute(f"DELETE FROM {table}")
+                self._write_rows(connection, table, rows)
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+
+    def get_keys(self, table):
+        with self._lock:
+            return {row[0] for row in self._connect().execute(f"SELECT key FROM {table}")}
+
+    def get_cursor(self, table):
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT cursor FROM sync_state WHERE table_name = ?", (table,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def mark_synced(self, table, cursor):
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO sync_state (table_name, cursor, synced_at) VALUES (?, ?, ?)",
+                (table, cursor, time.time())
+            )
+
+    # --- ЧТЕНИЕ ---
+
+    def is_ready(self):
+        """Все таблицы хотя бы раз синхронизированы (возможно, в прошлом запуске)"""
+        if not self._ready:
+            with self._lock:
+                synced = self._connect().execute("SELECT COUNT(*) FROM sync_state").fetchone()[0]
+            self._ready = synced == len(REPLICA_TABLES)
+        return self._ready
+
+    def _select(self, sql, params=()):
+        with self._lock:
+            rows = self._connect().execute(sql, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get_venues(self):
+        return self._select("SELECT data FROM venues ORDER BY sort_order")
+
+    def get_categories(self, venue_id):
+        return self._select("SELECT data FROM categories WHERE venue_id = ? ORDER BY sort_order", (venue_id,))
+
+    def get_dishes_by_category(self, category_id):
+        return self._select(
+            "SELECT data FROM dishes WHERE category_id = ? AND is_available = 1 ORDER BY sort_order",
+            (category_id,)
+        )
+
+    def get_all_dishes(self, venue_id):
+        return self._select("SELECT data FROM dishes WHERE venue_id = ? ORDER BY sort_order", (venue_id,))
+
+    def get_row(self, table, key):
+        rows = self._select(f"SELECT data FROM {table} WHERE key = ?", (key,))
+        return rows[0] if rows else None
+
+    def get_rows(self, table, venue_id=None):
+        if venue_id is None:
+            return self._select(f"SELECT data FROM {table}")
+        return self._select(f"SELECT data FROM {table} WHERE venue_id = ?", (venue_id,))
+
+    def get_status(self):
+        """Число строк и отставание синхронизации по каждой таблице"""
+        now = time.time()
+        status = {}
+        with self._lock:
+            connection = self._connect()
+            synced = dict(connection.execute("SELECT table_name, synced_at FROM sync_state").fetchall())
+            for table in REPLICA_TABLES:
+                rows = connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                synced_at = synced.get(table)
+                status[table] = {
+                    'rows': rows,
+                    'lag_seconds': round(now - synced_at, 1) if synced_at else None
+                }
+        return status
@@ -0,0 +1,208 @@
+import re
+from bisect import bisect_left, insort
+
+# Вес совпадения в зависимости от поля блюда
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'composition': 2.0,
+    'description': 1.0,
+}
+
+# Насколько ценится совпадение каждого типа
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.8
+FUZZY_SCORE = 0.6
+
+# Минимальное сходство по триграммам для нечеткого совпадения (коэффициент Дайса)
+FUZZY_THRESHOLD = 0.45
+
+# Окончания, которые отрезаются при нормализации ("курицей" -> "куриц")
+_ENDINGS = sorted([
+    'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ой', 'ей', 'ий', 'ый', 'ая', 'яя',
+    'ое', 'ее', 'ом', 'ем', 'ам', 'ям', 'ах', 'ях', 'ов', 'ев', 'ую', 'юю', 'ые', 'ие',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь',
+], key=len, reverse=True)
+
+_TOKEN_RE = re.compile(r'[0-9a-zа-я]+')
+
+
+def normalize_token(token):
+    """Приводит слово к нормальной форме: без окончания, ё -> е"""
+    token = token.lower().replace('ё', 'е')
+    for ending in _ENDINGS:
+        if token.endswith(ending) and len(token) - len(ending) >= 3:
+            return token[:-len(ending)]
+    return token
+
+
+def tokenize(text):
+    """Разбивает текст на нормализованные слова"""
+    if not text:
+        return []
+    text = text.lower().replace('ё', 'е')
+    return [normalize_token(token) for token in _TOKEN_RE.findall(text)]
+
+
+def trigrams(token):
+    """Триграммы слова с границами (" пи", "пиб", ...)"""
+    padded = f" {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class MenuSearchIndex:
+    """Поисковый индекс по названию, составу и описанию блюд.
+
+    Поддерживает точное совпадение слов, поиск по началу слова и нечеткий
+    поиск по триграммам (опечатки вроде "пибимпап"). Блюда добавляются и
+    удаляются по одному, поэтому при изменении меню индекс перестраивается
+    только для измененных блюд.
+    """
+
+    def __init__(self):
+        # слово -> {dish_id: вес}
+        self._postings = {}
+        # триграмма -> множество слов
+        self._trigrams = {}
+        # отсортированный список слов для поиска по префиксу
+        self._sorted_tokens = []
+        # dish_id -> (отпечаток, {слово: вес})
+        self._documents = {}
+        self._names = {}
+
+    def __len__(self):
+        return len(self._documents)
+
+    @staticmethod
+    def fingerprint(dish):
+        """Отпечаток индексируемых полей, чтобы не переиндексировать неизмененные блюда"""
+        return tuple(getattr(dish, field) or '' for field in FIELD_WEIGHTS)
+
+    def add_dish(self, dish):
+        """Добавить или обновить блюдо в индексе"""
+        dish_id = dish.id
+        fingerprint = self.fingerprint(dish)
+
+        existing = self._documents.get(dish_id)
+        if existing and existing[0] == fingerprint:
+            return False
+        if existing:
+            self.remove_dish(dish_id)
+
+        weights = {}
+        for field, field_weight in FIELD_WEIGHTS.items():
+            for token in tokenize(getattr(dish, field)):
+                if weights.get(token, 0) < field_weight:
+                    weights[token] = field_weight
+
+        for token, weight in weights.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                insort(self._sorted_tokens, token)
+                for trigram in trigrams(token):
+                    self._trigrams.setdefault(trigram, set()).add(token)
+            postings[dish_id] = weight
+
+        self._documents[dish_id] = (fingerprint, weights)
+        self._names[dish_id] = dish.name
+        return True
+
+    def remove_dish(self, dish_id):
+        """Удалить блюдо из индекса"""
+        document = self._documents.pop(dish_id, None)
+        self._names.pop(dish_id, None)
+        if not document:
+            return False
+
+        for token in document[1]:
+            postings = self._postings[token]
+            del postings[dish_id]
+            if postings:
+                continue
+
+            del self._postings[token]
+            del self._sorted_tokens[bisect_left(self._sorted_tokens, token)]
+            for trigram in trigrams(token):
+                tokens = self._trigrams[trigram]
+                tokens.discard(token)
+                if not tokens:
+                    del self._trigrams[trigram]
+        return True
+
+    def sync(self, dishes):
+        """Привести индекс к списку блюд, переиндексировав только изменения.
+
+        Возвращает количество добавленных, обновленных и удаленных блюд.
+        """
+        current_ids = set()
+        changed = 0
+        for dish in dishes:
+            current_ids.add(dish.id)
+            if self.add_dish(dish):
+                changed += 1
+
+        removed = 0
+        for dish_id in list(self._documents):
+            if dish_id not in current_ids:
+                self.remove_dish(dish_id)
+                removed += 1
+
+        return changed + removed
+
+    def _match_token(self, query_token):
+        """Слова индекса, подходящие под слово запроса, с оценкой совпадения"""
+        matches = {}
+
+        if query_token in self._postings:
+            matches[query_token] = EXACT_SCORE
+
+        # Совпадение по началу слова
+        start = bisect_left(self._sorted_tokens, query_token)
+        for i in range(start, len(self._sorted_tokens)):
+            token = self._sorted_tokens[i]
+            if not token.startswith(query_token):
+                break
+            matches.setdefault(token, PREFIX_SCORE)
+
+        # Нечеткое совпадение по триграммам
+        if len(query_token) >= 3:
+            query_trigrams = trigrams(query_token)
+            shared = {}
+            for trigram in query_trigrams:
+                for token in self._trigrams.get(trigram, ()):
+                    shared[token] = shared.get(token, 0) + 1
+
+            for token, count in shared.items():
+                if token in matches:
+                    continue
+                similarity = 2 * count / (len(query_trigrams) + len(token))
+                if similarity >= FUZZY_THRESHOLD:
+                    matches[token] = FUZZY_SCORE * similarity
+
+        return matches
+
+    def search(self, query, limit=10):
+        """Найти блюда по запросу. Возвращает список dish_id по убыванию релевантности"""
+        query_tokens = list(dict.fromkeys(tokenize(query)))
+        if not query_tokens:
+            return []
+
+        scores = {}
+        matched = {}
+        for query_token in query_tokens:
+            best = {}
+            for token, match_score in self._match_token(query_token).items():
+                for dish_id, weight in self._postings[token].items():
+                    score = match_score * weight
+                    if score > best.get(dish_id, 0):
+                        best[dish_id] = score
+
+            for dish_id, score in best.items():
+                scores[dish_id] = scores.get(dish_id, 0) + score
+                matched[dish_id] = matched.get(dish_id, 0) + 1
+
+        # Сначала блюда, подходящие под большее число слов запроса, затем более короткие названия
+        ranked = sorted(scores, key=lambda dish_id: (
+            -matched[dish_id], -scores[dish_id], len(self._names[dish_id]), self._names[dish_id]
+        ))
+        return ranked[:limit]
@@ -0,0 +1,229 @@
+"""Снимок меню в файле, общий для процесса бота и веб-сервера.
+
+Процесс бота после каждого изменения каталога записывает снимок во временный
+файл и переименовывает его (os.replace атомарен), поэтому читатель всегда
+видит целый файл — старый или новый. Читатели отображают файл в память (mmap)
+и перечитывают заголовок, только когда файл заменен; данные меню лежат в
+page cache один раз на все процессы, запросов к базе при чтении нет.
+
+Формат файла:
+
+    SARANG-MENU-1 {"generation": "...", "venues": {"main": {"offset": 0, "length": 1234, "etag": "...", "version": 7}}}
+    {меню заведения main}{меню следующего заведения}...
+
+Первая строка — метка формата и JSON-заголовок; дальше подряд идут JSON меню
+заведений, offset отсчитывается от начала этой части; version — версия
+журнала изменений (menu_changes.py), которой соответствует меню. Веб-сервер отдает байты
+меню заведения прямо из отображения, не разбирая JSON.
+
+Модуль не зависит от config: веб-серверу не нужны ключи Supabase.
+"""
+import hashlib
+import json
+import mmap
+import os
+import threading
+import time
+
+SNAPSHOT_MAGIC = b"SARANG-MENU-1"
+
+# Файл снимка; у бота и веб-сервера должна быть общая папка DATA_DIR
+SNAPSHOT_PATH = os.path.join(os.environ.get("DATA_DIR") or "data", "menu_snapshot.bin")
+
+# Как часто читатель проверяет, не заменен ли файл (в секундах)
+SNAPSHOT_CHECK_INTERVAL = 1.0
+
+
+def dish_row(dish):
+    """models.Dish -> строка снимка (те же столбцы, что в таблице dishes)"""
+    return {
+        'id': dish.id,
+        'name': dish.name,
+        'category_id': dish.category_id,
+        'sort_order': dish.sort_order,
+        'is_available': dish.is_available,
+        'composition': dish.composition,
+        'description': dish.description,
+        'spiciness': dish.spiciness,
+        'allergens': dish.allergens_text,
+        'features': dish.features_text,
+        'photo_file_id': dish.photo_file_id,
+        'cooking_time': dish.cooking_time,
+        'price': dish.price,
+    }
+
+
+def venue_menu(venue, categories, dishes):
+    """JSON меню одного заведения (bytes)"""
+    menu = {
+        'venue': {'id': venue.id, 'name': venue.name},
+        'categories': [
+            {'id': category.id, 'name': category.name, 'sort_order': category.sort_order}
+            for category in categories
+        ],
+        'dishes': [dish_row(dish) for dish in dishes],
+    }
+    return json.dumps(menu, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def write_snapshot(menus, path=SNAPSHOT_PATH, versions=None):
+    """Записать снимок {id заведения: JSON меню} атомарно. Возвращает generation снимка.
+
+    versions — {id заведения: версия журнала изменений} для /api/menu/changes.
+    """
+    venues = {}
+    offset = 0
+    for venue_id, body in menus.items():
+        venues[venue_id] = {
+            'offset': offset,
+            'length': len(body),
+            'etag': hashlib.sha1(body).hexdigest()[:16],
+        }
+        if versions and venue_id in versions:
+            venues[venue_id]['version'] = versions[venue_id]
+        offset += len(body)
+
+    # generation зависит только от содержимого: перезапуск бота без изменений меню не заставит читателей перечитывать
+    generation = hashlib.sha1(
+        "".join(f"{venue_id}:{entry['etag']};" for venue_id, entry in venues.items()).encode()
+    ).hexdigest()[:16]
+    header = json.dumps({'generation': generation, 'published_at': time.time(), 'venues': venues},
+                        separators=(',', ':')).encode('utf-8')
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC + b" " + header + b"\n")
+        for body in menus.values():
+            f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    return generation
+
+
+class MenuSnapshot:
+    """Чтение снимка меню через mmap.
+
+    Файл проверяется не чаще раза в check_interval секунд (os.stat); если он
+    заменен, отображение пересоздается. Между заменами чтение — это срез
+    отображенного файла.
+    """
+
+    def __init__(self, path=SNAPSHOT_PATH, check_interval=SNAPSHOT_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._file = None
+        self._map = None
+        self._signature = None
+        self._header = None
+        self._body_offset = 0
+        self._checked_at = None
+        self._stats = {'reloads': 0, 'reads': 0, 'errors': 0}
+
+    def _close(self):
+        if self._map is not None:
+            self._map.close()
+        if self._file is not None:
+            self._file.close()
+        self._file = self._map = self._header = self._signature = None
+
+    def _check(self):
+        """Переоткрыть файл, если он заменен (вызывается под блокировкой)"""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._close()
+            return
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if signature == self._signature:
+            return
+
+        try:
+            f = open(self.path, 'rb')
+            try:
+                snapshot_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except Exception:
+                f.close()
+                raise
+            header_end = snapshot_map.find(b"\n")
+            magic, _, header = snapshot_map[:header_end].partition(b" ")
+            if magic != SNAPSHOT_MAGIC:
+                snapshot_map.close()
+                f.close()
+                raise ValueError(f"неизвестный формат снимка {magic[:20]!r}")
+            header = json.loads(header)
+        except Exception as e:
+            self._stats['errors'] += 1
+            print(f"❌ Ошибка при чтении снимка меню {self.path}: {e}")
+            return
+
+        self._close()
+        self._file, self._map, self._signature = f, snapshot_map, signature
+        self._header = header
+        self._body_offset = header_end + 1
+        self._stats['reloads'] += 1
+
+    def generation(self):
+        """Версия снимка (None, если снимка нет)"""
+        with self._lock:
+            self._check()
+            return self._header['generation'] if self._header else None
+
+    def venue_ids(self):
+        with self._lock:
+            self._check()
+            return list(self._header['venues']) if self._header else []
+
+    def get_etag(self, venue_id):
+        """etag меню заведения в текущем снимке или None"""
+        with self._lock:
+            self._check()
+            if self._header is None:
+                return None
+            entry = self._header['venues'].get(venue_id)
+            return entry['etag'] if entry else None
+
+    def get_bytes(self, venue_id):
+        """(JSON меню заведения, etag) из снимка или None"""
+        found = self.get_entry(venue_id)
+        return found[:2] if found else None
+
+    def get_entry(self, venue_id):
+        """(JSON меню заведения, etag, версия журнала изменений или None) из одного снимка или None"""
+        with self._lock:
+            self._check()
+            if self._header is None:
+                return None
+            entry = self._header['venues'].get(venue_id)
+            if entry is None:
+                return None
+            start = self._body_offset + entry['offset']
+            self._stats['reads'] += 1
+            return self._map[start:start + entry['length']], entry['etag'], entry.get('version')
+
+    def get_menu(self, venue_id):
+        """(разобранное меню заведения, etag) или None"""
+        found = self.get_bytes(venue_id)
+        if found is None:
+            return None
+        body, etag = found
+        return json.loads(body), etag
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['generation'] = self._header['generation'] if self._header else None
+        return stats
+
+
+# Общий читатель снимка для процесса
+menu_snapshot = MenuSnapshot()
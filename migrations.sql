@@ -0,0 +1,103 @@
+-- Схема Supabase, которую ожидает бот. Выполнить в SQL Editor Supabase ДО выкладки новой
+-- версии бота: без столбца venue_id все чтения меню, листов, файлов и отзывов падают.
+-- Скрипт можно запускать повторно — каждый шаг проверяет, не выполнен ли он уже.
+--
+-- 'main' ниже — заведение по умолчанию (DEFAULT_VENUE); если оно у вас другое, замените.
+
+
+-- 1. Заведения. Без строк в venues бот работает как одно заведение DEFAULT_VENUE
+create table if not exists venues (
+    id text primary key,
+    name text not null,
+    timezone text not null default 'Europe/Saratov',
+    table_count integer not null default 37,
+    sort_order integer not null default 0
+);
+insert into venues (id, name) values ('main', 'Ресторан') on conflict (id) do nothing;
+
+
+-- 2. Заведение у каждой строки: существующие строки относятся к заведению по умолчанию
+alter table categories add column if not exists venue_id text not null default 'main';
+alter table dishes add column if not exists venue_id text not null default 'main';
+alter table sheets add column if not exists venue_id text not null default 'main';
+alter table files add column if not exists venue_id text not null default 'main';
+alter table admins add column if not exists venue_id text not null default 'main';
+alter table feedback add column if not exists venue_id text not null default 'main';
+
+create index if not exists categories_venue_sort on categories (venue_id, sort_order);
+create index if not exists dishes_venue_sort on dishes (venue_id, sort_order);
+create index if not exists feedback_venue_created on feedback (venue_id, created_at);
+
+
+-- 3. Листы, файлы и администраторы уникальны внутри заведения, а не во всей таблице.
+-- Снимаем прежние ключи по одному столбцу (sheet_type, file_type, user_id); ключи по id остаются
+do $$
+declare
+    old_key record;
+begin
+    for old_key in
+        select con.conrelid::regclass as table_name, con.conname
+        from pg_constraint con
+        where con.conrelid in ('sheets'::regclass, 'files'::regclass, 'admins'::regclass)
+          and con.contype in ('p', 'u')
+          and not exists (
+              select 1 from pg_attribute a
+              where a.attrelid = con.conrelid and a.attnum = any (con.conkey)
+                and a.attname in ('venue_id', 'id')
+          )
+    loop
+        execute format('alter table %s drop constraint %I', old_key.table_name, old_key.conname);
+    end loop;
+end $$;
+
+create unique index if not exists sheets_venue_type on sheets (venue_id, sheet_type);
+create unique index if not exists files_venue_type on files (venue_id, file_type);
+create unique index if not exists admins_venue_user on admins (venue_id, user_id);
+
+
+-- 4. Время приготовления блюда (без значения берется таблица DEFAULT_COOKING_TIMES)
+alter table dishes add column if not exists cooking_time integer;
+
+
+-- 5. Ключ отзыва, который назначает бот: повторная отправка пачки из очереди не дублирует отзывы
+alter table feedback add column if not exists client_id uuid unique;
+
+
+-- 6. updated_at с триггером: по нему локальная копия (menu_replica.py) и опрос изменений
+-- (CHANGE_FEED=polling) находят измененные строки
+create or replace function set_updated_at() returns trigger
+language plpgsql as $$
+begin
+    new.updated_at = now();
+    return new;
+end $$;
+
+do $$
+declare
+    table_name text;
+begin
+    foreach table_name in array array['venues', 'categories', 'dishes', 'sheets', 'files', 'admins', 'feedback']
+    loop
+        execute format('alter table %I add column if not exists updated_at timestamptz not null default now()',
+                       table_name);
+        execute format('create index if not exists %I on %I (updated_at)', table_name || '_updated_at', table_name);
+        execute format('drop trigger if exists set_updated_at on %I', table_name);
+        execute format('create trigger set_updated_at before insert or update on %I '
+                       'for each row execute function set_updated_at()', table_name);
+    end loop;
+end $$;
+
+
+-- 7. События об изменениях для CHANGE_FEED=realtime (по умолчанию)
+do $$
+declare
+    table_name text;
+begin
+    foreach table_name in array array['venues', 'categories', 'dishes', 'sheets', 'files', 'admins']
+    loop
+        if not exists (select 1 from pg_publication_tables
+                       where pubname = 'supabase_realtime' and tablename = table_name) then
+            execute format('alter publication supabase_realtime add table %I', table_name);
+        end if;
+    end loop;
+end $$;
@@ -0,0 +1,294 @@
+"""Страница Mini App, собранная на сервере, с уже встроенным меню.
+
+Раньше до первого блюда на экране проходила цепочка запросов: index.html,
+затем SDK Telegram и style.css, затем config.js и script.js, затем меню.
+Теперь веб-сервер отдает index.html, в котором уже есть:
+- стили (style.css встроен в <style>, отдельного запроса нет);
+- вкладки категорий и первые SHELL_DISHES карточек первой категории;
+- меню заведения из снимка (menu_snapshot.py) в <script type="application/json">
+  с версией журнала изменений (menu_changes.py);
+- скрипты с defer: они догружаются, не задерживая отрисовку.
+
+script.js подхватывает готовую разметку (не перерисовывая ее) и дорисовывает
+остальные карточки партиями. Если снимка нет, отдается исходный шаблон —
+Mini App загрузит меню как раньше.
+
+Шаблон — static/index.html: в нем остаются обычные ссылки на style.css и
+скрипты, поэтому как статический файл он тоже работает. Модуль не зависит от
+config, как и menu_snapshot.
+"""
+import hashlib
+import html
+import json
+import os
+import threading
+
+from menu_snapshot import menu_snapshot
+
+STATIC_DIR = 'static'
+TEMPLATE_PATH = os.path.join(STATIC_DIR, 'index.html')
+STYLESHEET_PATH = os.path.join(STATIC_DIR, 'style.css')
+
+# Сколько карточек первой категории рисует сервер; остальные дорисует script.js
+SHELL_DISHES = 12
+
+# Размер картинки в карточке (как .dish-image в style.css): браузер резервирует место до загрузки
+DISH_IMAGE_WIDTH = 280
+DISH_IMAGE_HEIGHT = 160
+
+# Параметры ссылки, при которых карточки фильтруются в браузере (см. parseFilter в script.js)
+FILTER_PARAMS = ('exclude', 'max_spice', 'kid_friendly')
+
+# Сколько собранных страниц держать (заведение x с фильтром / без)
+MAX_CACHED_PAGES = 64
+
+STYLESHEET_LINK = '<link rel="stylesheet" href="style.css">'
+MENU_DATA_MARKER = '<!-- menu-data -->'
+TABS_MARKER = '<!-- categories-tabs -->'
+DISHES_MARKER = '<!-- dishes-grid -->'
+
+
+def format_price(price):
+    if not price:
+        return 'Цена не указана'
+    if isinstance(price, float) and price.is_integer():
+        price = int(price)
+    return f"{price} ₽"
+
+
+def dish_features(dish):
+    """Значки остроты и особенностей (как getDishFeatures в script.js)"""
+    badges = []
+    if dish.get('spiciness'):
+        badges.append(f"🌶 {dish['spiciness']}")
+    badges += [feature.strip() for feature in (dish.get('features') or '').split(',') if feature.strip()]
+    return "".join(f'<span class="feature-badge">{html.escape(badge)}</span>' for badge in badges)
+
+
+def dish_card(dish):
+    """Карточка блюда (та же разметка, что createDishCard в script.js)"""
+    name = html.escape(dish['name'] or '')
+    if dish.get('photo_file_id'):
+        image = (f'<img src="{html.escape(dish["photo_file_id"])}" alt="{name}" class="dish-image" '
+                 f'width="{DISH_IMAGE_WIDTH}" height="{DISH_IMAGE_HEIGHT}" loading="lazy" decoding="async" '
+                 f'onerror="this.style.display=\'none\'">')
+    else:
+        image = ('<div class="dish-image" style="display: flex; align-items: center; '
+                 'justify-content: center; color: #666;">📷</div>')
+    features = dish_features(dish)
+    return (
+        f'<div class="dish-card" data-dish-id="{dish["id"]}">'
+        f'{image}'
+        f'<div class="dish-name">{name}</div>'
+        + (f'<div class="dish-composition">{html.escape(dish["composition"])}</div>'
+           if dish.get('composition') else '')
+        + (f'<div class="dish-features">{features}</div>' if features else '')
+        + f'<div class="dish-price">{format_price(dish.get("price"))}</div>'
+        '<div class="korean-pattern"></div>'
+        '</div>'
+    )
+
+
+def category_dishes(menu, category_id):
+    """Доступные блюда категории в порядке меню"""
+    dishes = [dish for dish in menu['dishes'] if dish['category_id'] == category_id and dish['is_available']]
+    dishes.sort(key=lambda dish: (dish['sort_order'] is None, dish['sort_order']))
+    return dishes
+
+
+def _embed_json(body):
+    """JSON внутри <script>: '</' не должен закрыть тег"""
+    return body.replace(b'</', b'<\\/').decode('utf-8')
+
+
+class MiniAppShell:
+    """Сборка index.html со встроенным меню; собранные страницы кэшируются по etag меню"""
+
+    def __init__(self, snapshot=menu_snapshot, template_path=TEMPLATE_PATH, stylesheet_path=STYLESHEET_PATH):
+        self.snapshot = snapshot
+        self.template_path = template_path
+        self.stylesheet_path = stylesheet_path
+        self._lock = threading.Lock()
+        self._sources = None
+        self._sources_signature = None
+        self._pages = {}
+        self._stats = {'renders': 0, 'hits': 0, 'fallbacks': 0}
+
+    def _load_sources(self):
+        """Шаблон и стили; перечитываются, если файлы изменились (под блокировкой)"""
+        signature = tuple(os.stat(path).st_mtime_ns for path in (self.template_path, self.stylesheet_path))
+        if signature != self._sources_signature:
+            with open(self.template_path, encoding='utf-8') as f:
+                template = f.read()
+            with open(self.stylesheet_path, encoding='utf-8') as f:
+                stylesheet = f.read()
+            self._sources = (template, stylesheet)
+            self._sources_signature = signature
+            self._pages.clear()
+        return self._sources
+
+    def render(self, venue_id, with_dishes=True):
+        """(HTML bytes, etag) страницы для заведения. with_dishes=False — без карточек (фильтр в ссылке)"""
+        with self._lock:
+            template, stylesheet = self._load_sources()
+            found = self.snapshot.get_entry(venue_id)
+            if found is None:
+                self._stats['fallbacks'] += 1
+                body = template.encode('utf-8')
+                return body, hashlib.sha1(body).hexdigest()[:16]
+
+            menu_bytes, menu_etag, version = found
+            key = (venue_id, menu_etag, version, with_dishes)
+            page = self._pages.get(key)
+            if page is not None:
+                self._stats['hits'] += 1
+                return page
+
+            page = self._build(template, stylesheet, menu_bytes, version, with_dishes)
+            if len(self._pages) >= MAX_CACHED_PAGES:
+                self._pages.clear()
+            self._pages[key] = page
+            self._stats['renders'] += 1
+            return page
+
+    def _build(self, template, stylesheet, menu_bytes, version, with_dishes):
+        menu = json.loads(menu_bytes)
+        categories = sorted(menu['categories'], key=lambda category: category['sort_order'] or 0)
+        first = categories[0] if categories else None
+
+        tabs = "".join(
+            f'<button class="tab{" active" if category is first else ""}" '
+            f'data-category-id="{category["id"]}">{html.escape(category["name"])}</button>'
+            for category in categories
+        )
+        # data-version — с какой версии спрашивать /api/menu/changes
+        version_attribute = f' data-version="{version}"' if version is not None else ''
+        menu_data = (f'<script id="menuData" type="application/json"{version_attribute}>'
+                     f'{_embed_json(menu_bytes)}</script>')
+
+        page = (template
+                .replace(STYLESHEET_LINK, f'<style>\n{stylesheet}\n</style>')
+                .replace(MENU_DATA_MARKER, menu_data)
+                .replace(TABS_MARKER, tabs))
+
+        dishes = category_dishes(menu, first['id']) if first and with_dishes else []
+        if dishes:
+            cards = "".join(dish_card(dish) for dish in dishes[:SHELL_DISHES])
+            page = (page
+                    .replace('<div class="loading" id="loading">', '<div class="loading" id="loading" hidden>')
+                    .replace('<div class="dishes-grid" id="dishesGrid">',
+                             f'<div class="dishes-grid" id="dishesGrid" data-category-id="{first["id"]}" '
+                             f'data-rendered="{min(len(dishes), SHELL_DISHES)}">')
+                    .replace(DISHES_MARKER, cards))
+
+        body = page.encode('utf-8')
+        return body, hashlib.sha1(body).hexdigest()[:16]
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['cached_pages'] = len(self._pages)
+        return stats
+
+
+# Общая сборка страницы для процесса веб-сервера
+mini_app_shell = MiniAppShell()
+
+
+# Сетевые условия для оценки: (название, задержка туда-обратно в мс, скорость в кбит/с)
+NETWORK_PROFILES = (
+    ("слабый 3G", 400, 400),
+    ("4G", 100, 4000),
+    ("Wi-Fi", 20, 20000),
+)
+
+
+def _benchmark(dishes_per_category=40, categories=8, runs=20):
+    """Время до первого блюда: страница со встроенным меню против прежней цепочки запросов.
+
+    Запросы идут к настоящему веб-серверу на локальном порту; сеть
+    моделируется: каждый последовательный этап цепочки стоит одну задержку
+    туда-обратно (первый — еще одну на соединение) плюс передача байтов этапа.
+    SDK Telegram грузится с другого хоста: в прежней цепочке он учтен только
+    задержкой, без объема, — оценка прежнего варианта занижена, а не завышена.
+    """
+    import socketserver
+    import statistics
+    import tempfile
+    import time
+    import urllib.request
+    from types import SimpleNamespace
+
+    import web_server
+    from menu_snapshot import MenuSnapshot, write_snapshot
+
+    venue = SimpleNamespace(id='main', name="Саранг")
+    menu_categories = [SimpleNamespace(id=c + 1, name=f"Категория {c + 1}", sort_order=c) for c in range(categories)]
+    dishes = [
+        {'id': i, 'name': f"Блюдо {i}", 'category_id': i % categories + 1, 'sort_order': i, 'is_available': True,
+         'composition': "Рис, курица, овощи, соус", 'description': "Описание блюда " * 5, 'spiciness': 'Острое',
+         'allergens': "Яйца, Соя", 'features': "Подходит детям", 'photo_file_id': f"/photos/{i}.jpg",
+         'cooking_time': 15, 'price': 390}
+        for i in range(dishes_per_category * categories)
+    ]
+    body = json.dumps({'venue': {'id': venue.id, 'name': venue.name},
+                       'categories': [vars(c) for c in menu_categories], 'dishes': dishes},
+                      ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    path = os.path.join(tempfile.mkdtemp(prefix='mini-app-bench-'), 'menu_snapshot.bin')
+    write_snapshot({venue.id: body}, path)
+    snapshot = MenuSnapshot(path)
+    web_server.menu_snapshot = snapshot
+    web_server.mini_app_shell = MiniAppShell(snapshot)
+
+    class QuietHandler(web_server.MyHttpRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    httpd = socketserver.ThreadingTCPServer(("127.0.0.1", 0), QuietHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{httpd.server_address[1]}"
+
+    def fetch(url):
+        """(байты ответа, время сервера в секундах) — медиана по runs запросам"""
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            with urllib.request.urlopen(base + url) as response:
+                data = response.read()
+            timings.append(time.perf_counter() - started)
+        return data, statistics.median(timings)
+
+    with open(TEMPLATE_PATH, 'rb') as f:
+        template = f.read()
+
+    # Прежняя страница: шаблон, затем блокирующие SDK и style.css, затем скрипты, затем меню
+    client_stages = [
+        [(template, 0.0)],
+        [(b"", 0.0), fetch('/style.css')],
+        [fetch('/config.js'), fetch('/script.js')],
+        [fetch('/api/menu')],
+    ]
+    # Новая: первое блюдо есть в HTML; считаются байты до первой карточки
+    page, page_time = fetch('/')
+    first_card = page.index(b'class="dish-card"')
+    shell_stages = [[(page[:first_card], page_time)]]
+
+    def first_dish_ms(stages, rtt, kbit):
+        total = rtt  # соединение
+        for stage in stages:
+            total += rtt + max(seconds for _, seconds in stage) * 1000
+            total += sum(len(data) for data, _ in stage) * 8 / kbit
+        return total
+
+    httpd.shutdown()
+    print(f"Меню: {categories} категорий по {dishes_per_category} блюд, страница {len(page) / 1024:.0f} КБ, "
+          f"до первой карточки {first_card / 1024:.1f} КБ, сборка страницы {page_time * 1000:.2f} мс")
+    print(f"{'сеть':<12} {'прежняя цепочка':>18} {'страница с меню':>18}")
+    for name, rtt, kbit in NETWORK_PROFILES:
+        print(f"{name:<12} {first_dish_ms(client_stages, rtt, kbit):>15.0f} мс "
+              f"{first_dish_ms(shell_stages, rtt, kbit):>15.0f} мс")
+    print(f"Этапов до первого блюда: {len(client_stages)} -> {len(shell_stages)}")
+
+
+if __name__ == '__main__':
+    _benchmark()
@@ -0,0 +1,231 @@
+"""Модели данных бота: строки из базы разбираются в них один раз при чтении.
+
+Классы со __slots__ занимают меньше памяти, чем словари из response.data,
+а производные поля (битовые признаки блюда, уровень остроты, местное время
+отзыва) вычисляются один раз, а не при каждом показе.
+
+    python models.py    # сравнение памяти: модели против словарей
+"""
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+import pytz
+
+from menu_filters import DishFlags, SPICINESS_LEVELS, dish_flags
+
+# Время отзывов показывается по времени ресторана (часовой пояс заведения по умолчанию)
+DEFAULT_TIMEZONE = 'Europe/Saratov'
+LOCAL_TZ = pytz.timezone(DEFAULT_TIMEZONE)
+
+# Столов в зале, если у заведения не указано
+DEFAULT_TABLE_COUNT = 37
+
+
+def parse_timestamp(value):
+    """Строка времени из базы -> datetime с часовым поясом (None, если не разобрать)"""
+    if not value:
+        return None
+    try:
+        moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment
+
+
+@dataclass(slots=True)
+class Venue:
+    """Заведение: свое меню, листы, файлы, администраторы, столы и часовой пояс"""
+    id: str
+    name: str
+    timezone: str = DEFAULT_TIMEZONE
+    table_count: int = DEFAULT_TABLE_COUNT
+    sort_order: int = 0
+    tz: Any = field(default=None, compare=False, repr=False)
+
+    def __post_init__(self):
+        if self.tz is None:
+            try:
+                self.tz = pytz.timezone(self.timezone)
+            except pytz.UnknownTimeZoneError:
+                print(f"⚠️ Неизвестный часовой пояс {self.timezone} у заведения {self.id}")
+                self.tz = LOCAL_TZ
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(
+            id=row['id'],
+            name=row.get('name') or row['id'],
+            timezone=row.get('timezone') or DEFAULT_TIMEZONE,
+            table_count=row.get('table_count') or DEFAULT_TABLE_COUNT,
+            sort_order=row.get('sort_order') or 0,
+        )
+
+
+@dataclass(slots=True)
+class Category:
+    id: int
+    name: str
+    sort_order: int = 0
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row['id'], row.get('name') or '', row.get('sort_order') or 0)
+
+
+@dataclass(slots=True)
+class Dish:
+    id: int
+    name: str
+    category_id: Optional[int]
+    sort_order: int = 0
+    is_available: bool = True
+    composition: str = ''
+    description: str = ''
+    spiciness: str = 'Не острое'
+    photo_file_id: Optional[str] = None
+    cooking_time: Optional[int] = None
+    price: Optional[float] = None
+    # Производные поля не участвуют в сравнении: они однозначно следуют из строки
+    allergens: tuple = field(default=(), compare=False)
+    spiciness_level: int = field(default=0, compare=False)
+    flags: Optional[DishFlags] = field(default=None, compare=False, repr=False)
+    # Исходные строки, из которых разобраны признаки
+    allergens_text: str = ''
+    features_text: str = ''
+
+    @classmethod
+    def from_row(cls, row):
+        flags = dish_flags(row)
+        spiciness = row.get('spiciness') or 'Не острое'
+        return cls(
+            id=row['id'],
+            name=row.get('name') or '',
+            category_id=row.get('category_id'),
+            sort_order=row.get('sort_order') or 0,
+            is_available=row.get('is_available', True) is not False,
+            composition=row.get('composition') or '',
+            description=row.get('description') or '',
+            spiciness=spiciness,
+            photo_file_id=row.get('photo_file_id') or None,
+            cooking_time=row.get('cooking_time'),
+            price=row.get('price'),
+            allergens=tuple(flags.allergen_names()),
+            spiciness_level=SPICINESS_LEVELS.index(spiciness) if spiciness in SPICINESS_LEVELS else 0,
+            flags=flags,
+            allergens_text=row.get('allergens') or '',
+            features_text=row.get('features') or '',
+        )
+
+
+@dataclass(slots=True)
+class Feedback:
+    id: int
+    user_id: Optional[int]
+    username: Optional[str]
+    full_name: Optional[str]
+    message: str
+    table_number: Optional[int]
+    message_type: str = 'feedback'
+    status: str = 'new'
+    created_at: Optional[str] = None
+    venue_id: Optional[str] = None
+    created_local: Optional[datetime] = field(default=None, compare=False)
+
+    @classmethod
+    def from_row(cls, row):
+        created_at = parse_timestamp(row.get('created_at'))
+        return cls(
+            id=row['id'],
+            user_id=row.get('user_id'),
+            username=row.get('username'),
+            full_name=row.get('full_name'),
+            message=row.get('message') or '',
+            table_number=row.get('table_number'),
+            message_type=row.get('message_type') or 'feedback',
+            status=row.get('status') or 'new',
+            created_at=row.get('created_at'),
+            venue_id=row.get('venue_id'),
+            created_local=created_at.astimezone(LOCAL_TZ) if created_at else None,
+        )
+
+    def local_time_text(self, tz=None):
+        """Дата и время по времени заведения (по умолчанию — по Саратову), как в списке отзывов"""
+        if self.created_local is None:
+            return "время неизвестно"
+        local = self.created_local if tz is None else self.created_local.astimezone(tz)
+        return local.strftime("%d.%m.%Y %H:%M")
+
+
+@dataclass(slots=True)
+class Sheet:
+    sheet_type: str
+    content: str
+    updated_by: Optional[int] = None
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row['sheet_type'], row.get('content') or '', row.get('updated_by'))
+
+
+@dataclass(slots=True)
+class StoredFile:
+    file_type: str
+    file_id: str
+    file_name: str = ''
+    updated_by: Optional[int] = None
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row['file_type'], (row.get('file_id') or '').strip(),
+                   row.get('file_name') or '', row.get('updated_by'))
+
+
+def _benchmark(count=10000):
+    """Сколько памяти занимают count блюд и отзывов в виде словарей и в виде моделей"""
+    import tracemalloc
+
+    def dish_row(i):
+        return {
+            'id': i, 'name': f"Блюдо {i}", 'category_id': i % 12, 'sort_order': i,
+            'is_available': True, 'composition': "Рис, курица, овощи, соус", 'description': "",
+            'spiciness': 'Острое', 'allergens': "Яйца, Соя", 'features': "",
+            'photo_file_id': None, 'cooking_time': 15,
+            'created_at': "2024-05-01T10:00:00+00:00", 'updated_at': "2024-05-01T10:00:00+00:00",
+        }
+
+    def feedback_row(i):
+        return {
+            'id': i, 'user_id': 100000 + i, 'username': f"guest{i}", 'full_name': f"Гость {i}",
+            'message': "Все понравилось, спасибо!", 'table_number': i % 37 + 1,
+            'message_type': 'feedback', 'status': 'new', 'client_id': None,
+            'created_at': "2024-05-01T10:00:00.123456+00:00",
+        }
+
+    def measure(build):
+        tracemalloc.start()
+        objects = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del objects
+        return size
+
+    # Исходные строки уже в памяти и общие для всех вариантов — меряем, сколько добавляет каждое представление
+    dish_rows = [dish_row(i) for i in range(count)]
+    feedback_rows = [feedback_row(i) for i in range(count)]
+
+    results = [
+        ("Блюда, dict", measure(lambda: [dict(row) for row in dish_rows])),
+        ("Блюда, Dish", measure(lambda: [Dish.from_row(row) for row in dish_rows])),
+        ("Отзывы, dict", measure(lambda: [dict(row) for row in feedback_rows])),
+        ("Отзывы, Feedback", measure(lambda: [Feedback.from_row(row) for row in feedback_rows])),
+    ]
+    print(f"Память на {count} строк:")
+    for name, size in results:
+        print(f"  {name:<18} {size / 1024:8.0f} КБ  ({size / count:.0f} байт на строку)")
+
+
+if __name__ == '__main__':
+    _benchmark()
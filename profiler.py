@@ -0,0 +1,151 @@
+"""Профилирование работающего бота по запросу (/profile <секунды>).
+
+Пока профилирование не запущено, модуль ничего не делает: ни хуков, ни
+фоновых потоков. На время замера запускается поток, который раз в
+SAMPLE_INTERVAL секунд снимает стеки всех потоков (sys._current_frames) —
+цикл событий при этом не замедляется заметно. Параллельно tracemalloc
+сравнивает выделения памяти в начале и в конце замера.
+
+Результат — два файла:
+- отчет: самые горячие функции (собственные и включительные сэмплы) и
+  строки кода, где выросло потребление памяти;
+- свернутые стеки (collapsed stacks) для flamegraph.pl или speedscope.
+"""
+import io
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+# Как часто снимать стеки (в секундах)
+SAMPLE_INTERVAL = 0.005
+
+# Пределы длительности замера (в секундах)
+MAX_PROFILE_SECONDS = 120
+DEFAULT_PROFILE_SECONDS = 10
+
+# Сколько строк в таблицах отчета
+TOP_N = 25
+
+# Глубина стека для tracemalloc (влияет на его накладные расходы)
+TRACEMALLOC_FRAMES = 10
+
+_running = threading.Lock()
+
+
+class ProfileBusy(Exception):
+    """Другой замер еще идет"""
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _stack(frame):
+    """Стек от корня к вершине: ['main (bot.py:1)', ..., 'текущая функция']"""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+
+class ProfileResult:
+    def __init__(self, seconds, samples, stacks, memory_diff):
+        self.seconds = seconds
+        self.samples = samples
+        self.stacks = stacks
+        self.memory_diff = memory_diff
+
+    def hot_functions(self, top=TOP_N):
+        """[(функция, собственные сэмплы, включительные сэмплы)] по убыванию собственных"""
+        own = Counter()
+        total = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            # Рекурсивная функция считается в стеке один раз
+            for name in set(stack[1:]):
+                total[name] += count
+        return [(name, count, total[name]) for name, count in own.most_common(top)]
+
+    def report(self, top=TOP_N):
+        lines = [
+            f"Профиль за {self.seconds:.1f} с: {self.samples} сэмплов "
+            f"(каждые {SAMPLE_INTERVAL * 1000:.0f} мс, все потоки)",
+            "",
+            f"{'собств.':>8} {'%':>6} {'всего':>8} {'%':>6}  функция",
+        ]
+        stack_samples = sum(self.stacks.values()) or 1
+        for name, own, total in self.hot_functions(top):
+            lines.append(f"{own:>8} {own * 100 / stack_samples:>5.1f}% {total:>8} "
+                         f"{total * 100 / stack_samples:>5.1f}%  {name}")
+
+        lines += ["", "Память: рост выделений за время замера (tracemalloc)", ""]
+        for stat in self.memory_diff[:top]:
+            frame = stat.traceback[0]
+            lines.append(f"{stat.size_diff / 1024:>+10.1f} КБ {stat.count_diff:>+8} блоков  "
+                         f"{frame.filename}:{frame.lineno}")
+        if not self.memory_diff:
+            lines.append("изменений нет")
+        return "\n".join(lines) + "\n"
+
+    def collapsed(self):
+        """Свернутые стеки: 'поток;функция;...;функция число' — формат flamegraph.pl"""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def files(self):
+        """(отчет, свернутые стеки) как файлы в памяти для отправки документом"""
+        return (io.BytesIO(self.report().encode('utf-8')),
+                io.BytesIO(self.collapsed().encode('utf-8')))
+
+
+def profile(seconds=DEFAULT_PROFILE_SECONDS, interval=SAMPLE_INTERVAL):
+    """Снять профиль всех потоков процесса за seconds секунд (блокирует вызвавший поток).
+
+    Вызывать не из цикла событий: например, через asyncio.to_thread.
+    """
+    seconds = max(1, min(seconds, MAX_PROFILE_SECONDS))
+    if not _running.acquire(blocking=False):
+        raise ProfileBusy()
+
+    try:
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        memory_before = tracemalloc.take_snapshot()
+
+        own_thread = threading.get_ident()
+        stacks = Counter()
+        samples = 0
+        started = time.monotonic()
+        deadline = started + seconds
+        while time.monotonic() < deadline:
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                stack = _stack(frame)
+                stacks[(thread_names.get(thread_id, str(thread_id)),) + tuple(stack)] += 1
+            samples += 1
+            time.sleep(interval)
+        elapsed = time.monotonic() - started
+
+        memory_after = tracemalloc.take_snapshot()
+        if started_tracing:
+            tracemalloc.stop()
+
+        # Выделения самого профилировщика и tracemalloc не показываем
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        memory_diff = [
+            stat for stat in memory_after.filter_traces(filters).compare_to(
+                memory_before.filter_traces(filters), 'lineno')
+            if stat.size_diff
+        ]
+        memory_diff.sort(key=lambda stat: -abs(stat.size_diff))
+        return ProfileResult(elapsed, samples, stacks, memory_diff)
+    finally:
+        _running.release()
@@ -1,7 +1,15 @@
 import os
+import asyncio
+import html
 import logging
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
+import re
+import signal
+import time
+from datetime import datetime, timedelta, timezone
+from telegram import (Update, InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultArticle,
+                      InputTextMessageContent)
+from telegram.ext import (Application, CommandHandler, CallbackQueryHandler, MessageHandler, InlineQueryHandler,
+                          TypeHandler, ApplicationHandlerStop, filters, ContextTypes)
 
 # Настройка логирования
 logging.basicConfig(
@@ -15,8 +23,28 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 
 # Импорты
 try:
-    from config import ADMIN_ID, BOT_TOKEN, supabase
-    from database_manager import DatabaseManager
+    from config import (ADMIN_ID, BOT_TOKEN, MAX_CONCURRENT_UPDATES, HEALTH_PORT, MENU_SNAPSHOT,
+                        SHUTDOWN_DRAIN_TIMEOUT, supabase)
+    from database_manager import DatabaseManager, start_replica_sync, start_feedback_rollups
+    from feedback_rollups import feedback_rollups
+    from feedback_export import export_feedback
+    from feedback_queue import feedback_queue
+    from change_feed import start_change_feed
+    from menu_catalog import (get_catalog, all_catalogs, publish_snapshot, start_snapshot_publisher,
+                              request_snapshot_publish)
+    from menu_changes import menu_change_log
+    from menu_snapshot import menu_snapshot
+    from screen_renderer import render_screen
+    from screen_cache import Screen
+    from venues import chat_venues, venue_from_start_args
+    from conversation_state import conversation_state
+    from profiler import profile, ProfileBusy, DEFAULT_PROFILE_SECONDS, MAX_PROFILE_SECONDS
+    from throttle import throttle
+    from update_processor import ChatOrderedUpdateProcessor
+    from health import HealthMonitor, start_health_server
+    from warm_state import save_warm_state, restore_warm_state
+    from menu_filters import (MenuFilter, ALLERGENS, ALLERGEN_BITS, SPICINESS_LEVELS, FEATURE_BITS, KID_FRIENDLY,
+                              format_allergen_flags)
 except ImportError as e:
     logger.error(f"Import error: {e}")
     exit(1)
@@ -27,8 +55,93 @@ if supabase is None:
     exit(1)
 
 
+# --- ЗАЩИТА ОТ ФЛУДА ---
+# Кнопки-переключатели: повторное нажатие сразу после обработки — это намерение вернуть как было,
+# а не двойное нажатие (фильтр аллергенов и детского меню, уровень остроты, стоп-лист)
+TOGGLE_CALLBACKS = ('filter_allergen_', 'filter_kids', 'filter_spice', 'stop_toggle_')
+
+
+def callback_key(query):
+    """Ключ нажатия: одна и та же кнопка в одном и том же сообщении"""
+    if query.message:
+        return query.message.chat_id, query.message.message_id, query.data
+    return query.inline_message_id, None, query.data
+
+
+async def throttle_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Выполняется перед всеми обработчиками: отбрасывает флуд и двойные нажатия"""
+    user = update.effective_user
+    chat = update.effective_chat
+    query = update.callback_query
+
+    if not throttle.allow(user.id if user else None, chat.id if chat else None):
+        if query:
+            await query.answer("⏳ Слишком часто, подождите немного")
+        raise ApplicationHandlerStop
+
+    if query and not throttle.begin_callback(callback_key(query),
+                                             repeatable=(query.data or '').startswith(TOGGLE_CALLBACKS)):
+        # То же нажатие уже обрабатывается — просто убираем "часики" на кнопке
+        await query.answer()
+        raise ApplicationHandlerStop
+
+
+async def release_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Выполняется после обработчиков: нажатие обработано"""
+    if update.callback_query:
+        throttle.end_callback(callback_key(update.callback_query))
+
+
+# --- ЗАВЕДЕНИЯ ---
+def current_venue(update):
+    """Заведение, выбранное в чате (для inline-запросов — в личном чате пользователя)"""
+    chat = update.effective_chat
+    return chat_venues.venue_for_chat(chat.id if chat else update.effective_user.id)
+
+
+async def load_venues():
+    """Список заведений для обработчика: если его нет в кэше, он читается в потоке,
+    как меню в load_catalog, — цикл событий не ждет базу"""
+    if not DatabaseManager.venues_loaded():
+        await asyncio.to_thread(DatabaseManager.get_venues)
+    return DatabaseManager.get_venues()
+
+
+async def load_venue(update):
+    """current_venue для обработчика (список заведений читается через load_venues)"""
+    await load_venues()
+    return current_venue(update)
+
+
+async def reply_or_render(update, text, reply_markup=None):
+    """Ответить новым сообщением на команду или заменить экран при нажатии кнопки"""
+    if update.message:
+        await update.message.reply_text(text, reply_markup=reply_markup)
+    else:
+        await render_screen(update.callback_query, text, reply_markup=reply_markup)
+
+
+async def show_venues(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/venue — выбрать заведение для этого чата"""
+    venue = await load_venue(update)
+    keyboard = [
+        [InlineKeyboardButton(f"{'✅ ' if v.id == venue.id else ''}{v.name}", callback_data=f"venue_{v.id}")]
+        for v in DatabaseManager.get_venues()
+    ]
+    keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data='back_main')])
+    await reply_or_render(update, "📍 Выберите заведение:", InlineKeyboardMarkup(keyboard))
+
+
 # Главное меню
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Ссылка t.me/<бот>?start=venue_<id> сразу выбирает заведение
+    venue_id = venue_from_start_args(context.args) if update.message else None
+    venues = await load_venues()
+    # Главное меню отменяет незаконченный ввод (отзыв, лист, график)
+    conversation_state.cancel_input(update.effective_user.id)
+    if venue_id and chat_venues.select(update.effective_chat.id, venue_id) is None:
+        await update.message.reply_text("❌ Заведение из ссылки не найдено.")
+
     keyboard = [
         [InlineKeyboardButton("🍽 Меню", callback_data='menu')],
         [InlineKeyboardButton("📋 Лист", callback_data='sheet')],
@@ -36,12 +149,13 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         [InlineKeyboardButton("🪑 Посадка", callback_data='seating')],
         [InlineKeyboardButton("💬 Обратная связь", callback_data='feedback_main')]
     ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
 
-    if update.message:
-        await update.message.reply_text('Выберите опцию:', reply_markup=reply_markup)
-    else:
-        await update.callback_query.edit_message_text('Выберите опцию:', reply_markup=reply_markup)
+    text = 'Выберите опцию:'
+    if len(venues) > 1:
+        text = f"📍 {current_venue(update).name}\n\n{text}"
+        keyboard.append([InlineKeyboardButton("📍 Сменить заведение", callback_data='venues')])
+
+    await reply_or_render(update, text, InlineKeyboardMarkup(keyboard))
 
 
 async def serve_mini_app(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -58,97 +172,193 @@ async def button(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     data = query.data
+    user_id = query.from_user.id
+    venue = await load_venue(update)
+
+    # Выбор заведения
+    if data == 'venues':
+        await show_venues(update, context)
+    elif data.startswith('venue_'):
+        chat_venues.select(query.message.chat_id if query.message else query.from_user.id, data[len('venue_'):])
+        await start(update, context)
 
     # Главное меню
-    if data == 'menu':
-        await show_categories(query)
+    elif data == 'menu':
+        await show_categories(query, venue, get_menu_filter(user_id))
     elif data == 'sheet':
         await show_sheet_options(query)
     elif data == 'schedule':
         await show_schedule_options(query)
     elif data == 'seating':
-        await show_seating(query)
+        await show_seating(query, venue)
     elif data == 'feedback_main':
-        await show_feedback_options(query)
+        await show_feedback_options(query, venue)
 
     # Категории меню
     elif data.startswith('category_'):
         category_id = int(data.split('_')[1])
-        await show_dishes(query, category_id)
+        await show_dishes(query, venue, category_id, get_menu_filter(user_id))
+
+    # Фильтр по аллергенам, остроте и особенностям
+    elif data == 'filter':
+        await show_menu_filter(query, venue, get_menu_filter(user_id))
+    elif data.startswith('filter_'):
+        menu_filter = get_menu_filter(user_id)
+        action = data[len('filter_'):]
+        if action == 'reset':
+            menu_filter = MenuFilter()
+        elif action == 'spice':
+            # По кругу: любая острота -> не острое -> ... -> очень острое -> любая
+            max_spice = menu_filter.max_spice
+            if max_spice is None:
+                max_spice = 0
+            elif max_spice + 1 < len(SPICINESS_LEVELS) - 1:
+                max_spice += 1
+            else:
+                max_spice = None
+            menu_filter = MenuFilter(menu_filter.exclude, max_spice, menu_filter.features)
+        elif action == 'kids':
+            menu_filter.features ^= FEATURE_BITS[KID_FRIENDLY]
+        elif action.startswith('allergen_'):
+            menu_filter.exclude ^= 1 << int(action.split('_')[1])
+        conversation_state.set(user_id, 'menu_filter', menu_filter)
+        await show_menu_filter(query, venue, menu_filter)
 
     # Просмотр блюда
     elif data.startswith('dish_'):
         dish_id = int(data.split('_')[1])
-        await show_dish_detail(query, dish_id)
+        await show_dish_detail(query, venue, dish_id)
 
     # Лист
     elif data == 'view_go':
-        await view_sheet(query, 'go')
+        await view_sheet(query, venue, 'go')
     elif data == 'view_start':
-        await view_sheet(query, 'start')
+        await view_sheet(query, venue, 'start')
     elif data == 'update_sheet':
-        if not DatabaseManager.is_admin(query.from_user.id):
-            await query.edit_message_text(text="❌ У вас нет прав для обновления листа.")
+        if not DatabaseManager.is_admin(query.from_user.id, venue.id):
+            await render_screen(query, text="❌ У вас нет прав для обновления листа.")
             return
         await choose_sheet_type(query)
 
     elif data in ['set_go', 'set_start']:
         sheet_type = 'go' if data == 'set_go' else 'start'
-        context.user_data['waiting_for_sheet_update'] = sheet_type
-        await query.edit_message_text(text=f"Введите новый текст для {sheet_type} листа:")
+        conversation_state.set(user_id, 'waiting_for_sheet_update', sheet_type)
+        await render_screen(query, text=f"Введите новый текст для {sheet_type} листа:")
 
     # График
     elif data == 'view_schedule':
-        await send_schedule_photo(query)
+        await send_schedule_photo(query, venue)
     elif data == 'update_schedule':
-        if not DatabaseManager.is_admin(query.from_user.id):
-            await query.edit_message_text(text="❌ У вас нет прав для обновления графика.")
+        if not DatabaseManager.is_admin(query.from_user.id, venue.id):
+            await render_screen(query, text="❌ У вас нет прав для обновления графика.")
             return
-        context.user_data['waiting_for_schedule'] = True
-        await query.edit_message_text(text="Отправьте новое фото графика:")
+        conversation_state.set(user_id, 'waiting_for_schedule', True)
+        await render_screen(query, text="Отправьте новое фото графика:")
 
     # Обратная связь - выбор стола
     elif data == 'send_feedback':
-        await choose_table(query, context)
+        await choose_table(query, venue)
 
     elif data.startswith('table_'):
         table_number = int(data.split('_')[1])
-        context.user_data['selected_table'] = table_number
-        context.user_data['waiting_for_feedback'] = True
-        await query.edit_message_text(
+        conversation_state.set(user_id, 'selected_table', table_number)
+        conversation_state.set(user_id, 'waiting_for_feedback', True)
+        await render_screen(
+            query,
             text=f"🪑 Выбран стол: {table_number:02d}\n\n💬 Теперь напишите ваш отзыв, предложение или жалобу:")
 
     elif data == 'view_feedback':
-        if not DatabaseManager.is_admin(query.from_user.id):
-            await query.edit_message_text(text="❌ У вас нет прав для просмотра отзывов.")
+        if not DatabaseManager.is_admin(query.from_user.id, venue.id):
+            await render_screen(query, text="❌ У вас нет прав для просмотра отзывов.")
             return
-        await show_feedback_list(query)
+        await show_feedback_list(query, venue)
 
     elif data.startswith('feedback_'):
-        if not DatabaseManager.is_admin(query.from_user.id):
-            await query.edit_message_text(text="❌ У вас нет прав для управления отзывами.")
+        if not DatabaseManager.is_admin(query.from_user.id, venue.id):
+            await render_screen(query, text="❌ У вас нет прав для управления отзывами.")
             return
 
-        action, feedback_id = data.split('_')[1], data.split('_')[2]
+        action, argument = data.split('_')[1], int(data.split('_')[2])
+        list_state = get_feedback_list_state(user_id)
 
         if action == 'view':
-            await show_feedback_detail(query, int(feedback_id))
+            await show_feedback_detail(query, venue, argument)
         elif action == 'markread':
-            DatabaseManager.update_feedback_status(int(feedback_id), 'read')
-            await query.edit_message_text(text="✅ Отзыв помечен как прочитанный")
-            await show_feedback_list(query)
+            await asyncio.to_thread(DatabaseManager.update_feedback_status, argument, 'read', venue.id)
+            await show_feedback_list(query, venue, notice="✅ Отзыв помечен как прочитанный")
         elif action == 'delete':
-            DatabaseManager.delete_feedback(int(feedback_id))
-            await query.edit_message_text(text="✅ Отзыв удален")
-            await show_feedback_list(query)
+            await asyncio.to_thread(DatabaseManager.delete_feedback, argument, venue.id)
+            await show_feedback_list(query, venue, notice="✅ Отзыв удален")
+
+        # Массовые действия и навигация по списку
+        elif action == 'page':
+            list_state['offset'] = max(argument, 0)
+            await show_feedback_list(query, venue)
+        elif action == 'readpage':
+            page_ids = conversation_state.get(user_id, 'feedback_page_ids', [])
+            count = await asyncio.to_thread(DatabaseManager.update_feedback_status_bulk, 'read',
+                                            feedback_ids=page_ids, status='new', venue_id=venue.id)
+            await show_feedback_list(query, venue, notice=f"✅ Помечено прочитанными: {count}")
+        elif action == 'tables':
+            await choose_feedback_table(query, venue)
+        elif action == 'table':
+            list_state['table'] = argument or None
+            list_state['offset'] = 0
+            await show_feedback_list(query, venue)
+        elif action == 'purge':
+            await confirm_feedback_purge(query)
+        elif action == 'purgeread':
+            cutoff = datetime.now(timezone.utc) - timedelta(days=argument)
+            count = await asyncio.to_thread(DatabaseManager.delete_feedback_bulk, status='read',
+                                            created_to=cutoff, venue_id=venue.id)
+            list_state['offset'] = 0
+            await show_feedback_list(query, venue, notice=f"🗑 Удалено прочитанных отзывов: {count}")
+
+    # Стоп-лист: наличие блюд
+    elif data.startswith('stop_'):
+        if not DatabaseManager.is_admin(query.from_user.id, venue.id):
+            await render_screen(query, text="❌ У вас нет прав для управления стоп-листом.")
+            return
+
+        action, argument = data.split('_')[1], int(data.split('_')[2])
+        catalog = await load_catalog(venue.id)
+
+        if action == 'list':
+            await show_stop_list(query, venue)
+        elif action == 'categories':
+            await show_stop_categories(query, venue)
+        elif action == 'category':
+            await show_stop_category(query, venue, argument)
+        elif action == 'toggle':
+            # Из списка блюд категории: на стоп или обратно в меню
+            dish = catalog.get_dish(argument)
+            if dish is None:
+                await show_stop_list(query, venue, notice="❌ Блюдо не найдено")
+                return
+            count = await asyncio.to_thread(set_dishes_availability, venue, [dish.id], not dish.is_available)
+            await show_stop_category(query, venue, dish.category_id,
+                                     notice=stop_list_notice(count, not dish.is_available))
+        elif action == 'return':
+            count = await asyncio.to_thread(set_dishes_availability, venue, [argument], True)
+            await show_stop_list(query, venue, notice=stop_list_notice(count, True))
+        elif action == 'restore':
+            stopped = [dish.id for dish in catalog.get_all_dishes() if not dish.is_available]
+            count = await asyncio.to_thread(set_dishes_availability, venue, stopped, True)
+            await show_stop_list(query, venue, notice=stop_list_notice(count, True))
+        elif action == 'bulk':
+            conversation_state.set(user_id, 'waiting_for_stop_list', True)
+            await render_screen(
+                query,
+                text="📝 Отправьте названия блюд, которые закончились, — по одному в строке или через запятую.\n\n"
+                     "Все найденные блюда будут поставлены на стоп одним действием.")
 
     # Возврат в главное меню
     elif data == 'back_main':
         await start(update, context)
     elif data == 'back_categories':
-        await show_categories(query)
+        await show_categories(query, venue, get_menu_filter(user_id))
     elif data == 'back_feedback':
-        await show_feedback_options(query)
+        await show_feedback_options(query, venue)
     elif data == 'back_sheet':
         await show_sheet_options(query)
     elif data == 'back_schedule':
@@ -156,153 +366,373 @@ async def button(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 # --- ФУНКЦИИ ДЛЯ МЕНЮ ---
-async def show_categories(query):
-    categories = DatabaseManager.get_categories()
+def get_menu_filter(user_id):
+    """Фильтр меню пользователя (пустой, если не задан)"""
+    return conversation_state.setdefault(user_id, 'menu_filter', MenuFilter)
+
+
+async def load_catalog(venue_id):
+    """Каталог заведения для обработчика. Устаревшее меню перечитывается в потоке: цикл событий
+    не ждет базу, а одновременные чтения из разных чатов объединяются в одно (single-flight)"""
+    catalog = get_catalog(venue_id)
+    if catalog.needs_refresh():
+        await asyncio.to_thread(catalog.refresh)
+    return catalog
+
+
+def cached_menu_screen(catalog, key, build):
+    """Экран меню заведения из кэша; заново строится только после изменения каталога.
+    Каталог не перечитывается — его обновляет load_catalog"""
+    return catalog.screens.get(key, catalog.version, build)
+
+
+async def show_screen(query, screen):
+    await render_screen(query, text=screen.text, reply_markup=screen.reply_markup,
+                        parse_mode=screen.parse_mode, photo=screen.photo)
+
+
+def build_categories_screen(catalog, filter_active):
+    categories = catalog.get_categories()
     if not categories:
-        await query.edit_message_text(text="❌ Категории не найдены в базе данных")
-        return
+        return Screen("❌ Категории не найдены в базе данных")
 
     keyboard = []
     for category in categories:
         keyboard.append([InlineKeyboardButton(
-            category['name'],
-            callback_data=f"category_{category['id']}"
+            category.name,
+            callback_data=f"category_{category.id}"
         )])
+
+    keyboard.append([InlineKeyboardButton(
+        "🔍 Фильтр (включен)" if filter_active else "🔍 Фильтр по аллергенам",
+        callback_data='filter'
+    )])
     keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data='back_main')])
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text(text="Выберите категорию:", reply_markup=reply_markup)
+    return Screen("Выберите категорию:", InlineKeyboardMarkup(keyboard))
+
 
+async def show_categories(query, venue, menu_filter=None):
+    filter_active = menu_filter is not None and not menu_filter.is_empty()
+    catalog = await load_catalog(venue.id)
+    screen = cached_menu_screen(catalog, ('categories', filter_active),
+                                lambda: build_categories_screen(catalog, filter_active))
+    await show_screen(query, screen)
+
+
+def build_dishes_screen(catalog, category_id, menu_filter):
+    # Фильтр — только побитовые операции над заранее разобранными признаками
+    dishes = catalog.filter_dishes(menu_filter, category_id)
 
-async def show_dishes(query, category_id):
-    dishes = DatabaseManager.get_dishes_by_category(category_id)
     keyboard = []
 
     for dish in dishes:
-        display_name = dish['name'][:30] + "..." if len(dish['name']) > 30 else dish['name']
+        display_name = dish.name[:30] + "..." if len(dish.name) > 30 else dish.name
         keyboard.append([InlineKeyboardButton(
             display_name,
-            callback_data=f"dish_{dish['id']}"
+            callback_data=f"dish_{dish.id}"
         )])
 
-    # Получаем название категории для заголовка
-    categories = DatabaseManager.get_categories()
-    category_name = next((cat['name'] for cat in categories if cat['id'] == category_id), "Категория")
+    # Название категории для заголовка
+    category = catalog.get_category(category_id)
+    category_name = category.name if category else "Категория"
 
     keyboard.append([InlineKeyboardButton("⬅️ Назад к категориям", callback_data='back_categories')])
     reply_markup = InlineKeyboardMarkup(keyboard)
 
     if dishes:
-        await query.edit_message_text(text=f"Блюда в категории '{category_name}':", reply_markup=reply_markup)
+        return Screen(f"Блюда в категории '{category_name}':", reply_markup)
+    if not menu_filter.is_empty():
+        return Screen(f"В категории '{category_name}' нет блюд, подходящих под фильтр.", reply_markup)
+    return Screen(f"В категории '{category_name}' пока нет блюд.", reply_markup)
+
+
+async def show_dishes(query, venue, category_id, menu_filter=None):
+    menu_filter = menu_filter or MenuFilter()
+    catalog = await load_catalog(venue.id)
+    screen = cached_menu_screen(
+        catalog,
+        ('dishes', category_id, menu_filter.to_query()),
+        lambda: build_dishes_screen(catalog, category_id, menu_filter)
+    )
+    await show_screen(query, screen)
+
+
+def build_menu_filter_screen(catalog, menu_filter):
+    keyboard = []
+    row = []
+    for i, (allergen, emoji) in enumerate(ALLERGENS.items()):
+        excluded = menu_filter.exclude & ALLERGEN_BITS[allergen]
+        row.append(InlineKeyboardButton(
+            f"{'🚫' if excluded else emoji} {allergen}",
+            callback_data=f"filter_allergen_{i}"
+        ))
+        if len(row) == 2:
+            keyboard.append(row)
+            row = []
+    if row:
+        keyboard.append(row)
+
+    max_spice = menu_filter.max_spice
+    spice_text = "любая" if max_spice is None else f"до «{SPICINESS_LEVELS[max_spice]}»"
+    kids = menu_filter.features & FEATURE_BITS[KID_FRIENDLY]
+
+    keyboard.append([InlineKeyboardButton(f"🌶️ Острота: {spice_text}", callback_data='filter_spice')])
+    keyboard.append([InlineKeyboardButton(
+        f"{'✅' if kids else '👶'} Только подходящие детям",
+        callback_data='filter_kids'
+    )])
+    keyboard.append([
+        InlineKeyboardButton("♻️ Сбросить", callback_data='filter_reset'),
+        InlineKeyboardButton("✅ Показать меню", callback_data='menu')
+    ])
+
+    matching = len(catalog.filter_dishes(menu_filter))
+
+    text = "🔍 <b>Фильтр меню</b>\n\n"
+    text += "Нажмите на аллерген, чтобы исключить блюда с ним.\n\n"
+    text += f"🌶️ Острота: {spice_text}\n"
+    text += f"🍽️ Подходящих блюд: {matching}"
+
+    return Screen(text, InlineKeyboardMarkup(keyboard), 'HTML')
+
+
+async def show_menu_filter(query, venue, menu_filter):
+    """Экран фильтра: исключить аллергены, ограничить остроту, только детские блюда"""
+    catalog = await load_catalog(venue.id)
+    screen = cached_menu_screen(catalog, ('filter', menu_filter.to_query()),
+                                lambda: build_menu_filter_screen(catalog, menu_filter))
+    await show_screen(query, screen)
+
+
+def format_dish_text(dish):
+    """Текст карточки блюда в HTML"""
+    # Форматируем информацию о блюде
+    text = f"<b>{dish.name}</b>\n\n"
+
+    # Время приготовления: из столбца cooking_time, иначе по названию блюда
+    cooking_time = DatabaseManager.format_cooking_time(dish.name, dish.cooking_time)
+    text += f"{cooking_time}\n\n"
+
+    # Острота
+    spiciness = DatabaseManager.format_spiciness(dish.spiciness)
+    if spiciness:
+        text += f"<b>Острота:</b> {spiciness}\n\n"
+
+    # Состав
+    if dish.composition:
+        text += f"<i>🍽️ Состав:</i>\n{dish.composition}\n\n"
+
+    # Описание
+    if dish.description:
+        text += f"<i>📝 Описание:</i>\n{dish.description}\n\n"
+
+    flags = dish.flags
+
+    # Аллергены
+    allergens = format_allergen_flags(flags)
+    if allergens:
+        text += f"<b>⚠️ Аллергены:</b>\n{allergens}\n\n"
+
+    # Особенности
+    for label in flags.feature_labels():
+        text += f"{label}\n"
+
+    return text
+
+
+def build_dish_screen(catalog, dish_id):
+    dish = catalog.get_dish(dish_id)
+    if not dish:
+        return Screen("Блюдо не найдено.")
+
+    # Кнопка назад
+    keyboard = [[InlineKeyboardButton(
+        "⬅️ Назад к блюдам",
+        callback_data=f"category_{dish.category_id}"
+    )]]
+
+    # Если есть фото, показываем его в этом же сообщении
+    return Screen(format_dish_text(dish), InlineKeyboardMarkup(keyboard), 'HTML', dish.photo_file_id)
+
+
+async def show_dish_detail(query, venue, dish_id):
+    catalog = await load_catalog(venue.id)
+    screen = cached_menu_screen(catalog, ('dish', dish_id), lambda: build_dish_screen(catalog, dish_id))
+    await show_screen(query, screen)
+
+# --- СТОП-ЛИСТ ---
+def set_dishes_availability(venue, dish_ids, is_available):
+    """Одна запись в базу, затем сразу каталог (экраны бота) и снимок для Mini App.
+
+    Возвращает число измененных блюд или None при ошибке базы.
+    """
+    updated = DatabaseManager.set_dishes_availability(dish_ids, is_available, venue.id)
+    if updated is None:
+        return None
+    # Версия каталога растет один раз: кэш экранов меню сбрасывается, гости сразу видят изменения
+    if get_catalog(venue.id).upsert_dishes(updated):
+        request_snapshot_publish()
+    return len(updated)
+
+
+def stop_list_notice(count, is_available):
+    if count is None:
+        return "❌ Ошибка базы данных, наличие не изменено"
+    return f"✅ Возвращено в меню: {count}" if is_available else f"🛑 Поставлено на стоп: {count}"
+
+
+def short_dish_name(dish):
+    return dish.name[:30] + "..." if len(dish.name) > 30 else dish.name
+
+
+def build_stop_list_screen(catalog):
+    stopped = [dish for dish in catalog.get_all_dishes() if not dish.is_available]
+
+    text = "🛑 <b>Стоп-лист</b>\n\n"
+    if stopped:
+        text += f"Нет в наличии: {len(stopped)}. Нажмите на блюдо, чтобы вернуть его в меню."
     else:
-        await query.edit_message_text(text=f"В категории '{category_name}' пока нет блюд.", reply_markup=reply_markup)
-
-
-async def show_dish_detail(query, dish_id):
-    dish = DatabaseManager.get_dish(dish_id)
-
-    if dish:
-        # Форматируем информацию о блюде
-        text = f"<b>{dish['name']}</b>\n\n"
-
-        # Время приготовления (передаем название блюда)
-        cooking_time = DatabaseManager.format_cooking_time(dish.get('name'))
-        text += f"{cooking_time}\n\n"
-
-        # Острота
-        spiciness = DatabaseManager.format_spiciness(dish.get('spiciness', 'Не острое'))
-        if spiciness:
-            text += f"<b>Острота:</b> {spiciness}\n\n"
-
-        # Состав
-        if dish.get('composition'):
-            text += f"<i>🍽️ Состав:</i>\n{dish['composition']}\n\n"
-
-        # Описание
-        if dish.get('description'):
-            text += f"<i>📝 Описание:</i>\n{dish['description']}\n\n"
-
-        # Аллергены
-        allergens = DatabaseManager.format_allergens(dish.get('allergens'))
-        if allergens:
-            text += f"<b>⚠️ Аллергены:</b>\n{allergens}\n\n"
-
-        # Особенности
-        if dish.get('features'):
-            features = dish['features']
-            if 'Подходит детям' in features:
-                text += "👶 Подходит детям\n"
-            if 'Подойдет на общий стол' in features:
-                text += "👥 Подойдет на общий стол\n"
-            if 'Содержит лактозу' in features:
-                text += "🥛 Содержит лактозу\n"
-            if 'Подается с перчатками' in features:
-                text += "🧤 Подается с перчатками\n"
-            if 'Подается с тарелкой теплой воды' in features:
-                text += "♨️ Подается с тарелкой теплой воды\n"
-            if 'Острота не регулируется' in features:
-                text += "⚡ Острота не регулируется\n"
-            if 'Соевый соус средней остроты' in features:
-                text += "🍶 Соевый соус средней остроты\n"
-            if 'Можно подогреть' in features:
-                text += "🔥 Можно подогреть\n"
-            if 'Можно сделать острее' in features:
-                text += "🌶️ Можно сделать острее\n"
-            if 'Спрашивать про рис' in features:
-                text += "🍚 Спрашивать про рис\n"
-            if 'Подается с доп.ингредиентами' in features:
-                text += "🧂 Подается с дополнительными ингредиентами\n"
-            if 'Только на втором этаже' in features:
-                text += "🏠 Только на втором этаже\n"
-            if 'Кимчи средней остроты' in features:
-                text += "🥬 Кимчи средней остроты\n"
-            if 'Острый только спайси соус' in features:
-                text += "🌶️ Острый только спайси соус\n"
-            if 'Спрашивать вес на кухне' in features:
-                text += "⚖️ Спрашивать вес на кухне\n"
-            if 'Подается с топпингом' in features:
-                text += "🍓 Подается с топпингом\n"
-            if 'Топпинг отдельно' in features:
-                text += "🥄 Топпинг пробивается отдельно\n"
-            if 'Подается с мороженым' in features:
-                text += "🍦 Подается с мороженым\n"
-            if '3 вкуса на выбор' in features:
-                text += "🎨 3 вкуса на выбор\n"
-            if 'Подается с двумя топпингами' in features:
-                text += "🍫🍓 Подается с двумя топпингами\n"
-            if 'Украшается микрозеленью' in features:
-                text += "🌱 Украшается микрозеленью\n"
-            if 'Бизнес ланч' in features:
-                text += "🏢 Бизнес ланч\n"
-
-        # Кнопка назад
-        keyboard = [[InlineKeyboardButton(
-            "⬅️ Назад к блюдам",
-            callback_data=f"category_{dish['category_id']}"
-        )]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        text += "Все блюда в наличии."
+
+    keyboard = [[InlineKeyboardButton(f"✅ {short_dish_name(dish)}", callback_data=f"stop_return_{dish.id}")]
+                for dish in stopped]
+    if len(stopped) > 1:
+        keyboard.append([InlineKeyboardButton("♻️ Вернуть все в меню", callback_data='stop_restore_0')])
+    keyboard.append([InlineKeyboardButton("➕ Поставить на стоп", callback_data='stop_categories_0')])
+    keyboard.append([InlineKeyboardButton("📝 Поставить на стоп списком", callback_data='stop_bulk_0')])
+    keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data='back_main')])
+    return Screen(text, InlineKeyboardMarkup(keyboard), 'HTML')
 
-        # Если есть фото, отправляем его с подписью
-        if dish.get('photo_file_id'):
-            try:
-                await query.message.reply_photo(
-                    photo=dish['photo_file_id'],
-                    caption=text,
-                    parse_mode='HTML',
-                    reply_markup=reply_markup
-                )
-                return
-            except Exception as e:
-                logger.error(f"Error sending photo: {e}")
-                # Если фото не загружено, продолжаем без него
 
-        # Если фото нет или ошибка при отправке фото
-        await query.edit_message_text(
-            text=text,
-            reply_markup=reply_markup,
-            parse_mode='HTML'
-        )
+def with_notice(screen, notice):
+    if not notice:
+        return screen
+    text = f"{html.escape(notice)}\n\n{screen.text}" if screen.parse_mode == 'HTML' else f"{notice}\n\n{screen.text}"
+    return Screen(text, screen.reply_markup, screen.parse_mode, screen.photo)
+
+
+async def show_stop_list(query, venue, notice=None):
+    """Блюда на стопе; экран общий для всех администраторов заведения и кэшируется до изменения меню"""
+    catalog = await load_catalog(venue.id)
+    screen = cached_menu_screen(catalog, ('stop_list',), lambda: build_stop_list_screen(catalog))
+    await show_screen(query, with_notice(screen, notice))
+
+
+def build_stop_categories_screen(catalog):
+    keyboard = []
+    for category in catalog.get_categories():
+        stopped = sum(1 for dish in catalog.get_all_dishes(category.id) if not dish.is_available)
+        label = f"{category.name} (🚫 {stopped})" if stopped else category.name
+        keyboard.append([InlineKeyboardButton(label, callback_data=f"stop_category_{category.id}")])
+    keyboard.append([InlineKeyboardButton("⬅️ Назад к стоп-листу", callback_data='stop_list_0')])
+    return Screen("Выберите категорию:", InlineKeyboardMarkup(keyboard))
+
+
+async def show_stop_categories(query, venue):
+    catalog = await load_catalog(venue.id)
+    screen = cached_menu_screen(catalog, ('stop_categories',), lambda: build_stop_categories_screen(catalog))
+    await show_screen(query, screen)
+
+
+def build_stop_category_screen(catalog, category_id):
+    category = catalog.get_category(category_id)
+    category_name = category.name if category else "Категория"
+
+    keyboard = [
+        [InlineKeyboardButton(f"{'✅' if dish.is_available else '🚫'} {short_dish_name(dish)}",
+                              callback_data=f"stop_toggle_{dish.id}")]
+        for dish in catalog.get_all_dishes(category_id)
+    ]
+    keyboard.append([InlineKeyboardButton("⬅️ Назад к категориям", callback_data='stop_categories_0')])
+    keyboard.append([InlineKeyboardButton("🛑 Стоп-лист", callback_data='stop_list_0')])
+    return Screen(f"{category_name}: ✅ — в меню, 🚫 — на стопе. Нажмите, чтобы переключить.",
+                  InlineKeyboardMarkup(keyboard))
+
+
+async def show_stop_category(query, venue, category_id, notice=None):
+    catalog = await load_catalog(venue.id)
+    screen = cached_menu_screen(catalog, ('stop_category', category_id),
+                                lambda: build_stop_category_screen(catalog, category_id))
+    await show_screen(query, with_notice(screen, notice))
+
+
+def parse_stop_list(catalog, text):
+    """Блюда по названиям из сообщения: (найденные, не найденные названия, неоднозначные названия)"""
+    found = {}
+    missing = []
+    ambiguous = []
+    for name in re.split(r'[\n,;]+', text):
+        name = name.strip()
+        if not name:
+            continue
+        dishes = catalog.find_dishes(name)
+        if len(dishes) == 1:
+            found[dishes[0].id] = dishes[0]
+        elif dishes:
+            ambiguous.append(name)
+        else:
+            missing.append(name)
+    return list(found.values()), missing, ambiguous
+
+
+async def stop_list_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/stoplist: какие блюда на стопе; поставить на стоп или вернуть в меню"""
+    venue = await load_venue(update)
+    if not DatabaseManager.is_admin(update.effective_user.id, venue.id):
+        await update.message.reply_text("❌ У вас нет прав для управления стоп-листом.")
+        return
+    catalog = await load_catalog(venue.id)
+    screen = cached_menu_screen(catalog, ('stop_list',), lambda: build_stop_list_screen(catalog))
+    await update.message.reply_text(screen.text, reply_markup=screen.reply_markup, parse_mode=screen.parse_mode)
+
+
+# --- ПОИСК ПО МЕНЮ ---
+async def show_search_results(update: Update, search_text):
+    """Ответить на свободный текст списком подходящих блюд"""
+    venue = await load_venue(update)
+    catalog = await load_catalog(venue.id)
+    dishes = catalog.search(search_text, limit=10)
+
+    keyboard = []
+    for dish in dishes:
+        display_name = dish.name[:30] + "..." if len(dish.name) > 30 else dish.name
+        keyboard.append([InlineKeyboardButton(
+            display_name,
+            callback_data=f"dish_{dish.id}"
+        )])
+    keyboard.append([InlineKeyboardButton("🍽 Меню", callback_data='menu')])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    if dishes:
+        await update.message.reply_text(f"🔎 Найдено по запросу «{search_text}»:", reply_markup=reply_markup)
     else:
-        await query.edit_message_text(text="Блюдо не найдено.")
+        await update.message.reply_text(
+            f"🔎 По запросу «{search_text}» ничего не найдено. Попробуйте другое название или откройте меню.",
+            reply_markup=reply_markup
+        )
+
+
+async def inline_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Поиск блюд в inline-режиме (@бот запрос)"""
+    search_text = update.inline_query.query.strip()
+    if not search_text:
+        await update.inline_query.answer([], cache_time=60)
+        return
+
+    venue = await load_venue(update)
+    catalog = await load_catalog(venue.id)
+    results = []
+    for dish in catalog.search(search_text, limit=20):
+        description = dish.composition or dish.description
+        results.append(InlineQueryResultArticle(
+            id=str(dish.id),
+            title=dish.name,
+            description=description[:100],
+            input_message_content=InputTextMessageContent(format_dish_text(dish), parse_mode='HTML')
+        ))
+
+    await update.inline_query.answer(results, cache_time=60)
+
 
 # --- ФУНКЦИИ ДЛЯ ЛИСТА ---
 async def show_sheet_options(query):
@@ -313,23 +743,23 @@ async def show_sheet_options(query):
         [InlineKeyboardButton("⬅️ Назад", callback_data='back_main')]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text(text="Выберите опцию для листа:", reply_markup=reply_markup)
+    await render_screen(query, text="Выберите опцию для листа:", reply_markup=reply_markup)
 
 
-async def view_sheet(query, sheet_type):
-    sheet = DatabaseManager.get_sheet(sheet_type)
+async def view_sheet(query, venue, sheet_type):
+    sheet = DatabaseManager.get_sheet(sheet_type, venue.id)
     if sheet:
         sheet_name = "Go Лист" if sheet_type == 'go' else "Start Лист"
-        text = f"<b>{sheet_name}:</b>\n\n{sheet['content']}"
+        text = f"<b>{sheet_name}:</b>\n\n{sheet.content}"
 
         keyboard = [[InlineKeyboardButton("⬅️ Назад", callback_data='back_sheet')]]
         reply_markup = InlineKeyboardMarkup(keyboard)
 
-        await query.edit_message_text(text=text, parse_mode='HTML', reply_markup=reply_markup)
+        await render_screen(query, text=text, parse_mode='HTML', reply_markup=reply_markup)
     else:
         keyboard = [[InlineKeyboardButton("⬅️ Назад", callback_data='back_sheet')]]
         reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(text="Лист не найден.", reply_markup=reply_markup)
+        await render_screen(query, text="Лист не найден.", reply_markup=reply_markup)
 
 
 async def choose_sheet_type(query):
@@ -339,7 +769,7 @@ async def choose_sheet_type(query):
         [InlineKeyboardButton("⬅️ Назад", callback_data='back_sheet')]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text(text="Какой лист обновляем?", reply_markup=reply_markup)
+    await render_screen(query, text="Какой лист обновляем?", reply_markup=reply_markup)
 
 
 # --- ФУНКЦИИ ДЛЯ ГРАФИКА ---
@@ -350,77 +780,61 @@ async def show_schedule_options(query):
         [InlineKeyboardButton("⬅️ Назад", callback_data='back_main')]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text(text="Выберите опцию для графика:", reply_markup=reply_markup)
+    await render_screen(query, text="Выберите опцию для графика:", reply_markup=reply_markup)
 
 
-async def send_schedule_photo(query):
-    file_data = DatabaseManager.get_file('schedule')
+async def send_schedule_photo(query, venue):
+    file_data = DatabaseManager.get_file('schedule', venue.id)
+    keyboard = [[InlineKeyboardButton("⬅️ Назад", callback_data='back_schedule')]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
 
-    # Проверяем, что file_data существует и file_id не пустой
-    if file_data and file_data.get('file_id') and file_data['file_id'].strip():
+    # Проверяем, что файл есть и file_id не пустой
+    if file_data and file_data.file_id:
         try:
-            keyboard = [[InlineKeyboardButton("⬅️ Назад", callback_data='back_schedule')]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-
-            # Отправляем фото как новое сообщение
-            await query.message.reply_photo(
-                photo=file_data['file_id'],
-                caption="📅 График работы",
-                reply_markup=reply_markup
-            )
+            # Показываем фото в этом же сообщении
+            await render_screen(query, text="📅 График работы", reply_markup=reply_markup, photo=file_data.file_id)
         except Exception as e:
             logger.error(f"❌ Ошибка при отправке фото графика: {e}")
-            keyboard = [[InlineKeyboardButton("⬅️ Назад", callback_data='back_schedule')]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await query.message.reply_text(
+            await render_screen(
+                query,
                 text="❌ Ошибка при загрузке графика. Попробуйте обновить его.",
                 reply_markup=reply_markup
             )
     else:
-        keyboard = [[InlineKeyboardButton("⬅️ Назад", callback_data='back_schedule')]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(text="📅 График еще не загружен.", reply_markup=reply_markup)
+        await render_screen(query, text="📅 График еще не загружен.", reply_markup=reply_markup)
 
 
 # --- ФУНКЦИИ ДЛЯ ПОСАДКИ ---
-async def show_seating(query):
-    file_data = DatabaseManager.get_file('seating')
+async def show_seating(query, venue):
+    file_data = DatabaseManager.get_file('seating', venue.id)
+    keyboard = [[InlineKeyboardButton("⬅️ Назад", callback_data='back_main')]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
 
-    # Проверяем, что file_data существует и file_id не пустой
-    if file_data and file_data.get('file_id') and file_data['file_id'].strip():
+    # Проверяем, что файл есть и file_id не пустой
+    if file_data and file_data.file_id:
         try:
-            keyboard = [[InlineKeyboardButton("⬅️ Назад", callback_data='back_main')]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-
-            # Отправляем фото как новое сообщение
-            await query.message.reply_photo(
-                photo=file_data['file_id'],
-                caption="🪑 Схема посадки",
-                reply_markup=reply_markup
-            )
+            # Показываем фото в этом же сообщении
+            await render_screen(query, text="🪑 Схема посадки", reply_markup=reply_markup, photo=file_data.file_id)
         except Exception as e:
             logger.error(f"❌ Ошибка при отправке фото посадки: {e}")
-            keyboard = [[InlineKeyboardButton("⬅️ Назад", callback_data='back_main')]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await query.message.reply_text(
+            await render_screen(
+                query,
                 text="❌ Ошибка при загрузке схемы посадки. Попробуйте обновить её.",
                 reply_markup=reply_markup
             )
     else:
-        keyboard = [[InlineKeyboardButton("⬅️ Назад", callback_data='back_main')]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(text="🪑 Схема посадки еще не загружена.", reply_markup=reply_markup)
+        await render_screen(query, text="🪑 Схема посадки еще не загружена.", reply_markup=reply_markup)
 
 
 # --- ФУНКЦИИ ДЛЯ ОБРАТНОЙ СВЯЗИ С ВЫБОРОМ СТОЛА ---
-async def show_feedback_options(query):
+async def show_feedback_options(query, venue):
     keyboard = [
         [InlineKeyboardButton("💌 Оставить отзыв", callback_data='send_feedback')],
     ]
 
     # Добавляем кнопку просмотра отзывов только для админов
-    if DatabaseManager.is_admin(query.from_user.id):
-        stats = DatabaseManager.get_feedback_stats()
+    if DatabaseManager.is_admin(query.from_user.id, venue.id):
+        stats = await asyncio.to_thread(DatabaseManager.get_feedback_stats, venue.id)
         keyboard.append([InlineKeyboardButton(
             f"📊 Просмотреть отзывы ({stats['new']} новых)",
             callback_data='view_feedback'
@@ -429,16 +843,16 @@ async def show_feedback_options(query):
     keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data='back_main')])
 
     reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text(
+    await render_screen(
+        query,
         text="💬 Обратная связь\n\nЗдесь вы можете оставить отзыв, предложение или сообщить о проблеме:",
         reply_markup=reply_markup
     )
 
 
-async def choose_table(query, context):
-    """Выбор стола от 1 до 37 с нормальной сеткой"""
-    # Создаем сетку 5x8 для 37 столов (последний ряд будет неполным)
-    tables = list(range(1, 38))
+def build_table_keyboard(callback_prefix, table_count):
+    """Сетка столов заведения от 1 до table_count по 5 в ряд"""
+    tables = list(range(1, table_count + 1))
 
     keyboard = []
     row = []
@@ -446,7 +860,7 @@ async def choose_table(query, context):
     for i, table in enumerate(tables, 1):
         # Форматируем номер стола с ведущим нулем для красоты
         table_text = f"{table:02d}"
-        row.append(InlineKeyboardButton(f"🪑 {table_text}", callback_data=f"table_{table}"))
+        row.append(InlineKeyboardButton(f"🪑 {table_text}", callback_data=f"{callback_prefix}{table}"))
 
         # Создаем новую строку каждые 5 столов
         if i % 5 == 0:
@@ -457,62 +871,157 @@ async def choose_table(query, context):
     if row:
         keyboard.append(row)
 
+    return keyboard
+
+
+async def choose_table(query, venue):
+    """Выбор стола заведения с нормальной сеткой"""
+    keyboard = build_table_keyboard("table_", venue.table_count)
     keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data='back_feedback')])
 
     reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text(
-        text="🪑 Выберите номер вашего стола (от 1 до 37):",
+    await render_screen(
+        query,
+        text=f"🪑 Выберите номер вашего стола (от 1 до {venue.table_count}):",
         reply_markup=reply_markup
     )
 
 
-async def show_feedback_list(query):
-    feedback_list = DatabaseManager.get_all_feedback()
-    stats = DatabaseManager.get_feedback_stats()
+# Сколько отзывов показывать на одной странице списка
+FEEDBACK_PAGE_SIZE = 10
+
+
+def get_feedback_list_state(user_id):
+    """Текущая страница и фильтр по столу в списке отзывов администратора"""
+    return conversation_state.setdefault(user_id, 'feedback_list', lambda: {'offset': 0, 'table': None})
+
+
+async def show_feedback_list(query, venue, notice=None):
+    list_state = get_feedback_list_state(query.from_user.id)
+
+    # Одна страница (+1 отзыв, чтобы понять, есть ли следующая) одним запросом
+    feedback_list = await asyncio.to_thread(
+        DatabaseManager.get_feedback,
+        limit=FEEDBACK_PAGE_SIZE + 1,
+        offset=list_state['offset'],
+        table_number=list_state['table'],
+        venue_id=venue.id
+    )
+    if not feedback_list and list_state['offset'] > 0:
+        list_state['offset'] = 0
+        feedback_list = await asyncio.to_thread(DatabaseManager.get_feedback, limit=FEEDBACK_PAGE_SIZE + 1,
+                                                table_number=list_state['table'], venue_id=venue.id)
+
+    has_next_page = len(feedback_list) > FEEDBACK_PAGE_SIZE
+    feedback_list = feedback_list[:FEEDBACK_PAGE_SIZE]
+
+    # Запоминаем новые отзывы страницы для кнопки "прочитать все на странице"
+    page_ids = [f.id for f in feedback_list if f.status == 'new']
+    conversation_state.set(query.from_user.id, 'feedback_page_ids', page_ids)
+
+    text = f"{notice}\n\n" if notice else ""
 
     if not feedback_list:
-        keyboard = [[InlineKeyboardButton("⬅️ Назад", callback_data='back_feedback')]]
+        keyboard = []
+        if list_state['table']:
+            text += f"📭 Отзывов по столу {list_state['table']:02d} нет"
+            keyboard.append([InlineKeyboardButton("🪑 Все столы", callback_data='feedback_table_0')])
+        else:
+            text += "📭 Отзывов пока нет"
+        keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data='back_feedback')])
         reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(
-            text="📭 Отзывов пока нет",
+        await render_screen(
+            query,
+            text=text,
             reply_markup=reply_markup
         )
         return
 
-    text = f"📊 Всего отзывов: {stats['total']} (новых: {stats['new']})\n\n"
-    text += "Выберите отзыв для просмотра:\n\n"
+    stats = await asyncio.to_thread(DatabaseManager.get_feedback_stats, venue.id)
+    text += f"📊 Всего отзывов: {stats['total']} (новых: {stats['new']})\n"
+    if list_state['table']:
+        text += f"🪑 Только стол {list_state['table']:02d}\n"
+    text += "\nВыберите отзыв для просмотра:\n\n"
 
     keyboard = []
-    for feedback in feedback_list[:10]:  # Показываем последние 10 отзывов
-        status_icon = "🆕" if feedback.get('status') == 'new' else "📖"
-        table_number = feedback.get('table_number', '?')
-        user_info = f"@{feedback.get('username', 'без username')}" if feedback.get(
-            'username') else f"ID: {feedback['user_id']}"
+    for feedback in feedback_list:
+        status_icon = "🆕" if feedback.status == 'new' else "📖"
+        table_number = f"{feedback.table_number:02d}" if feedback.table_number is not None else "?"
 
-        # Используем Саратовское время
-        saratov_time = DatabaseManager.format_saratov_time(feedback.get('created_at'))
-
-        btn_text = f"{status_icon} Стол {table_number:02d} - {saratov_time}"
+        # Время — по часовому поясу заведения
+        btn_text = f"{status_icon} Стол {table_number} - {feedback.local_time_text(venue.tz)}"
         if len(btn_text) > 50:
             btn_text = btn_text[:47] + "..."
 
         keyboard.append([InlineKeyboardButton(
             btn_text,
-            callback_data=f"feedback_view_{feedback['id']}"
+            callback_data=f"feedback_view_{feedback.id}"
         )])
 
+    # Страницы
+    navigation = []
+    if list_state['offset'] > 0:
+        navigation.append(InlineKeyboardButton(
+            "⬅️ Новее",
+            callback_data=f"feedback_page_{max(list_state['offset'] - FEEDBACK_PAGE_SIZE, 0)}"
+        ))
+    if has_next_page:
+        navigation.append(InlineKeyboardButton(
+            "Старее ➡️",
+            callback_data=f"feedback_page_{list_state['offset'] + FEEDBACK_PAGE_SIZE}"
+        ))
+    if navigation:
+        keyboard.append(navigation)
+
+    # Массовые действия
+    if page_ids:
+        keyboard.append([InlineKeyboardButton(
+            f"✅ Прочитать все на странице ({len(page_ids)})",
+            callback_data='feedback_readpage_0'
+        )])
+    if list_state['table']:
+        keyboard.append([InlineKeyboardButton("🪑 Все столы", callback_data='feedback_table_0')])
+    else:
+        keyboard.append([InlineKeyboardButton("🪑 Отзывы по столу", callback_data='feedback_tables_0')])
+    keyboard.append([InlineKeyboardButton("🗑 Удалить прочитанные старше…", callback_data='feedback_purge_0')])
+
     keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data='back_feedback')])
     reply_markup = InlineKeyboardMarkup(keyboard)
 
-    await query.edit_message_text(text=text, reply_markup=reply_markup)
+    await render_screen(query, text=text, reply_markup=reply_markup)
+
+
+async def choose_feedback_table(query, venue):
+    """Выбор стола для фильтра списка отзывов"""
+    keyboard = build_table_keyboard("feedback_table_", venue.table_count)
+    keyboard.append([InlineKeyboardButton("🪑 Все столы", callback_data='feedback_table_0')])
+    keyboard.append([InlineKeyboardButton("⬅️ Назад к списку", callback_data='view_feedback')])
+
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await render_screen(query, text="🪑 Отзывы какого стола показать?", reply_markup=reply_markup)
+
 
+async def confirm_feedback_purge(query):
+    """Подтверждение удаления старых прочитанных отзывов"""
+    keyboard = [
+        [InlineKeyboardButton("🗑 Старше 1 дня", callback_data='feedback_purgeread_1')],
+        [InlineKeyboardButton("🗑 Старше 7 дней", callback_data='feedback_purgeread_7')],
+        [InlineKeyboardButton("🗑 Старше 30 дней", callback_data='feedback_purgeread_30')],
+        [InlineKeyboardButton("⬅️ Отмена", callback_data='view_feedback')]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await render_screen(
+        query,
+        text="🗑 Удалить прочитанные отзывы старше:\n\nНовые отзывы не удаляются.",
+        reply_markup=reply_markup
+    )
 
-async def show_feedback_detail(query, feedback_id):
-    feedback_list = DatabaseManager.get_all_feedback()
-    feedback = next((f for f in feedback_list if f['id'] == feedback_id), None)
+
+async def show_feedback_detail(query, venue, feedback_id):
+    feedback = await asyncio.to_thread(DatabaseManager.get_feedback_by_id, feedback_id, venue.id)
 
     if not feedback:
-        await query.edit_message_text(text="❌ Отзыв не найден")
+        await render_screen(query, text="❌ Отзыв не найден")
         return
 
     status_text = {
@@ -521,46 +1030,47 @@ async def show_feedback_detail(query, feedback_id):
         'replied': '✅ Отвечен'
     }
 
-    status = status_text.get(feedback.get('status'), '❓ Неизвестен')
-    table_number = feedback.get('table_number', 'Не указан')
-    user_info = f"@{feedback.get('username')}" if feedback.get('username') else f"ID: {feedback['user_id']}"
-    full_name = feedback.get('full_name', 'Не указано')
+    status = status_text.get(feedback.status, '❓ Неизвестен')
+    table_number = f"{feedback.table_number:02d}" if feedback.table_number is not None else "Не указан"
+    user_info = f"@{feedback.username}" if feedback.username else f"ID: {feedback.user_id}"
+    full_name = feedback.full_name or 'Не указано'
 
-    # Используем Саратовское время
-    saratov_time = DatabaseManager.format_saratov_time(feedback.get('created_at'))
+    # Время — по часовому поясу заведения
+    saratov_time = feedback.local_time_text(venue.tz)
 
-    text = f"💬 <b>Отзыв #{feedback['id']}</b>\n\n"
-    text += f"🪑 <b>Стол:</b> {table_number:02d}\n"
+    text = f"💬 <b>Отзыв #{feedback.id}</b>\n\n"
+    text += f"🪑 <b>Стол:</b> {table_number}\n"
     text += f"👤 <b>Пользователь:</b> {user_info}\n"
     text += f"📛 <b>Имя:</b> {full_name}\n"
-    text += f"📅 <b>Дата и время (Саратов):</b> {saratov_time}\n"
+    text += f"📅 <b>Дата и время (местное):</b> {saratov_time}\n"
     text += f"📊 <b>Статус:</b> {status}\n\n"
-    text += f"💭 <b>Сообщение:</b>\n{feedback['message']}"
+    text += f"💭 <b>Сообщение:</b>\n{feedback.message}"
 
     keyboard = []
-    if feedback.get('status') == 'new':
+    if feedback.status == 'new':
         keyboard.append([InlineKeyboardButton(
             "✅ Пометить прочитанным",
-            callback_data=f"feedback_markread_{feedback['id']}"
+            callback_data=f"feedback_markread_{feedback.id}"
         )])
 
     keyboard.append([InlineKeyboardButton(
         "🗑 Удалить отзыв",
-        callback_data=f"feedback_delete_{feedback['id']}"
+        callback_data=f"feedback_delete_{feedback.id}"
     )])
     keyboard.append([InlineKeyboardButton("⬅️ Назад к списку", callback_data='view_feedback')])
 
     reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text(text=text, parse_mode='HTML', reply_markup=reply_markup)
+    await render_screen(query, text=text, parse_mode='HTML', reply_markup=reply_markup)
 
 
 # --- КОМАНДЫ ДЛЯ АДМИНИСТРИРОВАНИЯ ---
 async def add_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Добавить администратора"""
     user_id = update.message.from_user.id
+    venue = await load_venue(update)
 
     # Проверяем, что текущий пользователь - админ
-    if not DatabaseManager.is_admin(user_id):
+    if not DatabaseManager.is_admin(user_id, venue.id):
         await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
         return
 
@@ -578,10 +1088,11 @@ async def add_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
         full_name = f"{update.message.from_user.first_name or ''} {update.message.from_user.last_name or ''}".strip()
 
         # Добавляем в базу
-        success = DatabaseManager.add_admin(new_admin_id, username, full_name)
+        success = await asyncio.to_thread(DatabaseManager.add_admin, new_admin_id, username, full_name, venue.id)
 
         if success:
-            await update.message.reply_text(f"✅ Пользователь {new_admin_id} добавлен как администратор!")
+            await update.message.reply_text(
+                f"✅ Пользователь {new_admin_id} добавлен как администратор заведения «{venue.name}»!")
         else:
             await update.message.reply_text("❌ Ошибка при добавлении администратора.")
 
@@ -595,18 +1106,19 @@ async def add_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def list_admins(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать список администраторов"""
     user_id = update.message.from_user.id
+    venue = await load_venue(update)
 
-    if not DatabaseManager.is_admin(user_id):
+    if not DatabaseManager.is_admin(user_id, venue.id):
         await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
         return
 
-    admins = DatabaseManager.get_all_admins()
+    admins = DatabaseManager.get_all_admins(venue.id)
 
     if not admins:
         await update.message.reply_text("📋 Список администраторов пуст.")
         return
 
-    admin_list = "📋 Список администраторов:\n\n"
+    admin_list = f"📋 Администраторы заведения «{venue.name}»:\n\n"
     for admin in admins:
         admin_list += f"🆔 ID: {admin['user_id']}\n"
         admin_list += f"👤 Имя: {admin.get('full_name', 'Не указано')}\n"
@@ -620,8 +1132,9 @@ async def list_admins(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def remove_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Удалить администратора"""
     user_id = update.message.from_user.id
+    venue = await load_venue(update)
 
-    if not DatabaseManager.is_admin(user_id):
+    if not DatabaseManager.is_admin(user_id, venue.id):
         await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
         return
 
@@ -639,7 +1152,7 @@ async def remove_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("❌ Вы не можете удалить сами себя.")
             return
 
-        success = DatabaseManager.remove_admin(remove_admin_id)
+        success = await asyncio.to_thread(DatabaseManager.remove_admin, remove_admin_id, venue.id)
 
         if success:
             await update.message.reply_text(f"✅ Пользователь {remove_admin_id} удален из администраторов!")
@@ -653,17 +1166,304 @@ async def remove_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Произошла ошибка при удалении администратора.")
 
 
+async def db_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Показать статистику объединения запросов к базе"""
+    user_id = update.message.from_user.id
+    venue = await load_venue(update)
+
+    if not DatabaseManager.is_admin(user_id, venue.id):
+        await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
+        return
+
+    stats = DatabaseManager.get_single_flight_stats()
+    total = stats['total']
+
+    text = "📊 Запросы на чтение меню:\n\n"
+    text += f"Всего вызовов: {total['calls']}\n"
+    text += f"Запросов в базу: {total['executed']}\n"
+    text += f"Объединено: {total['coalesced']}\n"
+    text += f"Ошибок: {total['errors']}\n"
+
+    for name, key_stats in stats['by_key'].items():
+        text += f"\n• {name}: {key_stats['calls']} вызовов, {key_stats['coalesced']} объединено"
+
+    replica = DatabaseManager.get_replica_status()
+    text += f"\n\n🗄 Локальная копия меню: {'готова' if replica['ready'] else 'не готова'}\n"
+    for table, table_status in replica['tables'].items():
+        lag = table_status['lag_seconds']
+        lag_text = f"{lag:.0f} с назад" if lag is not None else "не синхронизирована"
+        text += f"• {table}: {table_status['rows']} строк, {lag_text}\n"
+
+    processor = context.application.update_processor
+    if isinstance(processor, ChatOrderedUpdateProcessor):
+        processor_stats = processor.get_stats()
+        text += "\n⚙️ Обработка событий:\n"
+        text += f"Обрабатывается: {processor_stats['in_flight']} из {processor_stats['limit']}\n"
+        text += f"В очереди: {processor_stats['waiting']} (максимум {processor_stats['max_waiting']})\n"
+        text += f"Чатов с очередью: {processor_stats['chats_queued']}\n"
+        text += (f"Ожидание: в среднем {processor_stats['wait_avg_ms']} мс, "
+                 f"95% — {processor_stats['wait_p95_ms']} мс, максимум {processor_stats['wait_max_ms']} мс\n")
+        text += f"Обработано: {processor_stats['processed']}\n"
+
+    text += "\n🖼 Кэш экранов меню:\n"
+    for catalog in all_catalogs():
+        screen_stats = catalog.screens.get_stats()
+        text += (f"• {catalog.venue_id}: попаданий {screen_stats['hits']}, промахов {screen_stats['misses']}, "
+                 f"экранов {screen_stats['size']} (версия каталога {screen_stats['version']}), "
+                 f"сбросов {screen_stats['resets']}, вытеснено {screen_stats['evictions']}\n")
+
+    snapshot_generation = menu_snapshot.generation()
+    snapshot_stats = menu_snapshot.get_stats()
+    text += (f"\n🗂 Снимок меню: {snapshot_generation or 'нет'}, "
+             f"перечитан {snapshot_stats['reloads']} раз, чтений {snapshot_stats['reads']}\n")
+    text += f"Журнал изменений меню: версия {menu_change_log.version()}\n"
+
+    state_stats = conversation_state.get_stats()
+    text += "\n💬 Состояния диалогов:\n"
+    text += (f"Пользователей: {state_stats['users']} из {state_stats['max_users']}, "
+             f"состояний: {state_stats['entries']}, ~{state_stats['approx_bytes'] / 1024:.0f} КБ\n")
+    text += (f"Истекло: {state_stats['expired']}, вытеснено пользователей: {state_stats['evicted_users']}\n")
+    if state_stats['flows']:
+        text += ", ".join(f"{flow} — {count}" for flow, count in sorted(state_stats['flows'].items())) + "\n"
+
+    text += "\n📍 Чатов по заведениям: "
+    text += ", ".join(f"{venue_id} — {count}" for venue_id, count in chat_venues.get_stats().items()) or "нет"
+    text += "\n"
+
+    throttle_stats = throttle.get_stats()
+    text += "\n🛡 Защита от флуда:\n"
+    text += f"Пропущено событий: {throttle_stats['allowed']}\n"
+    text += f"Отброшено (лимит пользователя): {throttle_stats['dropped_user']}\n"
+    text += f"Отброшено (лимит чата): {throttle_stats['dropped_chat']}\n"
+    text += f"Двойных нажатий: {throttle_stats['merged_callbacks']}\n"
+    text += f"Отзывов в период ожидания: {throttle_stats['feedback_cooldown']}\n"
+
+    queue_stats = feedback_queue.get_stats()
+    text += "\n📥 Очередь отзывов:\n"
+    text += f"Ожидают записи: {queue_stats['pending']}\n"
+    text += f"Записано: {queue_stats['flushed']}\n"
+    text += f"Неудачных попыток: {queue_stats['failed_flushes']}"
+
+    await update.message.reply_text(text)
+
+
+# --- СТАТИСТИКА ОТЗЫВОВ ---
+STATS_PERIODS = {
+    'today': (1, "сегодня"),
+    'week': (7, "за 7 дней"),
+    'month': (30, "за 30 дней"),
+    'all': (None, "за все время"),
+}
+
+MESSAGE_TYPE_NAMES = {
+    'feedback': "Отзывы",
+    'complaint': "Жалобы",
+    'suggestion': "Предложения",
+}
+
+WEEKDAY_NAMES = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+
+
+def format_bar(value, maximum, width=10):
+    """Полоска из блоков для текстового графика"""
+    if not maximum:
+        return ""
+    return "█" * max(1 if value else 0, round(value / maximum * width))
+
+
+def format_feedback_stats(summary, period_name):
+    text = f"📈 <b>Статистика отзывов {period_name}</b>\n\n"
+    if not summary['total']:
+        return text + "Отзывов нет."
+
+    text += f"Всего: <b>{summary['total']}</b>\n"
+    for message_type, count in summary['by_type']:
+        text += f"• {MESSAGE_TYPE_NAMES.get(message_type, message_type)}: {count}\n"
+
+    text += "\n🪑 <b>По столам</b> (топ-10):\n"
+    top_tables = summary['by_table'][:10]
+    for table_number, count in top_tables:
+        name = f"Стол {table_number}" if table_number else "Без стола"
+        text += f"<code>{name:<11}{format_bar(count, top_tables[0][1]):<10} {count}</code>\n"
+
+    text += "\n📅 <b>По дням недели</b>:\n"
+    weekdays = summary['by_weekday']
+    for name, count in zip(WEEKDAY_NAMES, weekdays):
+        text += f"<code>{name} {format_bar(count, max(weekdays)):<10} {count}</code>\n"
+
+    text += "\n🕐 <b>По часам</b>:\n"
+    hours = summary['by_hour']
+    for hour, count in enumerate(hours):
+        if count:
+            text += f"<code>{hour:02d}:00 {format_bar(count, max(hours)):<10} {count}</code>\n"
+
+    if summary['first_day']:
+        text += f"\nДанные с {summary['first_day']}"
+    return text
+
+
+async def feedback_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/stats [today|week|month|all|<дней>] — статистика отзывов из сводки"""
+    user_id = update.message.from_user.id
+    venue = await load_venue(update)
+
+    if not DatabaseManager.is_admin(user_id, venue.id):
+        await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
+        return
+
+    period = context.args[0].lower() if context.args else 'week'
+
+    if period == 'rebuild':
+        await update.message.reply_text("🔄 Пересчитываю статистику по всем отзывам...")
+        success = await asyncio.to_thread(DatabaseManager.rebuild_feedback_rollups, feedback_queue.pending_rows)
+        await update.message.reply_text("✅ Статистика пересчитана." if success else "❌ Ошибка при пересчете статистики.")
+        return
+
+    if period in STATS_PERIODS:
+        days, period_name = STATS_PERIODS[period]
+    elif period.isdigit() and int(period) > 0:
+        days, period_name = int(period), f"за {int(period)} дн."
+    else:
+        await update.message.reply_text(
+            "ℹ️ Использование: /stats [today|week|month|all|<число дней>]\n"
+            "/stats rebuild — пересчитать статистику по всем отзывам"
+        )
+        return
+
+    summary = feedback_rollups.summary(days, venue.id, venue.tz)
+    await update.message.reply_text(format_feedback_stats(summary, f"{period_name} — {venue.name}"), parse_mode='HTML')
+
+
+# --- ВЫГРУЗКА ОТЗЫВОВ ---
+EXPORT_STATUSES = ('new', 'read', 'replied')
+
+
+def parse_export_date(value):
+    """'2024-05-01' или '01.05.2024' -> date, иначе None"""
+    for date_format in ("%Y-%m-%d", "%d.%m.%Y"):
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            pass
+    return None
+
+
+async def export_feedback_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/export_feedback [с] [по] [статус] [csv|xlsx] — все отзывы файлом"""
+    user_id = update.message.from_user.id
+    venue = await load_venue(update)
+
+    if not DatabaseManager.is_admin(user_id, venue.id):
+        await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
+        return
+
+    dates = []
+    status = None
+    file_format = 'csv'
+    for arg in context.args or []:
+        arg = arg.lower()
+        if arg in EXPORT_STATUSES:
+            status = arg
+        elif arg in ('csv', 'xlsx'):
+            file_format = arg
+        elif arg != 'all' and len(dates) < 2 and parse_export_date(arg):
+            dates.append(parse_export_date(arg))
+        elif arg != 'all':
+            await update.message.reply_text(
+                "ℹ️ Использование: /export_feedback [с] [по] [статус] [csv|xlsx]\n\n"
+                "Даты — 2024-05-01 или 01.05.2024 (включительно), "
+                "статус — new, read или replied.\n"
+                "Пример: /export_feedback 01.05.2024 31.05.2024 new xlsx"
+            )
+            return
+
+    conditions = {'status': status, 'venue_id': venue.id}
+    if dates:
+        # Границы периода — полночь по времени заведения; "по" включительно
+        start = venue.tz.localize(datetime.combine(dates[0], datetime.min.time()))
+        conditions['created_from'] = start.astimezone(timezone.utc)
+    if len(dates) > 1:
+        end = venue.tz.localize(datetime.combine(dates[1] + timedelta(days=1), datetime.min.time()))
+        conditions['created_to'] = end.astimezone(timezone.utc)
+
+    await update.message.reply_text("⏳ Готовлю файл с отзывами...")
+
+    try:
+        # Чтение из базы и сжатие — в отдельном потоке, чтобы не задерживать другие чаты
+        document, extension, count = await asyncio.to_thread(export_feedback, file_format, venue.tz, **conditions)
+    except Exception as e:
+        logger.error(f"❌ Ошибка при выгрузке отзывов: {e}")
+        await update.message.reply_text("❌ Не удалось выгрузить отзывы.")
+        return
+
+    with document:
+        if not count:
+            await update.message.reply_text("📭 За выбранный период отзывов нет.")
+            return
+
+        period = "_".join(date.isoformat() for date in dates) or "all"
+        # telegram читает файл в память целиком и берет имя из document.name, а у
+        # SpooledTemporaryFile оно None — передаем содержимое, имя задаем сами
+        await update.message.reply_document(
+            document=document.read(),
+            filename=f"feedback_{venue.id}_{period}{'_' + status if status else ''}.{extension}",
+            caption=f"📄 Отзывов: {count}"
+        )
+
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/profile [секунды] — профиль работающего бота и рост памяти за это время"""
+    user_id = update.message.from_user.id
+    venue = await load_venue(update)
+
+    if not DatabaseManager.is_admin(user_id, venue.id):
+        await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
+        return
+
+    try:
+        seconds = int(context.args[0]) if context.args else DEFAULT_PROFILE_SECONDS
+    except ValueError:
+        await update.message.reply_text(f"ℹ️ Использование: /profile [секунды], не больше {MAX_PROFILE_SECONDS}")
+        return
+    seconds = max(1, min(seconds, MAX_PROFILE_SECONDS))
+
+    await update.message.reply_text(f"⏳ Снимаю профиль {seconds} с...")
+
+    try:
+        # Сэмплирование идет в отдельном потоке: цикл событий продолжает обрабатывать чаты
+        result = await asyncio.to_thread(profile, seconds)
+    except ProfileBusy:
+        await update.message.reply_text("⏳ Профиль уже снимается, дождитесь результата.")
+        return
+    except Exception as e:
+        logger.error(f"❌ Ошибка при профилировании: {e}")
+        await update.message.reply_text("❌ Не удалось снять профиль.")
+        return
+
+    report, collapsed = result.files()
+    stamp = datetime.now(venue.tz).strftime("%Y%m%d_%H%M%S")
+    await update.message.reply_document(
+        document=report,
+        filename=f"profile_{stamp}.txt",
+        caption=f"📈 Профиль за {result.seconds:.0f} с: {result.samples} сэмплов"
+    )
+    await update.message.reply_document(
+        document=collapsed,
+        filename=f"profile_{stamp}.collapsed",
+        caption="🔥 Стеки для flamegraph.pl или speedscope.app"
+    )
+
+
 # Обработка текстовых сообщений
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
     text = update.message.text
+    venue = await load_venue(update)
 
     # Обработка обновления листа
-    if context.user_data.get('waiting_for_sheet_update'):
-        sheet_type = context.user_data['waiting_for_sheet_update']
-        success = DatabaseManager.update_sheet(sheet_type, text, user_id)
-
-        del context.user_data['waiting_for_sheet_update']
+    sheet_type = conversation_state.pop(user_id, 'waiting_for_sheet_update')
+    if sheet_type:
+        success = await asyncio.to_thread(DatabaseManager.update_sheet, sheet_type, text, user_id, venue.id)
 
         if success:
             sheet_name = "Go" if sheet_type == 'go' else "Start"
@@ -673,51 +1473,83 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("❌ Ошибка при обновлении листа.")
         return
 
+    # Стоп-лист списком: все найденные блюда — одной записью в базу
+    if conversation_state.pop(user_id, 'waiting_for_stop_list'):
+        if not DatabaseManager.is_admin(user_id, venue.id):
+            return
+        catalog = await load_catalog(venue.id)
+        dishes, missing, ambiguous = parse_stop_list(catalog, text)
+        count = (await asyncio.to_thread(set_dishes_availability, venue, [dish.id for dish in dishes], False)
+                 if dishes else 0)
+
+        lines = [stop_list_notice(count, False)]
+        if dishes and count is not None:
+            lines += [f"• {dish.name}" for dish in dishes]
+        if missing:
+            lines.append("\n❓ Не найдены: " + ", ".join(missing))
+        if ambiguous:
+            lines.append("⚠️ Подходят несколько блюд, уточните: " + ", ".join(ambiguous))
+        screen = cached_menu_screen(catalog, ('stop_list',), lambda: build_stop_list_screen(catalog))
+        await update.message.reply_text("\n".join(lines), reply_markup=screen.reply_markup)
+        return
+
     # Обработка обратной связи
-    if context.user_data.get('waiting_for_feedback'):
-        table_number = context.user_data.get('selected_table', 'Не указан')
+    if conversation_state.get(user_id, 'waiting_for_feedback'):
+        table_number = conversation_state.get(user_id, 'selected_table', 'Не указан')
         username = update.message.from_user.username or ""
         full_name = f"{update.message.from_user.first_name or ''} {update.message.from_user.last_name or ''}".strip()
 
-        success = DatabaseManager.add_feedback(user_id, username, full_name, text, table_number)
+        # Не чаще одного отзыва в FEEDBACK_COOLDOWN секунд
+        wait = throttle.feedback_wait(user_id)
+        if wait:
+            await update.message.reply_text(f"⏳ Вы только что оставили отзыв. Следующий можно отправить через {wait} с.")
+            return
+
+        # Отзыв сохраняется в локальную очередь, в базу он уйдет в фоне
+        client_id = feedback_queue.submit(user_id, username, full_name, text, table_number, venue_id=venue.id)
 
         # Очищаем данные пользователя
-        if 'selected_table' in context.user_data:
-            del context.user_data['selected_table']
-        del context.user_data['waiting_for_feedback']
+        conversation_state.pop(user_id, 'selected_table')
+        conversation_state.pop(user_id, 'waiting_for_feedback')
 
-        if success:
-            # Уведомляем администраторов о новом отзыве
-            admins = DatabaseManager.get_all_admins()
+        if client_id:
+            throttle.record_feedback(user_id)
+            await update.message.reply_text("✅ Спасибо за ваш отзыв! Мы его рассмотрим в ближайшее время.")
+            await start(update, context)
+
+            # Уведомляем администраторов заведения о новом отзыве
+            admins = DatabaseManager.get_all_admins(venue.id)
             for admin in admins:
                 try:
                     await context.bot.send_message(
                         chat_id=admin['user_id'],
-                        text=f"🆕 Новый отзыв от @{username or 'без username'}\n🪑 Стол: {table_number:02d}\n\n{text[:500]}..."
+                        text=f"🆕 Новый отзыв ({venue.name}) от @{username or 'без username'}\n🪑 Стол: {table_number:02d}\n\n{text[:500]}..."
                     )
                 except Exception as e:
                     logger.error(f"Ошибка при уведомлении админа: {e}")
-
-            await update.message.reply_text("✅ Спасибо за ваш отзыв! Мы его рассмотрим в ближайшее время.")
-            await start(update, context)
         else:
             await update.message.reply_text("❌ Произошла ошибка при отправке отзыва. Попробуйте позже.")
         return
 
+    # Свободный текст — поиск блюда по меню
+    await show_search_results(update, text)
+
 
 # Обработка фото
 async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
+    venue = await load_venue(update)
     photo = update.message.photo[-1]
     file_id = photo.file_id
 
     logger.info(f"🖼 Получено фото от пользователя {user_id}")
 
-    if context.user_data.get('waiting_for_schedule'):
+    if conversation_state.get(user_id, 'waiting_for_schedule'):
         logger.info("🔄 Обновление графика...")
-        if DatabaseManager.is_admin(user_id):
-            success = DatabaseManager.update_file('schedule', file_id, user_id, 'График')
-            del context.user_data['waiting_for_schedule']
+        if DatabaseManager.is_admin(user_id, venue.id):
+            success = await asyncio.to_thread(DatabaseManager.update_file, 'schedule', file_id, user_id, 'График',
+                                              venue.id)
+            conversation_state.pop(user_id, 'waiting_for_schedule')
             if success:
                 logger.info("✅ График успешно обновлен в базе данных")
                 await update.message.reply_text("✅ График обновлен!")
@@ -731,8 +1563,9 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         # Обновление схемы посадки (только для админов)
         logger.info("🔄 Обновление схемы посадки...")
-        if DatabaseManager.is_admin(user_id):
-            success = DatabaseManager.update_file('seating', file_id, user_id, 'Схема посадки')
+        if DatabaseManager.is_admin(user_id, venue.id):
+            success = await asyncio.to_thread(DatabaseManager.update_file, 'seating', file_id, user_id,
+                                              'Схема посадки', venue.id)
             if success:
                 logger.info("✅ Схема посадки успешно обновлена в базе данных")
                 await update.message.reply_text("✅ Схема посадки обновлена!")
@@ -744,20 +1577,158 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("ℹ️ Фото получено. Для обновления графиков обратитесь к администратору.")
 
 
+def warm_up_caches():
+    """Загрузить меню и справочные данные всех заведений в память до приема событий"""
+    for venue in DatabaseManager.get_venues():
+        catalog = get_catalog(venue.id)
+        catalog.refresh(force=True)
+        DatabaseManager.get_all_admins(venue.id)
+        for sheet_type in ('go', 'start'):
+            DatabaseManager.get_sheet(sheet_type, venue.id)
+        for file_type in ('schedule', 'seating'):
+            DatabaseManager.get_file(file_type, venue.id)
+        # Самый частый экран — список категорий
+        cached_menu_screen(catalog, ('categories', False), lambda: build_categories_screen(catalog, False))
+
+
+def verify_warm_state():
+    """Сверить восстановленное после перезапуска состояние с базой (в фоне, бот уже отвечает)"""
+    try:
+        DatabaseManager.refresh_venues()
+        warm_up_caches()
+    except Exception as e:
+        logger.error(f"❌ Ошибка при сверке восстановленного состояния с базой: {e}")
+
+
+def begin_shutdown(application: Application):
+    """SIGTERM/SIGINT: перестать получать события и дождаться уже принятых, но не дольше SHUTDOWN_DRAIN_TIMEOUT.
+
+    python-telegram-bot при остановке ждет обработчики без ограничения, а Railway вскоре после
+    SIGTERM убивает процесс — тогда состояние для следующего запуска не успело бы записаться.
+    """
+    if 'drain' in application.bot_data:
+        return
+    if not application.running:
+        # Сигнал во время прогрева — останавливаемся сразу, как python-telegram-bot по умолчанию
+        raise SystemExit
+    logger.info("🛑 Остановка: новые события не принимаются, ждем обработки принятых")
+    application.bot_data['health'].mark_stopping()
+    processor = application.update_processor
+    if isinstance(processor, ChatOrderedUpdateProcessor):
+        application.bot_data['drain'] = asyncio.get_running_loop().create_task(
+            processor.drain(SHUTDOWN_DRAIN_TIMEOUT)
+        )
+    application.stop_running()
+
+
+async def on_startup(application: Application):
+    """Состояние прошлого запуска (или прогрев кэшей) и подписка на изменения — до приема событий"""
+    health_monitor = application.bot_data['health']
+    loop = asyncio.get_running_loop()
+    application.bot_data['loop_watcher'] = loop.create_task(health_monitor.watch_event_loop())
+    for stop_signal in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(stop_signal, begin_shutdown, application)
+        except NotImplementedError:
+            # Windows: остается остановка python-telegram-bot без ограничения времени
+            break
+
+    started_at = time.monotonic()
+    if await asyncio.to_thread(restore_warm_state):
+        # Отвечаем из восстановленного состояния сразу, а сверка с базой — в фоне
+        application.bot_data['verify_warm_state'] = asyncio.create_task(asyncio.to_thread(verify_warm_state))
+    else:
+        await asyncio.to_thread(warm_up_caches)
+    application.bot_data['change_feed'] = await start_change_feed()
+    # Снимок меню для веб-сервера: первый — сразу после прогрева, дальше — при изменениях каталога
+    start_snapshot_publisher()
+
+    health_monitor.mark_warm()
+    logger.info(f"🔥 Кэши прогреты за {time.monotonic() - started_at:.1f} с, бот принимает события")
+
+
+async def on_shutdown(application: Application):
+    """Запись всего, что нужно следующему запуску: состояние, снимок меню, очередь отзывов"""
+    drain = application.bot_data.get('drain')
+    if drain is not None:
+        cancelled = await drain
+        if cancelled:
+            logger.warning(f"⏱ Не дождались обработки {cancelled} событий за {SHUTDOWN_DRAIN_TIMEOUT:g} с")
+
+    change_feed = application.bot_data.get('change_feed')
+    if change_feed is not None:
+        await change_feed.stop()
+
+    loop_watcher = application.bot_data.get('loop_watcher')
+    if loop_watcher is not None:
+        loop_watcher.cancel()
+
+    # Сначала локальные записи — они успевают всегда, потом отправка очереди отзывов в базу
+    try:
+        saved = await asyncio.to_thread(save_warm_state)
+        logger.info(f"💾 Состояние сохранено для следующего запуска (состояний диалогов: {saved})")
+    except Exception as e:
+        logger.error(f"❌ Ошибка при сохранении состояния: {e}")
+    if MENU_SNAPSHOT == 'publish':
+        try:
+            await asyncio.to_thread(publish_snapshot)
+        except Exception as e:
+            logger.error(f"❌ Ошибка при записи снимка меню при остановке: {e}")
+    await asyncio.to_thread(feedback_queue.stop)
+
+
 def main():
     try:
-        application = Application.builder().token(BOT_TOKEN).build()
+        application = (Application.builder()
+                       .token(BOT_TOKEN)
+                       # Разные чаты — параллельно, события одного чата — по порядку
+                       .concurrent_updates(ChatOrderedUpdateProcessor(MAX_CONCURRENT_UPDATES))
+                       .post_init(on_startup)
+                       .post_shutdown(on_shutdown)
+                       .build())
+
+        # /healthz и /readyz: отвечают уже во время прогрева, готовность — после него
+        health_monitor = application.bot_data['health'] = HealthMonitor("bot")
+        # Пока готова локальная копия, бот отвечает и без Supabase: недоступность базы видна в /readyz,
+        # но не проваливает готовность (иначе выкладка во время сбоя Supabase отклоняется проверкой Railway)
+        health_monitor.add_check("supabase", DatabaseManager.ping,
+                                 required=lambda: not DatabaseManager.is_replica_ready())
+        if HEALTH_PORT:
+            start_health_server(health_monitor, HEALTH_PORT)
+
+        # Защита от флуда — до всех обработчиков, отметка о завершении — после
+        application.add_handler(TypeHandler(Update, throttle_update), group=-1)
+        application.add_handler(TypeHandler(Update, release_update), group=1)
 
         # Команды и обработчики
         application.add_handler(CommandHandler("start", start))
+        application.add_handler(CommandHandler("venue", show_venues))
         application.add_handler(CommandHandler("add_admin", add_admin))
         application.add_handler(CommandHandler("list_admins", list_admins))
         application.add_handler(CommandHandler("remove_admin", remove_admin))
+        application.add_handler(CommandHandler("dbstats", db_stats))
+        application.add_handler(CommandHandler("stats", feedback_stats))
+        application.add_handler(CommandHandler("export_feedback", export_feedback_command))
+        application.add_handler(CommandHandler("profile", profile_command))
+        application.add_handler(CommandHandler("stoplist", stop_list_command))
         application.add_handler(CallbackQueryHandler(button))
+        application.add_handler(InlineQueryHandler(inline_search))
         application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
         application.add_handler(MessageHandler(filters.PHOTO, handle_photo))
         application.add_handler(CommandHandler("menu", serve_mini_app))
 
+        # Локальная копия меню: чтение из нее доступно сразу, даже без связи с Supabase
+        start_replica_sync()
+
+        # Сводная статистика отзывов для /stats (при первом запуске собирается из истории)
+        start_feedback_rollups(feedback_queue.pending_rows)
+
+        # Фоновая запись отзывов из локальной очереди в базу
+        feedback_queue.start()
+
+        # Очистка истекших состояний диалогов (ожидание отзыва, листа, графика и т.п.)
+        conversation_state.start()
+
         # Запуск бота
         logger.info("🤖 Бот запускается на Railway...")
         print("🚀 Restaurant Bot запущен на Railway!")
@@ -766,9 +1737,16 @@ def main():
         print("   /add_admin <user_id> - Добавить администратора")
         print("   /list_admins - Показать список администраторов")
         print("   /remove_admin <user_id> - Удалить администратора")
+        print("   /dbstats - Статистика запросов к базе")
+        print("   /stats [today|week|month|all|<дней>] - Статистика отзывов")
+        print("   /export_feedback [с] [по] [статус] [csv|xlsx] - Выгрузка отзывов файлом")
+        print("   /profile [секунды] - Профиль работающего бота (горячие функции, память)")
+        print("   /stoplist - Стоп-лист: поставить блюда на стоп или вернуть в меню")
+        print("🔎 Поиск блюд: напишите название боту или @бот запрос в любом чате")
         print("💬 Система обратной связи с выбором стола активирована")
-        print("🪑 Доступны столы: 01-37 (красивая сетка 5x8)")
-        print("⏰ Время отображается в Саратовском часовом поясе")
+        print("📍 Заведения: " + ", ".join(f"{v.name} ({v.id})" for v in DatabaseManager.get_venues()))
+        print("📍 Выбор заведения: /venue или ссылка t.me/<бот>?start=venue_<id>")
+        print("🪑 Столы и часовой пояс — свои у каждого заведения")
         print("🌶️ Красивое отображение остроты и аллергенов")
         print("⏱️ Время приготовления: 15 минут")
         print("🔙 Добавлены кнопки 'Назад' во всех меню")
@@ -0,0 +1,73 @@
+import threading
+from collections import OrderedDict
+
+# Сколько готовых экранов держать в памяти
+SCREEN_CACHE_SIZE = 512
+
+
+class Screen:
+    """Готовый экран: аргументы для render_screen"""
+
+    __slots__ = ('text', 'reply_markup', 'parse_mode', 'photo')
+
+    def __init__(self, text, reply_markup=None, parse_mode=None, photo=None):
+        self.text = text
+        self.reply_markup = reply_markup
+        self.parse_mode = parse_mode
+        self.photo = photo
+
+
+class ScreenCache:
+    """Кэш готовых экранов меню (текст, кнопки, режим разметки, фото).
+
+    Экраны меню зависят только от каталога, поэтому кэш привязан к версии
+    каталога: как только она меняется, все экраны считаются устаревшими.
+    При переполнении вытесняются давно не показанные экраны.
+    """
+
+    def __init__(self, max_size=SCREEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._screens = OrderedDict()
+        self._version = None
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'resets': 0}
+
+    def get(self, key, version, build):
+        """Экран по ключу для версии каталога; build() вызывается только при промахе"""
+        with self._lock:
+            if version != self._version:
+                if self._screens:
+                    self._stats['resets'] += 1
+                self._screens.clear()
+                self._version = version
+            screen = self._screens.get(key)
+            if screen is not None:
+                self._screens.move_to_end(key)
+                self._stats['hits'] += 1
+                return screen
+            self._stats['misses'] += 1
+
+        screen = build()
+
+        with self._lock:
+            # Каталог мог обновиться, пока экран строился — такой экран не сохраняем
+            if version == self._version:
+                self._screens[key] = screen
+                self._screens.move_to_end(key)
+                while len(self._screens) > self.max_size:
+                    self._screens.popitem(last=False)
+                    self._stats['evictions'] += 1
+        return screen
+
+    def invalidate(self):
+        with self._lock:
+            self._screens.clear()
+            self._version = None
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._screens)
+            stats['version'] = self._version
+        return stats
+
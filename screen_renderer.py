@@ -0,0 +1,90 @@
+import logging
+
+from telegram import InputMediaPhoto
+from telegram.error import BadRequest
+
+logger = logging.getLogger(__name__)
+
+# Максимальная длина подписи к фото в Telegram
+CAPTION_LIMIT = 1024
+
+
+def _is_not_modified(error):
+    return 'message is not modified' in str(error).lower()
+
+
+async def _replace_message(message, send):
+    """Отправить новое сообщение вместо старого, когда тип сообщения нельзя поменять"""
+    new_message = await send()
+    try:
+        await message.delete()
+    except Exception as e:
+        # Сообщения старше 48 часов удалить нельзя — просто оставляем их
+        logger.info(f"Не удалось удалить старое сообщение: {e}")
+    return new_message
+
+
+async def _show_photo(query, text, reply_markup, parse_mode, photo):
+    message = query.message
+
+    if message.photo:
+        if message.photo[-1].file_id == photo:
+            # То же фото — меняем только подпись и кнопки
+            await query.edit_message_caption(caption=text, parse_mode=parse_mode, reply_markup=reply_markup)
+        else:
+            await query.edit_message_media(
+                media=InputMediaPhoto(media=photo, caption=text, parse_mode=parse_mode),
+                reply_markup=reply_markup
+            )
+        return
+
+    # Текстовое сообщение нельзя превратить в фото
+    await _replace_message(message, lambda: message.reply_photo(
+        photo=photo,
+        caption=text,
+        parse_mode=parse_mode,
+        reply_markup=reply_markup
+    ))
+
+
+async def _show_text(query, text, reply_markup, parse_mode):
+    message = query.message
+
+    if message.photo:
+        # Из сообщения с фото нельзя убрать фото
+        await _replace_message(message, lambda: message.reply_text(
+            text=text,
+            parse_mode=parse_mode,
+            reply_markup=reply_markup
+        ))
+        return
+
+    await query.edit_message_text(text=text, parse_mode=parse_mode, reply_markup=reply_markup)
+
+
+async def render_screen(query, text, reply_markup=None, parse_mode=None, photo=None):
+    """Показать экран в сообщении, на кнопку которого нажали.
+
+    Сообщение редактируется на месте и переключается между текстом и фото
+    через edit_message_media/edit_message_caption, поэтому при просмотре
+    блюд с фото чат не засоряется новыми сообщениями. Если тип сообщения
+    поменять нельзя, старое сообщение заменяется новым. Если фото не
+    удалось показать, экран показывается текстом.
+    """
+    if photo and len(text) > CAPTION_LIMIT:
+        photo = None
+
+    if photo:
+        try:
+            await _show_photo(query, text, reply_markup, parse_mode, photo)
+            return
+        except BadRequest as e:
+            if _is_not_modified(e):
+                return
+            logger.error(f"Ошибка при показе фото: {e}")
+
+    try:
+        await _show_text(query, text, reply_markup, parse_mode)
+    except BadRequest as e:
+        if not _is_not_modified(e):
+            raise
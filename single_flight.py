@@ -0,0 +1,75 @@
+import threading
+
+
+class _InFlightCall:
+    """Запрос, который сейчас выполняется, и его результат"""
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Объединяет одновременные одинаковые запросы в один.
+
+    Первый вызов с ключом выполняет функцию, все остальные вызовы с тем же
+    ключом, пришедшие до его завершения, ждут и получают тот же результат
+    (или то же исключение). Результат общий — вызывающие не должны его изменять.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {}
+
+    def do(self, key, fn):
+        """Выполнить fn() или дождаться уже идущего запроса с тем же ключом"""
+        name = key[0] if isinstance(key, tuple) else key
+
+        with self._lock:
+            stats = self._stats.setdefault(name, {'calls': 0, 'executed': 0, 'coalesced': 0, 'errors': 0})
+            stats['calls'] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _InFlightCall()
+                self._calls[key] = call
+            else:
+                stats['coalesced'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+        finally:
+            with self._lock:
+                del self._calls[key]
+                stats['executed'] += 1
+                if call.error is not None:
+                    stats['errors'] += 1
+            call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def get_stats(self):
+        """Статистика по каждому типу запроса и общий итог"""
+        with self._lock:
+            by_key = {name: dict(stats) for name, stats in self._stats.items()}
+
+        total = {'calls': 0, 'executed': 0, 'coalesced': 0, 'errors': 0}
+        for stats in by_key.values():
+            for field in total:
+                total[field] += stats[field]
+
+        return {'total': total, 'by_key': by_key}
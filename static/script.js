@@ -1,10 +1,43 @@
+// Битовые маски для фильтра меню. Порядок должен совпадать с menu_filters.py
+const ALLERGEN_BITS = ['Яйца', 'Кунжут', 'Лактоза', 'Орехи', 'Рыба', 'Морепродукты', 'Глютен', 'Соя']
+    .reduce((bits, name, i) => ({ ...bits, [name]: 1 << i }), {});
+const UNKNOWN_ALLERGEN_BIT = 1 << 8;
+const SPICINESS_LEVELS = [
+    'Не острое', 'Острота регулируется', 'Менее острое', 'Средней остроты', 'Острое', 'Очень острое'
+];
+const ALL_SPICINESS = (1 << SPICINESS_LEVELS.length) - 1;
+const KID_FRIENDLY_BIT = 1;
+
+// Карточек за один кадр: длинная категория появляется сразу, остальное дорисовывается следом
+const RENDER_BATCH = 12;
+// Размер картинки в карточке (как в mini_app_shell.py): место резервируется до загрузки
+const DISH_IMAGE_WIDTH = 280;
+const DISH_IMAGE_HEIGHT = 160;
+// Как часто спрашивать изменения меню, пока Mini App открыт и виден (мс)
+const CHANGES_POLL_INTERVAL = 5000;
+
 class RestaurantMenuApp {
     constructor() {
         this.categories = [];
         this.dishes = [];
         this.currentCategoryId = null;
+        // Все блюда заведения из /api/menu; null — меню грузится из Supabase по категориям
+        this.menuDishes = null;
+        // Версия журнала изменений, которой соответствует меню; null — изменения не спрашиваем
+        this.menuVersion = null;
+        this.pollTimer = null;
         this.tg = window.Telegram.WebApp;
 
+        // Фильтр из параметров ссылки: ?exclude=Орехи,Лактоза&max_spice=2&kid_friendly=1
+        const params = new URLSearchParams(window.location.search);
+        this.filter = this.parseFilter(params);
+        this.venueId = params.get('venue');
+        // Признаки блюд разбираются один раз и хранятся по id
+        this.dishFlags = new Map();
+        // Номер текущей отрисовки: партии от прежней категории не дорисовываются
+        this.renderToken = 0;
+        this.rendering = false;
+
         this.init();
     }
 
@@ -16,6 +49,7 @@ class RestaurantMenuApp {
         // Загрузка данных
         await this.loadCategories();
         this.setupEventListeners();
+        this.startChangesPolling();
     }
 
     async fetchFromSupabase(endpoint) {
@@ -36,11 +70,54 @@ class RestaurantMenuApp {
         }
     }
 
+    parseVersion(value) {
+        return value !== null && value !== undefined && /^\d+$/.test(value) ? Number(value) : null;
+    }
+
+    async fetchMenuSnapshot(useEmbedded = true) {
+        // Меню, встроенное сервером в страницу (mini_app_shell.py): без запросов
+        const embedded = document.getElementById('menuData');
+        if (embedded && useEmbedded) {
+            try {
+                const menu = JSON.parse(embedded.textContent);
+                this.menuVersion = this.parseVersion(embedded.dataset.version);
+                return menu;
+            } catch (error) {
+                console.warn('Встроенное меню не разобрано:', error);
+            }
+        }
+
+        // Иначе меню целиком одним запросом из снимка, который пишет бот; браузер сверяет ETag
+        try {
+            const response = await fetch(`/api/menu${this.venueQuery()}`);
+            if (!response.ok) return null;
+            const menu = await response.json();
+            this.menuVersion = this.parseVersion(response.headers.get('X-Menu-Version'));
+            return menu;
+        } catch (error) {
+            console.warn('Снимок меню недоступен, загрузка из Supabase:', error);
+            return null;
+        }
+    }
+
+    venueQuery(params = {}) {
+        if (this.venueId) {
+            params = { venue: this.venueId, ...params };
+        }
+        const query = new URLSearchParams(params).toString();
+        return query ? `?${query}` : '';
+    }
+
     async loadCategories() {
         const loadingElement = document.getElementById('loading');
         loadingElement.textContent = 'Загрузка категорий...';
 
-        this.categories = await this.fetchFromSupabase(API_ENDPOINTS.categories);
+        const menu = await this.fetchMenuSnapshot();
+        if (menu) {
+            this.setMenu(menu);
+        } else {
+            this.categories = await this.fetchFromSupabase(API_ENDPOINTS.categories);
+        }
 
         if (this.categories.length > 0) {
             this.renderCategories();
@@ -50,18 +127,163 @@ class RestaurantMenuApp {
         }
     }
 
+    setMenu(menu) {
+        this.categories = menu.categories;
+        this.menuDishes = menu.dishes.filter(dish => dish.is_available);
+        this.sortMenu();
+    }
+
+    sortMenu() {
+        const bySortOrder = (a, b) => (a.sort_order ?? Infinity) - (b.sort_order ?? Infinity);
+        this.categories.sort(bySortOrder);
+        this.menuDishes.sort(bySortOrder);
+    }
+
+    startChangesPolling() {
+        // Меню из Supabase по категориям не версионируется — обновится при следующем открытии
+        if (this.menuVersion === null) return;
+
+        const schedule = () => {
+            clearTimeout(this.pollTimer);
+            this.pollTimer = setTimeout(async () => {
+                if (!document.hidden) {
+                    await this.pollChanges();
+                }
+                schedule();
+            }, CHANGES_POLL_INTERVAL);
+        };
+
+        // Вернулись в Mini App — сразу проверить, что изменилось, пока он был скрыт
+        document.addEventListener('visibilitychange', async () => {
+            if (!document.hidden) {
+                await this.pollChanges();
+                schedule();
+            }
+        });
+        schedule();
+    }
+
+    async pollChanges() {
+        let changes;
+        try {
+            const response = await fetch(`/api/menu/changes${this.venueQuery({ since: this.menuVersion })}`);
+            if (!response.ok) return;
+            changes = await response.json();
+        } catch (error) {
+            console.warn('Изменения меню недоступны:', error);
+            return;
+        }
+
+        if (changes.reset) {
+            // Версия слишком старая для журнала — меню целиком
+            const menu = await this.fetchMenuSnapshot(false);
+            if (menu) {
+                this.setMenu(menu);
+                this.dishFlags.clear();
+                this.renderCategories();
+                const current = this.categories.find(category => category.id === this.currentCategoryId);
+                await this.loadDishes(current ? current.id : this.categories[0]?.id);
+            }
+            return;
+        }
+        this.applyChanges(changes);
+    }
+
+    applyChanges(changes) {
+        // Патч состояния в памяти и только тех карточек, которые изменились
+        this.menuVersion = changes.version;
+
+        const changedCategories = changes.categories || [];
+        const deletedCategories = new Set(changes.deleted_categories || []);
+        if (changedCategories.length || deletedCategories.size) {
+            const categoryIds = new Set(changedCategories.map(category => category.id));
+            this.categories = this.categories
+                .filter(category => !categoryIds.has(category.id) && !deletedCategories.has(category.id))
+                .concat(changedCategories);
+        }
+
+        const changedDishes = changes.dishes || [];
+        const changedIds = new Set(changedDishes.map(dish => dish.id).concat(changes.deleted_dishes || []));
+        if (changedIds.size) {
+            changedIds.forEach(id => this.dishFlags.delete(id));
+            this.menuDishes = this.menuDishes
+                .filter(dish => !changedIds.has(dish.id))
+                .concat(changedDishes.filter(dish => dish.is_available));
+        }
+        this.sortMenu();
+
+        if (changedCategories.length || deletedCategories.size) {
+            this.renderCategories();
+            if (!this.categories.some(category => category.id === this.currentCategoryId)) {
+                // Текущую категорию удалили — показываем первую
+                if (this.categories.length) {
+                    this.loadDishes(this.categories[0].id);
+                }
+                return;
+            }
+        }
+        if (changedIds.size) {
+            this.patchDishes(changedIds);
+        }
+    }
+
+    patchDishes(changedIds) {
+        const dishesGrid = document.getElementById('dishesGrid');
+        this.dishes = this.menuDishes.filter(dish => dish.category_id === this.currentCategoryId);
+
+        // Пока карточки дорисовываются партиями или в сетке сообщение вместо карточек — перерисовать
+        if (this.rendering || !dishesGrid.querySelector('.dish-card')) {
+            this.renderDishes();
+            return;
+        }
+
+        changedIds.forEach(id => {
+            const card = dishesGrid.querySelector(`.dish-card[data-dish-id="${id}"]`);
+            if (card) card.remove();
+        });
+
+        this.dishes.forEach((dish, index) => {
+            if (!changedIds.has(dish.id) || !this.matchesFilter(dish)) return;
+            // Вставляем перед ближайшим следующим блюдом, у которого уже есть карточка
+            const next = this.dishes.slice(index + 1)
+                .map(other => dishesGrid.querySelector(`.dish-card[data-dish-id="${other.id}"]`))
+                .find(Boolean);
+            dishesGrid.insertBefore(this.createDishCard(dish), next || null);
+        });
+
+        if (!dishesGrid.querySelector('.dish-card')) {
+            this.renderDishes();
+        }
+    }
+
     async loadDishes(categoryId) {
         this.currentCategoryId = categoryId;
 
         const loadingElement = document.getElementById('loading');
         const dishesGrid = document.getElementById('dishesGrid');
 
+        // Первые карточки уже нарисовал сервер: дорисовываем только остальные
+        const prerendered = dishesGrid.dataset.categoryId === String(categoryId) && this.menuDishes;
+        if (prerendered) {
+            this.dishes = this.menuDishes.filter(dish => dish.category_id === categoryId);
+            const rendered = Number(dishesGrid.dataset.rendered) || 0;
+            delete dishesGrid.dataset.categoryId;
+            delete dishesGrid.dataset.rendered;
+            this.appendDishes(this.dishes.slice(rendered), ++this.renderToken);
+            return;
+        }
+        delete dishesGrid.dataset.categoryId;
+
         loadingElement.style.display = 'block';
         dishesGrid.style.display = 'none';
         loadingElement.textContent = 'Загрузка блюд...';
 
-        const endpoint = API_ENDPOINTS.dishes.replace('{categoryId}', categoryId);
-        this.dishes = await this.fetchFromSupabase(endpoint);
+        if (this.menuDishes) {
+            this.dishes = this.menuDishes.filter(dish => dish.category_id === categoryId);
+        } else {
+            const endpoint = API_ENDPOINTS.dishes.replace('{categoryId}', categoryId);
+            this.dishes = await this.fetchFromSupabase(endpoint);
+        }
 
         this.renderDishes();
 
@@ -71,6 +293,8 @@ class RestaurantMenuApp {
 
     renderCategories() {
         const tabsContainer = document.getElementById('categoriesTabs');
+        // Вкладки, нарисованные сервером, заменяются такими же, но с обработчиками
+        tabsContainer.innerHTML = '';
 
         this.categories.forEach(category => {
             const tab = document.createElement('button');
@@ -78,7 +302,7 @@ class RestaurantMenuApp {
             tab.textContent = category.name;
             tab.dataset.categoryId = category.id;
 
-            if (category.id === this.currentCategoryId) {
+            if (category.id === (this.currentCategoryId ?? this.categories[0].id)) {
                 tab.classList.add('active');
             }
 
@@ -95,6 +319,8 @@ class RestaurantMenuApp {
     renderDishes() {
         const dishesGrid = document.getElementById('dishesGrid');
         dishesGrid.innerHTML = '';
+        const token = ++this.renderToken;
+        this.rendering = false;
 
         if (this.dishes.length === 0) {
             dishesGrid.innerHTML = `
@@ -105,21 +331,114 @@ class RestaurantMenuApp {
             return;
         }
 
-        this.dishes.forEach(dish => {
-            const dishCard = this.createDishCard(dish);
-            dishesGrid.appendChild(dishCard);
+        const visibleDishes = this.dishes.filter(dish => this.matchesFilter(dish));
+
+        if (visibleDishes.length === 0) {
+            dishesGrid.innerHTML = `
+                <div style="grid-column: 1/-1; text-align: center; padding: 40px; color: #888;">
+                    Нет блюд, подходящих под фильтр
+                </div>
+            `;
+            return;
+        }
+
+        this.appendDishes(visibleDishes, token);
+    }
+
+    appendDishes(dishes, token) {
+        // Партия карточек за кадр; следующая — в следующем кадре, если категорию не сменили
+        if (token !== this.renderToken || dishes.length === 0) {
+            if (token === this.renderToken) this.rendering = false;
+            return;
+        }
+
+        const fragment = document.createDocumentFragment();
+        dishes.slice(0, RENDER_BATCH).forEach(dish => {
+            if (this.matchesFilter(dish)) {
+                fragment.appendChild(this.createDishCard(dish));
+            }
+        });
+        document.getElementById('dishesGrid').appendChild(fragment);
+
+        const rest = dishes.slice(RENDER_BATCH);
+        this.rendering = rest.length > 0;
+        if (this.rendering) {
+            requestAnimationFrame(() => this.appendDishes(rest, token));
+        }
+    }
+
+    parseFilter(params) {
+        let exclude = 0;
+        (params.get('exclude') || '').split(',').forEach(allergen => {
+            allergen = allergen.trim();
+            if (allergen) {
+                exclude |= ALLERGEN_BITS[allergen] || 0;
+            }
+        });
+
+        let spiciness = ALL_SPICINESS;
+        const maxSpice = params.get('max_spice');
+        if (maxSpice !== null) {
+            const level = /^\d+$/.test(maxSpice) ? Number(maxSpice) : SPICINESS_LEVELS.indexOf(maxSpice);
+            if (level >= 0 && level < SPICINESS_LEVELS.length) {
+                spiciness = (1 << (level + 1)) - 1;
+            }
+        }
+
+        const kidFriendly = params.has('kid_friendly') && !['0', 'false', 'no'].includes(params.get('kid_friendly'));
+
+        return { exclude, spiciness, features: kidFriendly ? KID_FRIENDLY_BIT : 0 };
+    }
+
+    getDishFlags(dish) {
+        let flags = this.dishFlags.get(dish.id);
+        if (flags) {
+            return flags;
+        }
+
+        let allergens = 0;
+        (dish.allergens || '').split(',').forEach(allergen => {
+            allergen = allergen.trim();
+            if (allergen) {
+                allergens |= ALLERGEN_BITS[allergen] || UNKNOWN_ALLERGEN_BIT;
+            }
         });
+
+        const featuresText = dish.features || '';
+        if (featuresText.includes('Содержит лактозу')) {
+            allergens |= ALLERGEN_BITS['Лактоза'];
+        }
+
+        const spiceIndex = SPICINESS_LEVELS.indexOf(dish.spiciness || 'Не острое');
+
+        flags = {
+            allergens,
+            spiciness: 1 << (spiceIndex >= 0 ? spiceIndex : 0),
+            features: featuresText.includes('Подходит детям') ? KID_FRIENDLY_BIT : 0
+        };
+        this.dishFlags.set(dish.id, flags);
+        return flags;
+    }
+
+    matchesFilter(dish) {
+        const flags = this.getDishFlags(dish);
+        return !(flags.allergens & this.filter.exclude)
+            && (flags.spiciness & this.filter.spiciness) !== 0
+            && (flags.features & this.filter.features) === this.filter.features;
     }
 
     createDishCard(dish) {
         const card = document.createElement('div');
         card.className = 'dish-card';
+        card.dataset.dishId = dish.id;
 
         const features = this.getDishFeatures(dish);
 
         card.innerHTML = `
             ${dish.photo_file_id ?
-                `<img src="${dish.photo_file_id}" alt="${dish.name}" class="dish-image" onerror="this.style.display='none'">` :
+                `<img src="${dish.photo_file_id}" alt="${this.escapeHtml(dish.name)}" class="dish-image"
+                    width="${DISH_IMAGE_WIDTH}" height="${DISH_IMAGE_HEIGHT}" loading="lazy" decoding="async"
+                    onerror="this.style.display='none'">` :
                 '<div class="dish-image" style="display: flex; align-items: center; justify-content: center; color: #666;">📷</div>'
             }
             <div class="dish-name">${this.escapeHtml(dish.name)}</div>
@@ -129,7 +448,6 @@ class RestaurantMenuApp {
             <div class="korean-pattern"></div>
         `;
 
-        card.addEventListener('click', () => this.showDishDetails(dish));
         return card;
     }
 
@@ -199,6 +517,15 @@ class RestaurantMenuApp {
     }
 
     setupEventListeners() {
+        // Один обработчик на сетку: работает и для карточек, нарисованных сервером
+        document.getElementById('dishesGrid').addEventListener('click', (event) => {
+            const card = event.target.closest('.dish-card');
+            const dish = card && this.dishes.find(d => String(d.id) === card.dataset.dishId);
+            if (dish) {
+                this.showDishDetails(dish);
+            }
+        });
+
         // Закрытие модального окна
         document.querySelector('.close').addEventListener('click', () => {
             document.getElementById('dishModal').style.display = 'none';
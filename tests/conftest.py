@@ -0,0 +1,219 @@
+"""Общая обвязка тестов: бот с подставными Supabase и Telegram.
+
+Переменные окружения и подмена supabase.create_client — до импорта модулей
+бота: config.py создает клиента Supabase при импорте.
+"""
+import asyncio
+import itertools
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ADMIN_ID = 1000
+VENUE_ADMIN_ID = 555
+GUEST_ID = 100
+
+os.environ.update({
+    'SUPABASE_URL': 'http://localhost:54321',
+    'SUPABASE_KEY': 'test-key',
+    'BOT_TOKEN': '123456:TEST-TOKEN',
+    'ADMIN_ID': str(ADMIN_ID),
+    'DEFAULT_VENUE': 'main',
+    'DATA_DIR': tempfile.mkdtemp(prefix='sarang-tests-'),
+    'CHANGE_FEED': 'off',
+    'MENU_SNAPSHOT': 'off',
+})
+
+import supabase as supabase_lib  # noqa: E402
+
+from fakes import CallLog, FakeSupabase, RecordingReplica, RecordingRequest, BOT_USER  # noqa: E402
+
+LOG = CallLog()
+SUPABASE = FakeSupabase(LOG)
+supabase_lib.create_client = lambda url, key, *args, **kwargs: SUPABASE
+
+from telegram import Bot, Update  # noqa: E402
+from telegram.ext import Application, CallbackContext  # noqa: E402
+
+import database_manager  # noqa: E402
+import feedback_queue as feedback_queue_module  # noqa: E402
+import menu_catalog  # noqa: E402
+import restaurant_bot  # noqa: E402
+from conversation_state import ConversationState  # noqa: E402
+from database_manager import DatabaseManager  # noqa: E402
+from feedback_queue import FeedbackQueue  # noqa: E402
+from feedback_rollups import FeedbackRollups  # noqa: E402
+from menu_replica import MenuReplica  # noqa: E402
+from throttle import UpdateThrottle  # noqa: E402
+from venues import ChatVenues  # noqa: E402
+
+# Отзывов в базе: столько строк скачает запрос без ограничения
+FEEDBACK_COUNT = 30
+
+
+def seed_tables():
+    """Небольшое, но правдоподобное заведение: меню, листы, файлы, админы и отзывы"""
+    updated_at = '2024-05-01T10:00:00+00:00'
+    categories = [
+        {'id': 1, 'venue_id': 'main', 'name': 'Супы', 'sort_order': 1, 'updated_at': updated_at},
+        {'id': 2, 'venue_id': 'main', 'name': 'Роллы', 'sort_order': 2, 'updated_at': updated_at},
+        {'id': 3, 'venue_id': 'main', 'name': 'Напитки', 'sort_order': 3, 'updated_at': updated_at},
+    ]
+    dishes = []
+    for i in range(12):
+        dishes.append({
+            'id': 10 + i, 'venue_id': 'main', 'category_id': i % 3 + 1, 'sort_order': i,
+            'name': ['Рамен', 'Кимпаб', 'Лимонад'][i % 3] + f" {i}", 'is_available': i != 11,
+            'composition': "Лапша, бульон, яйцо", 'description': '', 'spiciness': 'Острое' if i % 2 else 'Не острое',
+            'allergens': 'Яйца, Соя' if i % 2 else '', 'features': '',
+            'photo_file_id': 'PHOTO_11' if i == 1 else None, 'cooking_time': 15, 'price': 390,
+            'updated_at': updated_at,
+        })
+    now = datetime.now(timezone.utc)
+    feedback = [
+        {'id': i + 1, 'venue_id': 'main', 'user_id': 200 + i, 'username': f"guest{i}", 'full_name': f"Гость {i}",
+         'message': f"Отзыв {i}", 'table_number': i % 7 + 1, 'message_type': 'feedback',
+         'status': 'new' if i % 3 else 'read', 'client_id': f"seed-{i}",
+         'created_at': (now - timedelta(hours=i)).isoformat(), 'updated_at': updated_at}
+        for i in range(FEEDBACK_COUNT)
+    ]
+    return {
+        'venues': [{'id': 'main', 'name': 'Саранг', 'timezone': 'Europe/Saratov', 'table_count': 37,
+                    'sort_order': 0, 'updated_at': updated_at}],
+        'categories': categories,
+        'dishes': dishes,
+        'sheets': [
+            {'venue_id': 'main', 'sheet_type': 'go', 'content': 'Go лист', 'updated_at': updated_at},
+            {'venue_id': 'main', 'sheet_type': 'start', 'content': 'Start лист', 'updated_at': updated_at},
+        ],
+        'files': [
+            {'venue_id': 'main', 'file_type': 'schedule', 'file_id': 'SCHEDULE', 'file_name': 'График',
+             'updated_at': updated_at},
+            {'venue_id': 'main', 'file_type': 'seating', 'file_id': 'SEATING', 'file_name': 'Посадка',
+             'updated_at': updated_at},
+        ],
+        'admins': [{'id': 1, 'venue_id': 'main', 'user_id': VENUE_ADMIN_ID, 'username': 'manager',
+                    'full_name': 'Менеджер', 'updated_at': updated_at}],
+        'feedback': feedback,
+    }
+
+
+class BotHarness:
+    """Настоящие telegram.Update и CallbackContext поверх бота, чьи вызовы API записываются"""
+
+    def __init__(self, log):
+        self.log = log
+        self.bot = Bot(restaurant_bot.BOT_TOKEN, request=RecordingRequest(log),
+                       get_updates_request=RecordingRequest(log))
+        self.application = Application.builder().bot(self.bot).updater(None).build()
+        self._ids = itertools.count(1)
+        self._initialized = False
+
+    def _user(self, user_id):
+        return {'id': user_id, 'is_bot': False, 'first_name': 'Гость', 'username': f"user{user_id}"}
+
+    def _message(self, user_id, **fields):
+        message = {'message_id': next(self._ids), 'date': int(datetime.now(timezone.utc).timestamp()),
+                   'chat': {'id': user_id, 'type': 'private'}, 'from': self._user(user_id)}
+        message.update(fields)
+        return message
+
+    def _update(self, **fields):
+        return Update.de_json({'update_id': next(self._ids), **fields}, self.bot)
+
+    def command(self, text, user_id=GUEST_ID):
+        command = text.split()[0]
+        return self._update(message=self._message(
+            user_id, text=text, entities=[{'type': 'bot_command', 'offset': 0, 'length': len(command)}]))
+
+    def text(self, text, user_id=GUEST_ID):
+        return self._update(message=self._message(user_id, text=text))
+
+    def photo(self, file_id, user_id=GUEST_ID):
+        return self._update(message=self._message(
+            user_id, photo=[{'file_id': file_id, 'file_unique_id': file_id, 'width': 800, 'height': 600}]))
+
+    def callback(self, data, user_id=GUEST_ID, photo=None):
+        """Нажатие кнопки в сообщении бота (текстовом или с фото photo)"""
+        message = self._message(user_id, **({'photo': [{'file_id': photo, 'file_unique_id': photo,
+                                                        'width': 800, 'height': 600}], 'caption': 'Экран'}
+                                            if photo else {'text': 'Экран'}))
+        message['from'] = BOT_USER
+        return self._update(callback_query={'id': str(next(self._ids)), 'from': self._user(user_id),
+                                            'chat_instance': 'test', 'data': data, 'message': message})
+
+    def inline(self, query, user_id=GUEST_ID):
+        return self._update(inline_query={'id': str(next(self._ids)), 'from': self._user(user_id),
+                                          'query': query, 'offset': ''})
+
+    def run(self, handler, update, args=None):
+        """Вызвать обработчик так, как его вызвал бы telegram.ext"""
+
+        async def call():
+            if not self._initialized:
+                await self.bot.initialize()
+                self._initialized = True
+            context = CallbackContext.from_update(update, self.application)
+            context.args = args
+            await handler(update, context)
+
+        asyncio.run(call())
+
+    def run_together(self, *calls):
+        """Вызвать обработчики одновременно, как их вызвал бы ChatOrderedUpdateProcessor.
+        calls — пары (обработчик, update); возвращает номера вызовов в порядке завершения"""
+        from update_processor import ChatOrderedUpdateProcessor
+
+        async def call_all():
+            if not self._initialized:
+                await self.bot.initialize()
+                self._initialized = True
+            processor = ChatOrderedUpdateProcessor(len(calls))
+            finished = []
+
+            async def call(number, handler, update):
+                await handler(update, CallbackContext.from_update(update, self.application))
+                finished.append(number)
+
+            await asyncio.gather(*(processor.process_update(update, call(number, handler, update))
+                                   for number, (handler, update) in enumerate(calls)))
+            return finished
+
+        return asyncio.run(call_all())
+
+
+@pytest.fixture
+def call_log():
+    return LOG
+
+
+@pytest.fixture
+def harness(monkeypatch, tmp_path):
+    """Бот после прогрева (как после on_startup): локальная копия и кэши заполнены, журнал пуст"""
+    SUPABASE.tables = seed_tables()
+
+    rollups = FeedbackRollups(str(tmp_path / 'rollups.sqlite3'))
+    for module in (database_manager, feedback_queue_module, restaurant_bot):
+        monkeypatch.setattr(module, 'feedback_rollups', rollups)
+    monkeypatch.setattr(database_manager, '_replica',
+                        RecordingReplica(MenuReplica(str(tmp_path / 'replica.sqlite3')), LOG))
+    monkeypatch.setattr(menu_catalog, '_catalogs', {})
+    monkeypatch.setattr(restaurant_bot, 'conversation_state', ConversationState())
+    monkeypatch.setattr(restaurant_bot, 'throttle', UpdateThrottle())
+    monkeypatch.setattr(restaurant_bot, 'chat_venues', ChatVenues(str(tmp_path / 'chat_venues.sqlite3')))
+    monkeypatch.setattr(restaurant_bot, 'feedback_queue', FeedbackQueue(str(tmp_path / 'queue.sqlite3')))
+    DatabaseManager.invalidate_cache()
+
+    DatabaseManager.sync_replica()
+    DatabaseManager.rebuild_feedback_rollups()
+    restaurant_bot.warm_up_caches()
+
+    harness = BotHarness(LOG)
+    LOG.clear()
+    return harness
@@ -0,0 +1,270 @@
+"""Подставные Supabase и Telegram для тестов: записывают каждый запрос.
+
+FakeSupabase хранит таблицы в памяти и понимает ту часть API
+supabase-py, которой пользуется database_manager.py. RecordingRequest
+подставляется в telegram.Bot вместо HTTP-клиента: бот и объекты Update —
+настоящие, а вызовы Bot API записываются и получают правдоподобный ответ.
+"""
+import itertools
+import json
+from datetime import datetime, timezone
+
+from telegram.request import BaseRequest
+
+BOT_USER = {'id': 777000, 'is_bot': True, 'first_name': 'Sarang', 'username': 'sarang_test_bot'}
+
+
+class CallLog:
+    """Общий журнал вызовов базы и Telegram для одного сценария"""
+
+    def __init__(self):
+        self.db = []
+        self.telegram = []
+
+    def clear(self):
+        self.db.clear()
+        self.telegram.clear()
+
+    @property
+    def db_rows(self):
+        return sum(rows for _, rows in self.db)
+
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class FakeQuery:
+    """Цепочка supabase.table(...).select(...).eq(...)... до execute()"""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.operation = 'select'
+        self.columns = '*'
+        self.payload = None
+        self.on_conflict = None
+        self.ignore_duplicates = False
+        self.filters = []
+        self.orders = []
+        self.limit_count = None
+        self.offset = 0
+        self.count_mode = None
+        self.head = False
+        self.description = []
+
+    def _filter(self, name, column, value, match):
+        self.filters.append(match)
+        self.description.append(f"{name}({column}={value!r})")
+        return self
+
+    def select(self, columns='*', count=None, head=False):
+        self.columns = columns
+        self.count_mode = count
+        self.head = head
+        if count:
+            self.description.append(f"count={count}{' head' if head else ''}")
+        return self
+
+    def eq(self, column, value):
+        return self._filter('eq', column, value, lambda row: row.get(column) == value)
+
+    def gt(self, column, value):
+        return self._filter('gt', column, value, lambda row: row.get(column) is not None and row[column] > value)
+
+    def gte(self, column, value):
+        return self._filter('gte', column, value, lambda row: row.get(column) is not None and row[column] >= value)
+
+    def lt(self, column, value):
+        return self._filter('lt', column, value, lambda row: row.get(column) is not None and row[column] < value)
+
+    def in_(self, column, values):
+        values = list(values)
+        return self._filter('in', column, values, lambda row: row.get(column) in values)
+
+    def order(self, column, desc=False):
+        self.orders.append((column, desc))
+        self.description.append(f"order({column}{' desc' if desc else ''})")
+        return self
+
+    def limit(self, count):
+        self.limit_count = count
+        self.description.append(f"limit({count})")
+        return self
+
+    def range(self, start, end):
+        self.offset = start
+        self.limit_count = end - start + 1
+        self.description.append(f"range({start}, {end})")
+        return self
+
+    def update(self, payload):
+        self.operation, self.payload = 'update', payload
+        return self
+
+    def delete(self):
+        self.operation = 'delete'
+        return self
+
+    def insert(self, payload):
+        self.operation, self.payload = 'insert', payload if isinstance(payload, list) else [payload]
+        return self
+
+    def upsert(self, payload, on_conflict=None, ignore_duplicates=False, **kwargs):
+        self.operation, self.payload = 'upsert', payload if isinstance(payload, list) else [payload]
+        self.on_conflict = on_conflict.split(',') if on_conflict else ['id']
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def execute(self):
+        data = self.client.execute(self)
+        count = len(data) if self.count_mode else None
+        if self.head:
+            data = []
+        sent = len(self.payload) if self.operation in ('insert', 'upsert') else 0
+        self.client.log.db.append((
+            f"supabase {self.operation} {self.table}"
+            + (f"({self.columns})" if self.operation == 'select' and self.columns != '*' else "")
+            + "".join(f" {part}" for part in self.description),
+            len(data) + sent,
+        ))
+        return FakeResponse(data, count)
+
+
+class FakeSupabase:
+    """Клиент Supabase с таблицами в памяти"""
+
+    def __init__(self, log, tables=None):
+        self.log = log
+        self.tables = tables if tables is not None else {}
+        self._ids = itertools.count(100000)
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def _new_row(self, row):
+        now = datetime.now(timezone.utc).isoformat()
+        row = dict(row)
+        row.setdefault('id', next(self._ids))
+        row.setdefault('created_at', now)
+        row['updated_at'] = now
+        return row
+
+    def execute(self, query):
+        if query.table not in self.tables:
+            raise Exception(f'relation "public.{query.table}" does not exist')
+        rows = self.tables[query.table]
+        matched = [row for row in rows if all(match(row) for match in query.filters)]
+
+        if query.operation == 'insert':
+            new_rows = [self._new_row(row) for row in query.payload]
+            rows.extend(new_rows)
+            return [dict(row) for row in new_rows]
+
+        if query.operation == 'upsert':
+            written = []
+            for row in query.payload:
+                existing = next((r for r in rows if all(r.get(c) == row.get(c) for c in query.on_conflict)), None)
+                if existing is None:
+                    existing = self._new_row(row)
+                    rows.append(existing)
+                elif query.ignore_duplicates:
+                    continue
+                else:
+                    existing.update(row)
+                    existing['updated_at'] = datetime.now(timezone.utc).isoformat()
+                written.append(dict(existing))
+            return written
+
+        if query.operation == 'update':
+            for row in matched:
+                row.update(query.payload)
+                row['updated_at'] = datetime.now(timezone.utc).isoformat()
+            return [dict(row) for row in matched]
+
+        if query.operation == 'delete':
+            self.tables[query.table] = [row for row in rows if row not in matched]
+            return [dict(row) for row in matched]
+
+        for column, desc in reversed(query.orders):
+            matched.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+        if query.limit_count is not None:
+            matched = matched[query.offset:query.offset + query.limit_count]
+        if query.columns != '*':
+            columns = [column.strip() for column in query.columns.split(',')]
+            return [{column: row.get(column) for column in columns} for row in matched]
+        return [dict(row) for row in matched]
+
+
+class RecordingReplica:
+    """Обертка над MenuReplica: чтения локальной копии тоже считаются запросами к базе"""
+
+    def __init__(self, replica, log):
+        self._replica = replica
+        self._log = log
+
+    def __getattr__(self, name):
+        attribute = getattr(self._replica, name)
+        if not name.startswith('get_') or not callable(attribute):
+            return attribute
+
+        def recorded(*args, **kwargs):
+            result = attribute(*args, **kwargs)
+            if result is None:
+                rows = 0
+            elif isinstance(result, (list, tuple, set)):
+                rows = len(result)
+            else:
+                rows = 1
+            self._log.db.append((f"replica {name}{args!r}", rows))
+            return result
+
+        return recorded
+
+
+class RecordingRequest(BaseRequest):
+    """HTTP-клиент для telegram.Bot, который никуда не ходит, а записывает вызовы Bot API"""
+
+    def __init__(self, log):
+        self.log = log
+        self._message_ids = itertools.count(1000)
+
+    @property
+    def read_timeout(self):
+        # Абстрактное свойство BaseRequest в python-telegram-bot 21.7+; запросы здесь мгновенные
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _message(self, parameters):
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(datetime.now(timezone.utc).timestamp()),
+            'chat': {'id': int(parameters.get('chat_id') or 1), 'type': 'private'},
+            'from': BOT_USER,
+        }
+        if 'text' in parameters:
+            message['text'] = parameters['text']
+        if 'caption' in parameters:
+            message['caption'] = parameters['caption']
+        return message
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit('/', 1)[-1]
+        parameters = request_data.parameters if request_data else {}
+        if endpoint == 'getMe':
+            result = BOT_USER
+        else:
+            self.log.telegram.append((endpoint, parameters))
+            if endpoint.startswith(('send', 'edit')):
+                result = self._message(parameters)
+            else:
+                result = True
+        return 200, json.dumps({'ok': True, 'result': result}).encode('utf-8')
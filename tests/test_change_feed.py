@@ -0,0 +1,61 @@
+"""Отслеживание изменений в базе через Supabase Realtime (change_feed.py)."""
+import asyncio
+
+import supabase
+
+import change_feed
+import menu_catalog
+from change_feed import SupabaseRealtimeFeed
+
+
+class FakeChannel:
+    def __init__(self):
+        self.on_state = None
+
+    def on_postgres_changes(self, event, schema, table, callback):
+        return self
+
+    async def subscribe(self, callback=None):
+        self.on_state = callback
+        callback('SUBSCRIBED', None)
+        return self
+
+
+class FakeRealtimeClient:
+    def __init__(self):
+        self.channels = []
+
+    def channel(self, name):
+        self.channels.append(FakeChannel())
+        return self.channels[-1]
+
+    async def remove_all_channels(self):
+        self.channels.clear()
+
+
+def test_every_rejoin_resyncs_caches(harness, monkeypatch):
+    client = FakeRealtimeClient()
+
+    async def acreate_client(url, key):
+        return client
+
+    monkeypatch.setattr(supabase, 'acreate_client', acreate_client)
+    resyncs = []
+    monkeypatch.setattr(change_feed, 'resync_all', lambda: resyncs.append(True))
+
+    asyncio.run(SupabaseRealtimeFeed().start(change_feed.apply_change))
+    assert len(resyncs) == 1
+
+    # Соединение разорвалось и восстановилось: канал подписывается заново
+    channel = client.channels[0]
+    channel.on_state('CHANNEL_ERROR', Exception("socket closed"))
+    assert len(resyncs) == 1
+    channel.on_state('SUBSCRIBED', None)
+    assert len(resyncs) == 2
+
+
+def test_resync_marks_catalogs_stale(harness):
+    catalog = menu_catalog.get_catalog('main')
+    assert not catalog.is_stale()
+    change_feed.resync_all()
+    assert catalog.is_stale()
@@ -0,0 +1,36 @@
+"""Сводная статистика отзывов (feedback_rollups.py) и отзывы в очереди (feedback_queue.py)."""
+import database_manager
+import restaurant_bot as bot
+from conftest import FEEDBACK_COUNT
+from database_manager import DatabaseManager
+
+
+def total():
+    return database_manager.feedback_rollups.summary()['total']
+
+
+def submit(text):
+    return bot.feedback_queue.submit(300, 'guest', 'Гость', text, 5, venue_id='main')
+
+
+def test_rebuild_keeps_feedback_still_in_queue(harness):
+    submit("Еще в очереди")
+    assert total() == FEEDBACK_COUNT + 1
+
+    DatabaseManager.rebuild_feedback_rollups(bot.feedback_queue.pending_rows)
+    assert total() == FEEDBACK_COUNT + 1
+
+    # После записи в базу отзыв по-прежнему учтен один раз
+    assert bot.feedback_queue.flush()
+    DatabaseManager.rebuild_feedback_rollups(bot.feedback_queue.pending_rows)
+    assert total() == FEEDBACK_COUNT + 1
+
+
+def test_feedback_submitted_during_rebuild_is_kept(harness):
+    def pending_rows():
+        # Гость оставил отзыв, пока пересчет читал базу
+        submit("Во время пересчета")
+        return []
+
+    DatabaseManager.rebuild_feedback_rollups(pending_rows)
+    assert total() == FEEDBACK_COUNT + 1
@@ -0,0 +1,21 @@
+"""Готовность процесса (/readyz) при недоступной базе."""
+from health import HealthMonitor
+
+
+def monitor_with_supabase(replica_ready):
+    monitor = HealthMonitor("bot")
+    monitor.add_check("supabase", lambda: False, required=lambda: not replica_ready)
+    monitor.mark_warm()
+    return monitor
+
+
+def test_supabase_outage_is_reported_but_not_fatal_with_replica():
+    ok, payload = monitor_with_supabase(replica_ready=True).readiness()
+    assert ok
+    assert payload['checks'] == {'supabase': False}
+
+
+def test_supabase_outage_fails_readiness_without_replica():
+    ok, payload = monitor_with_supabase(replica_ready=False).readiness()
+    assert not ok
+    assert payload['status'] == 'not_ready'
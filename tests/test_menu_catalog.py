@@ -0,0 +1,38 @@
+"""Каталог меню в памяти (menu_catalog.py): чтение без базы и обновление."""
+import dataclasses
+
+import menu_catalog
+from database_manager import DatabaseManager
+from menu_catalog import MenuCatalog
+
+
+def test_readers_never_touch_the_database(harness, call_log):
+    catalog = menu_catalog.get_catalog('main')
+    catalog.invalidate()
+    assert catalog.get_categories() and catalog.get_dish(10) and catalog.search("суп") is not None
+    assert call_log.db == []
+
+
+def test_refresh_raced_by_a_change_keeps_catalog_fresh(harness, monkeypatch):
+    catalog = menu_catalog.get_catalog('main')
+    catalog.invalidate()
+    get_categories = DatabaseManager.get_categories
+
+    def categories_then_stop_list(venue_id):
+        categories = get_categories(venue_id)
+        # Пока шло чтение, блюдо поставили на стоп из бота
+        catalog.upsert_dish(dataclasses.replace(catalog.dishes[10], is_available=False))
+        return categories
+
+    monkeypatch.setattr(DatabaseManager, 'get_categories', staticmethod(categories_then_stop_list))
+    assert not catalog.refresh()
+    assert not catalog.is_stale()
+    assert not catalog.dishes[10].is_available
+
+
+def test_empty_first_load_is_not_retried_by_every_reader(harness, monkeypatch):
+    monkeypatch.setattr(DatabaseManager, 'get_categories', staticmethod(lambda venue_id: []))
+    monkeypatch.setattr(DatabaseManager, 'get_all_dishes', staticmethod(lambda venue_id: []))
+    catalog = MenuCatalog('main')
+    assert not catalog.refresh()
+    assert not catalog.is_stale()
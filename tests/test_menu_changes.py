@@ -0,0 +1,47 @@
+"""Журнал изменений меню (menu_changes.py) для /api/menu/changes."""
+import menu_changes
+from menu_changes import MenuChangeLog
+
+
+def menu(*dishes, categories=({'id': 1, 'name': 'Супы', 'sort_order': 1},)):
+    return {'venue': {'id': 'main', 'name': 'Саранг'}, 'categories': list(categories), 'dishes': list(dishes)}
+
+
+def dish(dish_id, **fields):
+    return {'id': dish_id, 'name': f"Блюдо {dish_id}", 'category_id': 1, 'is_available': True, **fields}
+
+
+def test_only_changed_rows_are_returned(tmp_path):
+    log = MenuChangeLog(str(tmp_path / 'changes.sqlite3'))
+    first = log.record('main', menu(dish(1), dish(2), dish(3)))
+    assert log.record('main', menu(dish(1), dish(2), dish(3))) == first
+
+    second = log.record('main', menu(dish(1), dish(2, is_available=False)))
+    assert second == first + 1
+    assert log.changes('main', first) == {'version': second, 'dishes': [dish(2, is_available=False)],
+                                          'deleted_dishes': [3]}
+    assert log.changes('main', second) == {'version': second}
+    # Клиент, открывший страницу до первой записи, получает все строки
+    assert len(log.changes('main', 0)['dishes']) == 2
+
+
+def test_venues_share_versions_but_not_rows(tmp_path):
+    log = MenuChangeLog(str(tmp_path / 'changes.sqlite3'))
+    main_version = log.record('main', menu(dish(1)))
+    other_version = log.record('other', menu(dish(2)))
+    assert other_version > main_version
+    assert log.changes('main', main_version) == {'version': other_version}
+    assert log.changes('other', main_version)['dishes'] == [dish(2)]
+
+
+def test_unknown_or_pruned_versions_reset(tmp_path, monkeypatch):
+    log = MenuChangeLog(str(tmp_path / 'changes.sqlite3'))
+    first = log.record('main', menu(dish(1), dish(2)))
+    assert log.changes('main', first + 5) == {'version': first, 'reset': True}
+
+    second = log.record('main', menu(dish(1)))
+    monkeypatch.setattr(menu_changes, 'TOMBSTONE_RETENTION', -1)
+    third = log.record('main', menu(dish(1, name="Новое")))
+    # Метка удаления блюда 2 (версия second) удалена: кто не видел ее, загружает меню заново
+    assert log.changes('main', first) == {'version': third, 'reset': True}
+    assert log.changes('main', second) == {'version': third, 'dishes': [dish(1, name="Новое")]}
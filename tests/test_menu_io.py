@@ -0,0 +1,56 @@
+"""Выгрузка и загрузка меню (menu_io.py) между заведениями."""
+import copy
+
+import pytest
+
+import menu_io
+from conftest import SUPABASE
+from database_manager import DatabaseManager
+
+
+def venue_rows(table, venue_id):
+    return [row for row in SUPABASE.tables[table] if row.get('venue_id') == venue_id]
+
+
+@pytest.fixture
+def center(harness):
+    SUPABASE.tables['venues'].append({'id': 'center', 'name': 'Центр', 'sort_order': 1})
+    DatabaseManager.invalidate_cache()
+    return 'center'
+
+
+def test_import_into_other_venue_copies_menu(center, tmp_path):
+    main_before = copy.deepcopy((venue_rows('categories', 'main'), venue_rows('dishes', 'main')))
+    path = str(tmp_path / 'menu.json')
+    menu_io.export_menu(path, 'main')
+
+    menu_io.import_menu(path, venue_id=center)
+
+    # Меню основного заведения не переехало и не изменилось
+    assert (venue_rows('categories', 'main'), venue_rows('dishes', 'main')) == main_before
+    categories = venue_rows('categories', center)
+    dishes = venue_rows('dishes', center)
+    assert [c['name'] for c in categories] == [c['name'] for c in main_before[0]]
+    assert len(dishes) == len(main_before[1])
+    assert not {c['id'] for c in categories} & {c['id'] for c in main_before[0]}
+    # Блюда ссылаются на новые категории своего заведения
+    assert {d['category_id'] for d in dishes} <= {c['id'] for c in categories}
+    by_id = {c['id']: c['name'] for c in categories}
+    main_names = {c['id']: c['name'] for c in main_before[0]}
+    assert sorted((d['name'], by_id[d['category_id']]) for d in dishes) == \
+        sorted((d['name'], main_names[d['category_id']]) for d in main_before[1])
+
+
+def test_failed_copy_rolls_back_without_touching_source(center, tmp_path, monkeypatch):
+    main_before = copy.deepcopy((venue_rows('categories', 'main'), venue_rows('dishes', 'main')))
+    path = str(tmp_path / 'menu.json')
+    menu_io.export_menu(path, 'main')
+
+    insert_rows = DatabaseManager.insert_rows
+    monkeypatch.setattr(DatabaseManager, 'insert_rows',
+                        staticmethod(lambda table, rows: None if table == 'dishes' else insert_rows(table, rows)))
+    with pytest.raises(menu_io.MenuImportError):
+        menu_io.import_menu(path, venue_id=center)
+
+    assert (venue_rows('categories', 'main'), venue_rows('dishes', 'main')) == main_before
+    assert venue_rows('categories', center) == [] and venue_rows('dishes', center) == []
@@ -0,0 +1,72 @@
+"""Поисковый индекс меню (menu_search.py): обновление по одному блюду и опечатки."""
+import dataclasses
+
+from menu_search import MenuSearchIndex, trigrams
+from models import Dish
+
+DISHES = [
+    Dish(1, "Пибимбап", 1, composition="Рис, говядина, овощи, яйцо"),
+    Dish(2, "Рамен с курицей", 1, composition="Лапша, куриный бульон"),
+    Dish(3, "Кимчи", 2, description="Острая квашеная капуста"),
+]
+
+
+def index_state(index):
+    """Копия внутренних структур индекса для сравнения до и после изменения"""
+    return ({token: dict(postings) for token, postings in index._postings.items()},
+            {trigram: set(tokens) for trigram, tokens in index._trigrams.items()},
+            list(index._sorted_tokens))
+
+
+def test_sync_reindexes_only_the_changed_dish():
+    index = MenuSearchIndex()
+    assert index.sync(DISHES) == 3
+    documents = dict(index._documents)
+    postings, _, _ = index_state(index)
+
+    renamed = dataclasses.replace(DISHES[2], name="Кимчи тяхан", description="Жареный рис с кимчи")
+    assert index.sync([DISHES[0], DISHES[1], renamed]) == 1
+
+    # Неизмененные блюда не переиндексированы: те же документы и те же записи в индексе
+    assert index._documents[1] is documents[1] and index._documents[2] is documents[2]
+    new_postings, new_trigrams, sorted_tokens = index_state(index)
+    for dish_id in (1, 2):
+        assert ({token for token, ids in new_postings.items() if dish_id in ids}
+                == {token for token, ids in postings.items() if dish_id in ids})
+
+    # Слова только из старого описания исчезли вместе с их триграммами
+    assert 'капуст' in postings and 'капуст' not in new_postings
+    assert 'капуст' not in sorted_tokens
+    assert all('капуст' not in tokens for tokens in new_trigrams.values())
+    assert 'тяха' in new_postings or 'тяхан' in new_postings
+    assert sorted_tokens == sorted(new_postings)
+
+
+def test_fields_outside_index_do_not_reindex():
+    index = MenuSearchIndex()
+    index.sync(DISHES)
+    stopped = dataclasses.replace(DISHES[0], is_available=False, price=450)
+    assert not index.add_dish(stopped)
+    assert index.sync([stopped, DISHES[1], DISHES[2]]) == 0
+
+
+def test_removed_dish_leaves_no_entries():
+    index = MenuSearchIndex()
+    index.sync(DISHES)
+    assert index.remove_dish(3)
+    assert len(index) == 2
+    assert all(3 not in ids for ids in index._postings.values())
+    assert all(trigram in trigrams(token) for trigram, tokens in index._trigrams.items() for token in tokens)
+    assert index.search("кимчи") == []
+
+
+def test_typos_find_the_dish():
+    index = MenuSearchIndex()
+    index.sync(DISHES)
+    assert index.search("пибимпап")[0] == 1
+    assert index.search("бульйон")[0] == 2
+    assert index.search("кимчы")[0] == 3
+    assert index.search("квашенная")[0] == 3
+    # Поиск по составу и по началу слова
+    assert index.search("говядин")[0] == 1
+    assert index.search("лап")[0] == 2
@@ -0,0 +1,70 @@
+"""Страница Mini App со встроенным меню (mini_app_shell.py)."""
+import json
+import os
+
+from conftest import ROOT
+from menu_snapshot import MenuSnapshot, write_snapshot
+from mini_app_shell import SHELL_DISHES, MiniAppShell
+
+
+def make_shell(tmp_path, menus):
+    path = str(tmp_path / 'menu_snapshot.bin')
+    if menus is not None:
+        write_snapshot({venue_id: json.dumps(menu, ensure_ascii=False).encode('utf-8')
+                        for venue_id, menu in menus.items()}, path)
+    return MiniAppShell(MenuSnapshot(path, check_interval=0),
+                        template_path=os.path.join(ROOT, 'static', 'index.html'),
+                        stylesheet_path=os.path.join(ROOT, 'static', 'style.css'))
+
+
+def menu(dish_count=20):
+    return {
+        'venue': {'id': 'main', 'name': 'Саранг'},
+        'categories': [{'id': 2, 'name': 'Роллы', 'sort_order': 2}, {'id': 1, 'name': 'Супы', 'sort_order': 1}],
+        'dishes': [
+            {'id': i, 'name': f"Рамен {i}</script>", 'category_id': 1, 'sort_order': -i, 'is_available': i != 3,
+             'composition': 'Лапша', 'description': '', 'spiciness': 'Острое', 'allergens': '',
+             'features': '', 'photo_file_id': f"/p/{i}.jpg", 'cooking_time': 15, 'price': 390.0}
+            for i in range(dish_count)
+        ],
+    }
+
+
+def test_first_category_is_rendered_with_menu_embedded(tmp_path):
+    page, etag = make_shell(tmp_path, {'main': menu()}).render('main')
+    page = page.decode('utf-8')
+
+    assert '<link rel="stylesheet"' not in page and '.dish-card {' in page
+    assert page.count('class="dish-card"') == SHELL_DISHES
+    # Первая категория по sort_order, блюда по sort_order, недоступные скрыты
+    assert 'data-category-id="1" data-rendered="12"' in page
+    assert page.index('data-dish-id="19"') < page.index('data-dish-id="18"')
+    assert 'data-dish-id="3"' not in page
+    assert 'loading="lazy"' in page and 'width="280" height="160"' in page
+    assert '390 ₽' in page
+    # Название блюда не закрывает ни разметку, ни встроенный JSON
+    assert page.count('</script>') == page.count('<script')
+    embedded = page.split('<script id="menuData" type="application/json">')[1].split('</script>')[0]
+    assert len(json.loads(embedded)['dishes']) == 20
+    assert len(etag) == 16
+
+
+def test_filtered_link_leaves_cards_to_the_browser(tmp_path):
+    page, _ = make_shell(tmp_path, {'main': menu()}).render('main', with_dishes=False)
+    assert 'class="dish-card"' not in page.decode('utf-8')
+    assert 'id="menuData"' in page.decode('utf-8')
+
+
+def test_pages_are_cached_per_menu_version(tmp_path):
+    shell = make_shell(tmp_path, {'main': menu()})
+    first = shell.render('main')
+    assert shell.render('main') == first
+    write_snapshot({'main': json.dumps(menu(5)).encode('utf-8')}, shell.snapshot.path)
+    assert shell.render('main') != first
+    assert shell.get_stats()['renders'] == 2 and shell.get_stats()['hits'] == 1
+
+
+def test_template_is_served_as_is_without_snapshot(tmp_path):
+    page, _ = make_shell(tmp_path, None).render('main')
+    with open(os.path.join(ROOT, 'static', 'index.html'), 'rb') as f:
+        assert page == f.read()
@@ -0,0 +1,217 @@
+"""Бюджеты запросов для обработчиков restaurant_bot.py.
+
+Каждый сценарий — одно действие пользователя после прогрева бота. Для него
+объявлен максимум запросов к базе (Supabase и локальная копия), строк,
+переданных в обе стороны, и вызовов Telegram Bot API. Если изменение выходит
+за бюджет, тест падает с разницей между бюджетом и фактом и списком запросов.
+
+Бюджет можно снижать вместе с оптимизацией; повышать — только осознанно.
+
+    pip install pytest && python -m pytest tests
+"""
+import difflib
+from typing import Callable, NamedTuple, Optional
+
+import pytest
+
+import restaurant_bot as bot
+from conftest import ADMIN_ID, FEEDBACK_COUNT, VENUE_ADMIN_ID
+
+# Строк на странице списка отзывов (+1, чтобы узнать, есть ли следующая)
+PAGE_ROWS = bot.FEEDBACK_PAGE_SIZE + 1
+
+
+class Budget(NamedTuple):
+    db_calls: int
+    db_rows: int
+    telegram_calls: int
+
+
+class Scenario(NamedTuple):
+    action: Callable
+    budget: Budget
+    setup: Optional[Callable] = None
+
+
+def button(data, user_id=None, photo=None):
+    """Нажатие кнопки data"""
+    def press(h):
+        h.run(bot.button, h.callback(data, **({'user_id': user_id} if user_id else {}), photo=photo))
+    return press
+
+
+def admin_button(data):
+    return button(data, user_id=ADMIN_ID)
+
+
+def command(handler, text, user_id=None):
+    """Команда text (аргументы — после пробела)"""
+    def send(h):
+        update = h.command(text, **({'user_id': user_id} if user_id else {}))
+        h.run(handler, update, args=text.split()[1:])
+    return send
+
+
+def admin_command(handler, text):
+    return command(handler, text, user_id=ADMIN_ID)
+
+
+def message(text, user_id=None):
+    def send(h):
+        h.run(bot.handle_message, h.text(text, **({'user_id': user_id} if user_id else {})))
+    return send
+
+
+def photo(file_id, user_id=None):
+    def send(h):
+        h.run(bot.handle_photo, h.photo(file_id, **({'user_id': user_id} if user_id else {})))
+    return send
+
+
+def inline(query):
+    def send(h):
+        h.run(bot.inline_search, h.inline(query))
+    return send
+
+
+def steps(*actions):
+    def run(h):
+        for action in actions:
+            action(h)
+    return run
+
+
+SCENARIOS = {
+    # Гость: главное меню и заведения
+    'start': Scenario(command(bot.start, '/start'), Budget(0, 0, 1)),
+    'start_deep_link': Scenario(command(bot.start, '/start venue_main'), Budget(0, 0, 1)),
+    'venue_command': Scenario(command(bot.show_venues, '/venue'), Budget(0, 0, 1)),
+    'venue_select': Scenario(button('venue_main'), Budget(0, 0, 2)),
+    'back_main': Scenario(button('back_main'), Budget(0, 0, 2)),
+    'mini_app': Scenario(command(bot.serve_mini_app, '/menu'), Budget(0, 0, 1)),
+
+    # Гость: меню, фильтр, блюда, поиск
+    'menu': Scenario(button('menu'), Budget(0, 0, 2)),
+    'category': Scenario(button('category_1'), Budget(0, 0, 2)),
+    'category_filtered': Scenario(button('category_2'), Budget(0, 0, 2), setup=button('filter_allergen_0')),
+    'filter': Scenario(button('filter'), Budget(0, 0, 2)),
+    'filter_toggle': Scenario(button('filter_spice'), Budget(0, 0, 2)),
+    'filter_reset': Scenario(button('filter_reset'), Budget(0, 0, 2)),
+    'dish': Scenario(button('dish_10'), Budget(0, 0, 2)),
+    'dish_with_photo': Scenario(button('dish_11'), Budget(0, 0, 3)),
+    'dish_photo_to_photo': Scenario(button('dish_11', photo='OTHER'), Budget(0, 0, 2)),
+    'back_categories': Scenario(button('back_categories'), Budget(0, 0, 2)),
+    'search_text': Scenario(message('Рамен'), Budget(0, 0, 1)),
+    'search_nothing': Scenario(message('пицца'), Budget(0, 0, 1)),
+    'inline_search': Scenario(inline('кимпаб'), Budget(0, 0, 1)),
+    'inline_empty': Scenario(inline(''), Budget(0, 0, 1)),
+
+    # Гость: листы, график, посадка
+    'sheet': Scenario(button('sheet'), Budget(0, 0, 2)),
+    'view_go': Scenario(button('view_go'), Budget(0, 0, 2)),
+    'view_start': Scenario(button('view_start'), Budget(0, 0, 2)),
+    'schedule': Scenario(button('schedule'), Budget(0, 0, 2)),
+    'view_schedule': Scenario(button('view_schedule'), Budget(0, 0, 3)),
+    'seating': Scenario(button('seating'), Budget(0, 0, 3)),
+    'update_sheet_denied': Scenario(button('update_sheet'), Budget(0, 0, 2)),
+    'update_schedule_denied': Scenario(button('update_schedule'), Budget(0, 0, 2)),
+    'guest_photo': Scenario(photo('PHOTO'), Budget(0, 0, 1)),
+
+    # Гость: отзыв
+    'feedback_main': Scenario(button('feedback_main'), Budget(0, 0, 2)),
+    'send_feedback': Scenario(button('send_feedback'), Budget(0, 0, 2)),
+    'choose_table': Scenario(button('table_5'), Budget(0, 0, 2)),
+    'leave_feedback': Scenario(message('Очень вкусно'), Budget(0, 0, 3), setup=button('table_5')),
+    'feedback_too_soon': Scenario(message('Еще отзыв'), Budget(0, 0, 1),
+                                  setup=steps(button('table_5'), message('Первый'), button('table_5'))),
+    'view_feedback_denied': Scenario(button('view_feedback'), Budget(0, 0, 2)),
+
+    # Администратор: отзывы. Страница списка — FEEDBACK_PAGE_SIZE + 1 строк; счетчики по статусам
+    # (get_feedback_stats) — два запроса count без строк
+    'admin_feedback_main': Scenario(admin_button('feedback_main'), Budget(2, 0, 2)),
+    'view_feedback': Scenario(admin_button('view_feedback'), Budget(3, PAGE_ROWS, 2)),
+    'feedback_detail': Scenario(admin_button('feedback_view_5'), Budget(1, 1, 2)),
+    'feedback_markread': Scenario(admin_button('feedback_markread_5'), Budget(4, 1 + PAGE_ROWS, 2)),
+    'feedback_delete': Scenario(admin_button('feedback_delete_5'), Budget(4, 1 + PAGE_ROWS, 2)),
+    'feedback_next_page': Scenario(admin_button('feedback_page_10'), Budget(3, PAGE_ROWS, 2)),
+    'feedback_read_page': Scenario(admin_button('feedback_readpage_0'),
+                                   Budget(4, PAGE_ROWS - 1 + PAGE_ROWS, 2),
+                                   setup=admin_button('view_feedback')),
+    'feedback_tables': Scenario(admin_button('feedback_tables_0'), Budget(0, 0, 2)),
+    'feedback_by_table': Scenario(admin_button('feedback_table_3'), Budget(3, 4, 2)),
+    'feedback_purge': Scenario(admin_button('feedback_purge_0'), Budget(0, 0, 2)),
+    'feedback_purge_read': Scenario(admin_button('feedback_purgeread_30'), Budget(4, PAGE_ROWS, 2)),
+
+    # Администратор: лист и график
+    'update_sheet': Scenario(admin_button('update_sheet'), Budget(0, 0, 2)),
+    'set_sheet': Scenario(admin_button('set_go'), Budget(0, 0, 2)),
+    'save_sheet': Scenario(message('Новый go лист', user_id=ADMIN_ID), Budget(2, 2, 2),
+                           setup=admin_button('set_go')),
+    'update_schedule': Scenario(admin_button('update_schedule'), Budget(0, 0, 2)),
+    'save_schedule': Scenario(photo('NEW_SCHEDULE', user_id=ADMIN_ID), Budget(3, 3, 2),
+                              setup=admin_button('update_schedule')),
+    'save_seating': Scenario(photo('NEW_SEATING', user_id=ADMIN_ID), Budget(3, 3, 1)),
+
+    # Администратор: команды
+    # Запись администратора и перечитывание строки в локальную копию
+    'add_admin': Scenario(admin_command(bot.add_admin, '/add_admin 42'), Budget(2, 3, 1)),
+    'list_admins': Scenario(admin_command(bot.list_admins, '/list_admins'), Budget(0, 0, 1)),
+    'remove_admin': Scenario(admin_command(bot.remove_admin, f'/remove_admin {VENUE_ADMIN_ID}'), Budget(2, 1, 1)),
+    'admin_commands_denied': Scenario(command(bot.list_admins, '/list_admins'), Budget(0, 0, 1)),
+    'dbstats': Scenario(admin_command(bot.db_stats, '/dbstats'), Budget(1, 1, 1)),
+    'stats_week': Scenario(admin_command(bot.feedback_stats, '/stats'), Budget(0, 0, 1)),
+    'stats_all': Scenario(admin_command(bot.feedback_stats, '/stats all'), Budget(0, 0, 1)),
+    'export_csv': Scenario(admin_command(bot.export_feedback_command, '/export_feedback'),
+                           Budget(1, FEEDBACK_COUNT, 2)),
+    'export_xlsx_period': Scenario(admin_command(bot.export_feedback_command, '/export_feedback 01.01.2024 xlsx'),
+                                   Budget(1, FEEDBACK_COUNT, 2)),
+    'profile': Scenario(admin_command(bot.profile_command, '/profile 1'), Budget(0, 0, 3)),
+
+    # Администратор: стоп-лист. Экраны — из каталога; изменение наличия — один update на всю пачку блюд
+    'stop_list': Scenario(admin_command(bot.stop_list_command, '/stoplist'), Budget(0, 0, 1)),
+    'stop_list_denied': Scenario(command(bot.stop_list_command, '/stoplist'), Budget(0, 0, 1)),
+    'stop_categories': Scenario(admin_button('stop_categories_0'), Budget(0, 0, 2)),
+    'stop_category': Scenario(admin_button('stop_category_1'), Budget(0, 0, 2)),
+    'stop_toggle': Scenario(admin_button('stop_toggle_10'), Budget(1, 1, 2)),
+    'stop_toggle_denied': Scenario(button('stop_toggle_10'), Budget(0, 0, 2)),
+    'stop_return': Scenario(admin_button('stop_return_21'), Budget(1, 1, 2)),
+    'stop_restore_all': Scenario(admin_button('stop_restore_0'), Budget(1, 3, 2),
+                                 setup=steps(admin_button('stop_toggle_10'), admin_button('stop_toggle_13'))),
+    'stop_bulk': Scenario(message('Рамен 0\nКимпаб 1, Лимонад 2', user_id=ADMIN_ID), Budget(1, 3, 1),
+                          setup=admin_button('stop_bulk_0')),
+}
+
+
+def budget_report(name, budget, actual, call_log):
+    """Разница бюджета и факта и все запросы сценария"""
+    expected_lines = [f"{field}: {value}" for field, value in budget._asdict().items()]
+    actual_lines = [f"{field}: {value}" for field, value in actual._asdict().items()]
+    lines = [f"Сценарий '{name}' вышел за бюджет (- бюджет, + факт):"]
+    lines += [line for line in difflib.ndiff(expected_lines, actual_lines) if not line.startswith('?')]
+    lines.append("Запросы к базе:")
+    lines += [f"  {query} -> {rows} строк" for query, rows in call_log.db] or ["  нет"]
+    lines.append("Вызовы Telegram:")
+    lines += [f"  {endpoint}" for endpoint, _ in call_log.telegram] or ["  нет"]
+    return "\n".join(lines)
+
+
+@pytest.mark.parametrize('name', list(SCENARIOS))
+def test_query_budget(name, harness, call_log):
+    scenario = SCENARIOS[name]
+    if scenario.setup:
+        scenario.setup(harness)
+        call_log.clear()
+
+    scenario.action(harness)
+
+    actual = Budget(len(call_log.db), call_log.db_rows, len(call_log.telegram))
+    if any(spent > allowed for spent, allowed in zip(actual, scenario.budget)):
+        pytest.fail(budget_report(name, scenario.budget, actual, call_log), pytrace=False)
+
+
+def test_feedback_stats_are_counted_by_database(harness, call_log):
+    stats = bot.DatabaseManager.get_feedback_stats('main')
+    read = sum(1 for i in range(FEEDBACK_COUNT) if i % 3 == 0)
+    assert stats == {'total': FEEDBACK_COUNT, 'new': FEEDBACK_COUNT - read, 'read': read}
+    # Ни одной строки отзывов: только счетчики
+    assert call_log.db_rows == 0
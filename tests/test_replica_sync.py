@@ -0,0 +1,72 @@
+"""Синхронизация локальной копии с Supabase (DatabaseManager.sync_replica)."""
+import database_manager
+from conftest import SUPABASE
+from database_manager import DatabaseManager
+from menu_replica import MenuReplica
+
+
+def replica_dishes():
+    return database_manager._replica.get_keys('dishes')
+
+
+def test_sync_reads_every_page(harness, monkeypatch, tmp_path):
+    monkeypatch.setattr(database_manager, 'SELECT_PAGE_SIZE', 5)
+    monkeypatch.setattr(database_manager, '_replica', MenuReplica(str(tmp_path / 'fresh.sqlite3')))
+    DatabaseManager.sync_replica()
+    assert replica_dishes() == {row['id'] for row in SUPABASE.tables['dishes']}
+    assert len(database_manager._replica.get_keys('sheets')) == len(SUPABASE.tables['sheets'])
+
+
+def test_rows_sharing_cursor_timestamp_are_not_skipped(harness, monkeypatch):
+    monkeypatch.setattr(database_manager, 'SELECT_PAGE_SIZE', 5)
+    # Строки, записанные той же транзакцией, что и последняя полученная, но видимые позже
+    boundary = max(row['updated_at'] for row in SUPABASE.tables['dishes'])
+    for dish_id in (22, 23):
+        SUPABASE.tables['dishes'].append({**SUPABASE.tables['dishes'][0], 'id': dish_id, 'updated_at': boundary})
+    DatabaseManager.sync_replica()
+    assert {22, 23} <= replica_dishes()
+
+
+def test_synced_rows_are_not_read_again(harness):
+    for table in ('dishes', 'admins', 'sheets'):
+        cursor = database_manager._parse_cursor(database_manager._replica.get_cursor(table))
+        assert DatabaseManager.get_rows_changed_since(table, cursor) == []
+
+
+def test_partial_key_list_deletes_nothing(harness, monkeypatch):
+    monkeypatch.setattr(database_manager, 'SELECT_PAGE_SIZE', 5)
+    # Ключи прочитаны не полностью (строки сдвинулись между страницами)
+    monkeypatch.setattr(DatabaseManager, 'get_row_keys', staticmethod(lambda table, key_column: set()))
+    DatabaseManager.sync_replica()
+    assert replica_dishes() == {row['id'] for row in SUPABASE.tables['dishes']}
+    assert database_manager._replica.get_keys('admins')
+
+
+def test_deleted_rows_leave_replica(harness):
+    SUPABASE.tables['dishes'] = [row for row in SUPABASE.tables['dishes'] if row['id'] != 10]
+    SUPABASE.tables['sheets'].pop()
+    DatabaseManager.sync_replica()
+    assert 10 not in replica_dishes()
+    assert len(database_manager._replica.get_keys('sheets')) == len(SUPABASE.tables['sheets'])
+
+
+def test_polling_feed_reports_what_sync_found(harness, monkeypatch):
+    import asyncio
+    from change_feed import PollingChangeFeed
+
+    monkeypatch.setattr(database_manager, 'SELECT_PAGE_SIZE', 5)
+    monkeypatch.setattr(database_manager, '_replica_listeners', [])
+    events = []
+    feed = PollingChangeFeed(interval=5)
+    asyncio.run(feed.start(events.append))
+
+    dish = next(row for row in SUPABASE.tables['dishes'] if row['id'] == 11)
+    dish.update(name="Новое название", updated_at='2099-01-01T00:00:00+00:00')
+    SUPABASE.tables['dishes'] = [row for row in SUPABASE.tables['dishes'] if row['id'] != 10]
+    DatabaseManager.sync_replica()
+    asyncio.run(feed.stop())
+    DatabaseManager.sync_replica()
+
+    assert sorted((event.table, event.type, event.key()) for event in events) == [
+        ('dishes', 'DELETE', 10), ('dishes', 'UPDATE', 11)]
+    assert database_manager._replica_sync_interval == database_manager.REPLICA_SYNC_INTERVAL
@@ -0,0 +1,46 @@
+"""Стоп-лист из бота: одна запись в базу, каталог и экраны гостей обновляются сразу."""
+import menu_catalog
+import restaurant_bot as bot
+from conftest import ADMIN_ID, SUPABASE
+
+
+def dish_row(dish_id):
+    return next(row for row in SUPABASE.tables['dishes'] if row['id'] == dish_id)
+
+
+def menu_buttons(call_log):
+    """Названия кнопок последнего экрана, отправленного ботом"""
+    markup = call_log.telegram[-1][1]['reply_markup']
+    return [button['text'] for row in markup['inline_keyboard'] for button in row]
+
+
+def test_toggle_updates_catalog_and_guest_screens(harness, call_log):
+    catalog = menu_catalog.get_catalog('main')
+    version = catalog.version
+    menu_catalog._publish_requested.clear()
+
+    harness.run(bot.button, harness.callback('category_1'))
+    assert 'Рамен 0' in menu_buttons(call_log)
+
+    harness.run(bot.button, harness.callback('stop_toggle_10', user_id=ADMIN_ID))
+    assert dish_row(10)['is_available'] is False
+    assert catalog.dishes[10].is_available is False
+    assert catalog.version == version + 1
+    # Снимок для Mini App записывается сразу, а не при следующей проверке
+    assert menu_catalog._publish_requested.is_set()
+
+    harness.run(bot.button, harness.callback('category_1'))
+    assert 'Рамен 0' not in menu_buttons(call_log)
+    assert 10 not in [dish.id for dish in catalog.search('Рамен 0')]
+
+
+def test_bulk_message_reports_unknown_and_ambiguous_names(harness, call_log):
+    harness.run(bot.button, harness.callback('stop_bulk_0', user_id=ADMIN_ID))
+    harness.run(bot.handle_message, harness.text('кимпаб 1\nпицца\nРамен', user_id=ADMIN_ID))
+
+    reply = call_log.telegram[-1][1]['text']
+    assert 'Поставлено на стоп: 1' in reply
+    assert 'Не найдены: пицца' in reply
+    assert 'уточните: Рамен' in reply
+    assert dish_row(11)['is_available'] is False
+    assert dish_row(10)['is_available'] is True
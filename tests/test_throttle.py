@@ -0,0 +1,45 @@
+"""Двойные нажатия (throttle.py): навигация склеивается, переключатели — нет."""
+import restaurant_bot as bot
+from throttle import DOUBLE_TAP_WINDOW, UpdateThrottle
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def tap(throttle, data, clock, seconds_later=0.1):
+    """Нажать кнопку data в сообщении 1 и дождаться обработки"""
+    key = (1, 1, data)
+    allowed = throttle.begin_callback(key, repeatable=data.startswith(bot.TOGGLE_CALLBACKS))
+    if allowed:
+        throttle.end_callback(key)
+    clock.now += seconds_later
+    return allowed
+
+
+def test_navigation_repeat_right_after_finish_is_dropped():
+    clock = Clock()
+    throttle = UpdateThrottle(clock)
+    assert tap(throttle, 'category_1', clock)
+    assert not tap(throttle, 'category_1', clock)
+    clock.now += DOUBLE_TAP_WINDOW
+    assert tap(throttle, 'category_1', clock)
+
+
+def test_toggle_can_be_switched_back_at_once():
+    clock = Clock()
+    throttle = UpdateThrottle(clock)
+    for data in ('stop_toggle_10', 'filter_allergen_0', 'filter_kids', 'filter_spice'):
+        assert tap(throttle, data, clock)
+        assert tap(throttle, data, clock)
+
+
+def test_toggle_tap_while_in_flight_is_still_merged():
+    throttle = UpdateThrottle(Clock())
+    key = (1, 1, 'stop_toggle_10')
+    assert throttle.begin_callback(key, repeatable=True)
+    assert not throttle.begin_callback(key, repeatable=True)
@@ -0,0 +1,42 @@
+"""Обработка событий разных чатов одновременно (update_processor.py)."""
+import time
+
+import restaurant_bot as bot
+from conftest import ADMIN_ID, GUEST_ID
+
+
+def test_slow_database_write_does_not_block_other_chats(harness, monkeypatch):
+    update_feedback_status = bot.DatabaseManager.update_feedback_status
+
+    def slow_update(*args):
+        time.sleep(0.3)
+        return update_feedback_status(*args)
+
+    monkeypatch.setattr(bot.DatabaseManager, 'update_feedback_status', slow_update)
+    finished = harness.run_together(
+        (bot.button, harness.callback('feedback_markread_1', user_id=ADMIN_ID)),
+        (bot.button, harness.callback('menu', user_id=GUEST_ID)),
+    )
+    # Пока администратор ждет базу, гость получает меню
+    assert finished == [1, 0]
+
+
+def test_stale_menu_is_read_once_for_concurrent_guests(harness, monkeypatch):
+    fetch_categories = bot.DatabaseManager._fetch_categories
+
+    def slow_fetch(venue_id):
+        time.sleep(0.2)
+        return fetch_categories(venue_id)
+
+    monkeypatch.setattr(bot.DatabaseManager, '_fetch_categories', staticmethod(slow_fetch))
+    catalog = bot.get_catalog('main')
+    catalog._loaded_at -= catalog.ttl
+    before = bot.DatabaseManager.get_single_flight_stats()['by_key'].get('categories', {}).get('coalesced', 0)
+
+    finished = harness.run_together(*((bot.button, harness.callback('menu', user_id=GUEST_ID + number))
+                                      for number in range(3)))
+
+    stats = bot.DatabaseManager.get_single_flight_stats()['by_key']['categories']
+    assert sorted(finished) == [0, 1, 2]
+    assert stats['coalesced'] - before == 2
+    assert not catalog.is_stale()
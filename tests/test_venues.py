@@ -0,0 +1,53 @@
+"""Список заведений (DatabaseManager.get_venues) при сбоях базы и без таблицы venues."""
+import database_manager
+from conftest import SUPABASE
+from database_manager import DatabaseManager
+from menu_replica import MenuReplica
+
+
+def supabase_down(monkeypatch):
+    def execute(query):
+        raise Exception("502 Bad Gateway")
+
+    monkeypatch.setattr(SUPABASE, 'execute', execute)
+
+
+CENTER = {'id': 'center', 'name': 'Центр', 'sort_order': 1, 'updated_at': '2099-01-01T00:00:00+00:00'}
+
+
+def venue_ids():
+    return [venue.id for venue in DatabaseManager.get_venues()]
+
+
+def test_venues_are_read_from_replica_during_outage(harness, monkeypatch):
+    SUPABASE.tables['venues'].append(dict(CENTER))
+    DatabaseManager.sync_replica()
+    supabase_down(monkeypatch)
+    DatabaseManager.invalidate_cache()
+    assert venue_ids() == ['main', 'center']
+
+
+def test_outage_keeps_previous_list_and_caches_nothing(harness, monkeypatch, tmp_path):
+    SUPABASE.tables['venues'].append(dict(CENTER))
+    monkeypatch.setattr(database_manager, '_replica', MenuReplica(str(tmp_path / 'empty.sqlite3')))
+    DatabaseManager.refresh_venues()
+    assert venue_ids() == ['main', 'center']
+
+    # Кэш истек, а база не отвечает — прежний список, а не заведение по умолчанию
+    monkeypatch.setattr(database_manager._reference_cache, 'ttl', 0)
+    DatabaseManager.refresh_venues()
+    supabase_down(monkeypatch)
+    assert venue_ids() == ['main', 'center']
+    assert not DatabaseManager.venues_loaded()
+
+
+def test_missing_venues_table_means_one_venue(harness, monkeypatch, tmp_path):
+    del SUPABASE.tables['venues']
+    monkeypatch.setattr(database_manager, '_replica', MenuReplica(str(tmp_path / 'fresh.sqlite3')))
+    DatabaseManager.invalidate_cache()
+    assert venue_ids() == ['main']
+
+    # Копия без таблицы venues все равно готова к чтению
+    DatabaseManager.sync_replica()
+    assert DatabaseManager.is_replica_ready()
+    assert venue_ids() == ['main']
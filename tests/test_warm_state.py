@@ -0,0 +1,95 @@
+"""Теплый перезапуск (warm_state.py) и остановка с ограничением времени (update_processor.py)."""
+import asyncio
+import time
+
+import menu_catalog
+import restaurant_bot as bot
+import warm_state
+from conversation_state import ConversationState
+from menu_filters import MenuFilter
+from menu_snapshot import MenuSnapshot, write_snapshot
+from update_processor import ChatOrderedUpdateProcessor
+
+
+def restart(monkeypatch, tmp_path):
+    """Новый процесс: пустые состояния диалогов и каталоги, меню — только в снимке"""
+    state = ConversationState()
+    monkeypatch.setattr(warm_state, 'conversation_state', state)
+    monkeypatch.setattr(menu_catalog, '_catalogs', {})
+    monkeypatch.setattr(menu_catalog, 'menu_snapshot', MenuSnapshot(str(tmp_path / 'menu.bin')))
+    return state
+
+
+def test_state_and_menu_survive_restart(harness, call_log, monkeypatch, tmp_path):
+    monkeypatch.setattr(warm_state, 'conversation_state', bot.conversation_state)
+    bot.conversation_state.set(1, 'menu_filter', MenuFilter.parse("exclude=Яйца; max_spice=0"))
+    bot.conversation_state.set(2, 'waiting_for_stop_list', True)
+    catalog = menu_catalog.get_catalog('main')
+    venue = bot.DatabaseManager.get_venue('main')
+    write_snapshot({'main': catalog.snapshot(venue)}, str(tmp_path / 'menu.bin'))
+    assert warm_state.save_warm_state(str(tmp_path / 'state.gz')) == 2
+
+    state = restart(monkeypatch, tmp_path)
+    call_log.clear()
+    assert warm_state.restore_warm_state(str(tmp_path / 'state.gz'))
+
+    assert state.get(1, 'menu_filter').to_query() == "exclude=Яйца; max_spice=0"
+    assert state.get(2, 'waiting_for_stop_list') is True
+    restored = menu_catalog.get_catalog('main')
+    assert restored.dishes == catalog.dishes and restored.categories == catalog.categories
+    # Все поднято из файлов, база не спрашивалась
+    assert call_log.db == []
+
+
+def test_downtime_counts_against_ttl(harness, monkeypatch, tmp_path):
+    monkeypatch.setattr(warm_state, 'conversation_state', bot.conversation_state)
+    bot.conversation_state.set(1, 'waiting_for_feedback', True)
+    bot.conversation_state.set(1, 'menu_filter', MenuFilter.parse("kid_friendly"))
+    warm_state.save_warm_state(str(tmp_path / 'state.gz'))
+
+    state = restart(monkeypatch, tmp_path)
+    saved_at = time.time()
+    monkeypatch.setattr(warm_state.time, 'time', lambda: saved_at + 20 * 60)
+    # Снимка меню нет — нужен обычный прогрев, но состояния все равно восстановлены
+    assert not warm_state.restore_warm_state(str(tmp_path / 'state.gz'))
+
+    assert state.get(1, 'waiting_for_feedback') is None
+    assert state.get(1, 'menu_filter').to_query() == "kid_friendly"
+
+
+def test_missing_or_broken_file_means_cold_start(tmp_path):
+    assert not warm_state.restore_warm_state(str(tmp_path / 'missing.gz'))
+    (tmp_path / 'broken.gz').write_bytes(b"not gzip")
+    assert not warm_state.restore_warm_state(str(tmp_path / 'broken.gz'))
+
+
+def test_drain_cancels_handlers_after_deadline():
+    class Chat:
+        def __init__(self, chat_id):
+            self.effective_chat = type('Chat', (), {'id': chat_id})()
+
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor(4)
+        finished = []
+
+        async def handler(name, seconds):
+            await asyncio.sleep(seconds)
+            finished.append(name)
+
+        tasks = [
+            asyncio.create_task(processor.process_update(Chat(1), handler('quick', 0.01))),
+            asyncio.create_task(processor.process_update(Chat(2), handler('stuck', 60))),
+            # Ждет в очереди своего чата за зависшим обработчиком
+            asyncio.create_task(processor.process_update(Chat(2), handler('queued', 0.01))),
+        ]
+        await asyncio.sleep(0)
+        started_at = time.monotonic()
+        cancelled = await processor.drain(0.2)
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return cancelled, finished, time.monotonic() - started_at, processor.get_stats()
+
+    cancelled, finished, elapsed, stats = asyncio.run(scenario())
+    assert finished == ['quick']
+    assert cancelled == 2
+    assert elapsed < 1
+    assert stats['in_flight'] == 0 and stats['waiting'] == 0
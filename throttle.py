@@ -0,0 +1,155 @@
+import time
+from collections import OrderedDict
+
+# Лимиты нажатий и сообщений: скорость пополнения (в секунду) и запас
+USER_RATE = 2.0
+USER_BURST = 8
+CHAT_RATE = 5.0
+CHAT_BURST = 20
+
+# Минимальный интервал между отзывами одного пользователя (в секундах)
+FEEDBACK_COOLDOWN = 60
+
+# Нажатие считается "в обработке" не дольше этого времени, даже если
+# обработчик не отпустил его (например, упал)
+IN_FLIGHT_TIMEOUT = 30
+
+# Повтор той же кнопки сразу после обработки — тоже двойное нажатие
+DOUBLE_TAP_WINDOW = 1.0
+
+# Сколько пользователей/чатов помнить; самые давние забываются
+MAX_TRACKED = 10000
+
+
+class TokenBucket:
+    """Ведро токенов: пополняется со скоростью rate, вмещает не больше burst"""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated_at')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = now
+
+    def take(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class _BoundedMap(OrderedDict):
+    """Словарь, забывающий самые давно использованные ключи"""
+
+    def touch(self, key, factory):
+        value = self.get(key)
+        if value is None:
+            value = self[key] = factory()
+            if len(self) > MAX_TRACKED:
+                self.popitem(last=False)
+        else:
+            self.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self[key] = value
+        self.move_to_end(key)
+        if len(self) > MAX_TRACKED:
+            self.popitem(last=False)
+
+
+class UpdateThrottle:
+    """Защита от флуда перед обработчиками.
+
+    - ведра токенов на пользователя и на чат;
+    - повторное нажатие той же кнопки в том же сообщении, пока первое
+      еще обрабатывается (или сразу после него, кроме переключателей), отбрасывается;
+    - между отзывами одного пользователя должен пройти FEEDBACK_COOLDOWN.
+
+    Используется из цикла событий бота, блокировки не нужны.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._user_buckets = _BoundedMap()
+        self._chat_buckets = _BoundedMap()
+        # ключ нажатия -> (начало, конец обработки или None)
+        self._callbacks = _BoundedMap()
+        self._last_feedback = _BoundedMap()
+        self._stats = {
+            'allowed': 0,
+            'dropped_user': 0,
+            'dropped_chat': 0,
+            'merged_callbacks': 0,
+            'feedback_cooldown': 0,
+        }
+
+    def allow(self, user_id, chat_id):
+        """Можно ли обработать очередное событие от пользователя в чате"""
+        now = self._clock()
+
+        if user_id is not None:
+            bucket = self._user_buckets.touch(user_id, lambda: TokenBucket(USER_RATE, USER_BURST, now))
+            if not bucket.take(now):
+                self._stats['dropped_user'] += 1
+                return False
+
+        if chat_id is not None and chat_id != user_id:
+            bucket = self._chat_buckets.touch(chat_id, lambda: TokenBucket(CHAT_RATE, CHAT_BURST, now))
+            if not bucket.take(now):
+                self._stats['dropped_chat'] += 1
+                return False
+
+        self._stats['allowed'] += 1
+        return True
+
+    def begin_callback(self, key, repeatable=False):
+        """Отметить нажатие как начатое. False — такое же нажатие уже обрабатывается.
+
+        repeatable — кнопка-переключатель: после обработки ее можно нажать снова сразу,
+        отбрасывается только нажатие, пока первое еще обрабатывается.
+        """
+        now = self._clock()
+        state = self._callbacks.get(key)
+        if state is not None:
+            started_at, finished_at = state
+            if finished_at is None and now - started_at < IN_FLIGHT_TIMEOUT:
+                self._stats['merged_callbacks'] += 1
+                return False
+            if finished_at is not None and not repeatable and now - finished_at < DOUBLE_TAP_WINDOW:
+                self._stats['merged_callbacks'] += 1
+                return False
+        self._callbacks.put(key, (now, None))
+        return True
+
+    def end_callback(self, key):
+        state = self._callbacks.get(key)
+        if state is not None:
+            self._callbacks[key] = (state[0], self._clock())
+
+    def feedback_wait(self, user_id):
+        """Сколько секунд пользователю ждать до следующего отзыва (0 — можно отправлять)"""
+        last = self._last_feedback.get(user_id)
+        if last is None:
+            return 0
+        remaining = FEEDBACK_COOLDOWN - (self._clock() - last)
+        if remaining > 0:
+            self._stats['feedback_cooldown'] += 1
+            return int(remaining) + 1
+        return 0
+
+    def record_feedback(self, user_id):
+        self._last_feedback.put(user_id, self._clock())
+
+    def get_stats(self):
+        stats = dict(self._stats)
+        stats['in_flight'] = sum(1 for _, finished_at in self._callbacks.values() if finished_at is None)
+        stats['tracked_users'] = len(self._user_buckets)
+        return stats
+
+
+# Общий ограничитель для всего бота
+throttle = UpdateThrottle()
@@ -0,0 +1,63 @@
+import threading
+import time
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Простой кэш значений со временем жизни.
+
+    Значения обновляются либо по истечении ttl, либо явным invalidate()
+    (например, при событии об изменении строки в базе).
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._values = {}
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get(self, key, loader):
+        """Значение из кэша или loader(), если его нет или оно устарело"""
+        now = time.monotonic()
+        with self._lock:
+            value, expires_at = self._values.get(key, (_MISSING, 0))
+            if value is not _MISSING and expires_at > now:
+                self._stats['hits'] += 1
+                return value
+            self._stats['misses'] += 1
+
+        value = loader()
+        self.set(key, value)
+        return value
+
+    def has(self, key):
+        """Есть ли в кэше неустаревшее значение (без загрузки и без учета в статистике)"""
+        with self._lock:
+            _, expires_at = self._values.get(key, (_MISSING, 0))
+        return expires_at > time.monotonic()
+
+    def peek(self, key, default=None):
+        """Значение без загрузки, даже если оно устарело"""
+        with self._lock:
+            value, _ = self._values.get(key, (_MISSING, 0))
+        return default if value is _MISSING else value
+
+    def set(self, key, value):
+        with self._lock:
+            self._values[key] = (value, time.monotonic() + self.ttl)
+
+    def invalidate(self, key=None):
+        """Сбросить одно значение или весь кэш"""
+        with self._lock:
+            if key is None:
+                self._values.clear()
+            else:
+                self._values.pop(key, None)
+            self._stats['invalidations'] += 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._values)
+        return stats
@@ -0,0 +1,147 @@
+import asyncio
+import time
+from collections import deque
+
+from telegram.ext import BaseUpdateProcessor
+
+# По скольким последним событиям считать время ожидания
+WAIT_SAMPLES = 1000
+
+
+class _ChatSlot:
+    """Очередь одного чата: блокировка и число событий, которые ее ждут или держат"""
+
+    __slots__ = ('lock', 'users')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка событий с сохранением порядка внутри чата.
+
+    События разных чатов обрабатываются одновременно, но не больше
+    max_concurrent_updates сразу. События одного чата (или одного
+    пользователя, если чата нет — например, у inline-запросов) идут строго
+    по очереди, поэтому многошаговые сценарии на флагах в user_data
+    (waiting_for_feedback, waiting_for_sheet_update) работают как раньше.
+
+    Событие сначала встает в очередь своего чата и только потом занимает
+    общий слот, так что длинная очередь одного чата не занимает слоты
+    других.
+
+    Обработчики выполняются в одном цикле событий, поэтому одновременны они,
+    только пока ждут. Запросы к Supabase (клиент supabase-py синхронный)
+    обработчики делают через asyncio.to_thread; в цикле остаются чтения из
+    каталогов в памяти и локальной копии меню.
+    """
+
+    def __init__(self, max_concurrent_updates):
+        super().__init__(max_concurrent_updates)
+        self._chats = {}
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self._tasks = set()
+        self._stats = {'processed': 0, 'errors': 0, 'waiting': 0, 'max_waiting': 0, 'in_flight': 0}
+
+    @staticmethod
+    def _chat_key(update):
+        chat = getattr(update, 'effective_chat', None)
+        if chat is not None:
+            return 'chat', chat.id
+        user = getattr(update, 'effective_user', None)
+        if user is not None:
+            return 'user', user.id
+        return None
+
+    async def process_update(self, update, coroutine):
+        key = self._chat_key(update)
+        arrived_at = time.monotonic()
+        self._stats['waiting'] += 1
+        self._stats['max_waiting'] = max(self._stats['max_waiting'], self._stats['waiting'])
+
+        started = []
+        measured = self._measured(arrived_at, coroutine, started)
+        task = asyncio.current_task()
+        self._tasks.add(task)
+
+        if key is None:
+            slot = None
+        else:
+            slot = self._chats.get(key)
+            if slot is None:
+                slot = self._chats[key] = _ChatSlot()
+            slot.users += 1
+
+        try:
+            if slot is None:
+                await super().process_update(update, measured)
+            else:
+                # asyncio.Lock будит ожидающих по порядку — порядок событий чата сохраняется
+                async with slot.lock:
+                    await super().process_update(update, measured)
+        finally:
+            self._tasks.discard(task)
+            if not started:
+                # Отменено, не дождавшись очереди (например, при остановке бота)
+                self._stats['waiting'] -= 1
+                measured.close()
+                coroutine.close()
+            if slot is not None:
+                slot.users -= 1
+                if slot.users == 0:
+                    del self._chats[key]
+
+    async def _measured(self, arrived_at, coroutine, started):
+        started.append(True)
+        self._stats['waiting'] -= 1
+        self._stats['in_flight'] += 1
+        self._waits.append(time.monotonic() - arrived_at)
+        try:
+            await coroutine
+        except Exception:
+            self._stats['errors'] += 1
+            raise
+        finally:
+            self._stats['in_flight'] -= 1
+            self._stats['processed'] += 1
+
+    async def do_process_update(self, update, coroutine):
+        await coroutine
+
+    async def drain(self, timeout):
+        """Дождаться обработки уже принятых событий, но не дольше timeout секунд.
+
+        Что не успело за это время, отменяется. Возвращает число отмененных событий.
+        """
+        deadline = time.monotonic() + timeout
+        while self._tasks:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            # Пока ждем, могут прийти еще события, уже полученные от Telegram
+            await asyncio.wait(list(self._tasks), timeout=left)
+        pending = [task for task in self._tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        return len(pending)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def get_stats(self):
+        """Глубина очереди, число обрабатываемых событий и время ожидания (в мс)"""
+        stats = dict(self._stats)
+        stats['limit'] = self.max_concurrent_updates
+        stats['chats_queued'] = sum(1 for slot in self._chats.values() if slot.users > 1)
+        waits = sorted(self._waits)
+        if waits:
+            stats['wait_avg_ms'] = round(sum(waits) / len(waits) * 1000, 1)
+            stats['wait_p95_ms'] = round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1)
+            stats['wait_max_ms'] = round(waits[-1] * 1000, 1)
+        else:
+            stats['wait_avg_ms'] = stats['wait_p95_ms'] = stats['wait_max_ms'] = 0
+        return stats
@@ -0,0 +1,87 @@
+import os
+import sqlite3
+import threading
+
+from config import DATA_DIR
+from database_manager import DatabaseManager
+
+# Файл с выбранным заведением для каждого чата
+CHAT_VENUES_PATH = os.path.join(DATA_DIR, "chat_venues.sqlite3")
+
+# Префикс параметра ссылки t.me/<бот>?start=venue_<id>
+DEEP_LINK_PREFIX = "venue_"
+
+
+class ChatVenues:
+    """Какое заведение выбрано в каждом чате.
+
+    Выбор сохраняется в SQLite-файл и переживает перезапуск; в памяти
+    держится копия, поэтому определение заведения для события не ходит
+    ни в базу, ни на диск. Если в чате ничего не выбрано (или выбранного
+    заведения больше нет), используется заведение по умолчанию.
+    """
+
+    def __init__(self, path=CHAT_VENUES_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = None
+        self._selected = None
+
+    def _connect(self):
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS chat_venue (
+                    chat_id INTEGER PRIMARY KEY,
+                    venue_id TEXT NOT NULL
+                )
+            """)
+            self._connection = connection
+            self._selected = dict(connection.execute("SELECT chat_id, venue_id FROM chat_venue").fetchall())
+        return self._connection
+
+    def venue_for_chat(self, chat_id):
+        """Заведение чата (models.Venue)"""
+        with self._lock:
+            self._connect()
+            venue_id = self._selected.get(chat_id)
+        venue = DatabaseManager.get_venue(venue_id) if venue_id else None
+        return venue or DatabaseManager.get_default_venue()
+
+    def select(self, chat_id, venue_id):
+        """Выбрать заведение в чате. Возвращает заведение или None, если такого нет"""
+        venue = DatabaseManager.get_venue(venue_id)
+        if venue is None:
+            return None
+        try:
+            with self._lock:
+                self._connect().execute(
+                    "INSERT OR REPLACE INTO chat_venue (chat_id, venue_id) VALUES (?, ?)", (chat_id, venue.id)
+                )
+                self._selected[chat_id] = venue.id
+        except Exception as e:
+            print(f"❌ Ошибка при сохранении заведения чата {chat_id}: {e}")
+        return venue
+
+    def get_stats(self):
+        with self._lock:
+            self._connect()
+            counts = {}
+            for venue_id in self._selected.values():
+                counts[venue_id] = counts.get(venue_id, 0) + 1
+        return counts
+
+
+def venue_from_start_args(args):
+    """id заведения из /start venue_<id> (ссылка t.me/<бот>?start=venue_<id>) или None"""
+    if args and args[0].startswith(DEEP_LINK_PREFIX):
+        return args[0][len(DEEP_LINK_PREFIX):] or None
+    return None
+
+
+# Выбор заведений для всего процесса
+chat_venues = ChatVenues()
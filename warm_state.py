@@ -0,0 +1,130 @@
+"""Теплый перезапуск: состояние бота между запусками в локальном файле.
+
+При остановке бот записывает в DATA_DIR сжатый JSON с состояниями диалогов
+(conversation_state) и списком заведений. Остальное уже лежит рядом и
+переживает перезапуск само: меню — в снимке (menu_snapshot.py), листы,
+файлы и администраторы — в локальной копии (menu_replica.py), выбор
+заведения в чатах — в chat_venues.
+
+При запуске бот сразу поднимает заведения и состояния диалогов из файла, а
+каталоги — из снимка меню, и начинает отвечать, не дожидаясь базы. Сверка с
+базой идет в фоне (restaurant_bot.verify_warm_state): каталог увеличивает
+версию, только если меню в базе отличается от восстановленного.
+
+Для состояний хранится остаток срока жизни на момент записи; время простоя
+вычитается при восстановлении, поэтому истекшие за перезапуск ожидания
+ввода не возвращаются. Файл пишется атомарно, как снимок меню.
+"""
+import gzip
+import json
+import os
+import time
+
+from config import DATA_DIR
+from conversation_state import conversation_state
+from database_manager import DatabaseManager
+from menu_catalog import get_catalog
+from menu_filters import MenuFilter
+from models import Venue
+
+WARM_STATE_PATH = os.path.join(DATA_DIR, "warm_state.json.gz")
+
+# Версия формата файла: файл другой версии не читается, бот прогревается из базы
+WARM_STATE_FORMAT = 1
+
+# Состояния диалогов, которые нельзя записать в JSON как есть: (в строку, из строки)
+STATE_CODECS = {
+    'menu_filter': (MenuFilter.to_query, MenuFilter.parse),
+}
+
+
+def _venue_row(venue):
+    return {
+        'id': venue.id,
+        'name': venue.name,
+        'timezone': venue.timezone,
+        'table_count': venue.table_count,
+        'sort_order': venue.sort_order,
+    }
+
+
+def _encode_conversations(entries):
+    conversations = []
+    for user_id, key, value, ttl_left in entries:
+        codec = STATE_CODECS.get(key)
+        if codec is not None:
+            value = codec[0](value)
+        try:
+            json.dumps(value)
+        except (TypeError, ValueError):
+            print(f"⚠️ Состояние {key} пользователя {user_id} не сохранено: значение не записывается в JSON")
+            continue
+        conversations.append([user_id, key, value, round(ttl_left, 1)])
+    return conversations
+
+
+def _decode_conversations(conversations, downtime):
+    entries = []
+    for user_id, key, value, ttl_left in conversations:
+        codec = STATE_CODECS.get(key)
+        if codec is not None:
+            try:
+                value = codec[1](value)
+            except ValueError:
+                # Например, аллерген переименовали между запусками
+                continue
+        entries.append((user_id, key, value, ttl_left - downtime))
+    return entries
+
+
+def save_warm_state(path=WARM_STATE_PATH):
+    """Записать состояния диалогов и список заведений. Возвращает число сохраненных состояний"""
+    conversations = _encode_conversations(conversation_state.export())
+    state = {
+        'format': WARM_STATE_FORMAT,
+        'saved_at': time.time(),
+        'venues': [_venue_row(venue) for venue in DatabaseManager.get_venues()],
+        'conversations': conversations,
+    }
+    body = gzip.compress(json.dumps(state, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    return len(conversations)
+
+
+def restore_warm_state(path=WARM_STATE_PATH):
+    """Поднять состояние прошлого запуска: заведения, состояния диалогов и меню из снимка.
+
+    Возвращает True, если меню всех заведений загружено и бот может отвечать сразу;
+    иначе нужен обычный прогрев из базы (restaurant_bot.warm_up_caches).
+    """
+    try:
+        with open(path, 'rb') as f:
+            state = json.loads(gzip.decompress(f.read()))
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        print(f"❌ Ошибка при чтении сохраненного состояния {path}: {e}")
+        return False
+    if state.get('format') != WARM_STATE_FORMAT:
+        print(f"ℹ️ Сохраненное состояние другого формата ({state.get('format')}), бот прогревается из базы")
+        return False
+
+    venues = [Venue.from_row(row) for row in state['venues']]
+    DatabaseManager.restore_venues(venues)
+
+    downtime = max(0.0, time.time() - state['saved_at'])
+    restored = conversation_state.restore(_decode_conversations(state['conversations'], downtime))
+
+    loaded = sum(1 for venue in venues if get_catalog(venue.id).refresh_from_snapshot())
+    print(f"✅ Восстановлено после перезапуска: состояний диалогов {restored}, "
+          f"меню {loaded} из {len(venues)} заведений (простой {downtime:.0f} с)")
+    return bool(venues) and loaded == len(venues)
@@ -1,6 +1,16 @@
 import os
+import json
 import http.server
 import socketserver
+from urllib.parse import parse_qs, urlsplit
+
+from health import HealthMonitor, write_health_response
+from menu_changes import menu_change_log
+from menu_snapshot import menu_snapshot
+from mini_app_shell import FILTER_PARAMS, mini_app_shell
+
+# Заведение, меню которого отдается без ?venue= (как DEFAULT_VENUE в config.py)
+DEFAULT_VENUE = os.environ.get("DEFAULT_VENUE", "main")
 
 print("🔄 WEB SERVER: Starting...")
 print(f"📁 WEB SERVER: Current directory: {os.getcwd()}")
@@ -12,15 +22,104 @@ except Exception as e:
     print(f"❌ WEB SERVER: Error listing static: {e}")
 
 
+# Веб-сервер отдает только статику: готов, как только на месте папка static
+health_monitor = HealthMonitor("web")
+health_monitor.add_check("static", lambda: os.path.isfile(os.path.join('static', 'index.html')))
+health_monitor.mark_warm()
+
+
 class MyHttpRequestHandler(http.server.SimpleHTTPRequestHandler):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, directory="static", **kwargs)
 
     def do_GET(self):
-        if self.path != '/' and '.' not in self.path:
-            self.path = '/'
+        if write_health_response(self, health_monitor, self.path):
+            return
+        path = self.path.split('?', 1)[0]
+        if path == '/api/menu':
+            return self.send_menu()
+        if path == '/api/menu/changes':
+            return self.send_menu_changes()
+        if path in ('/', '/index.html') or '.' not in path:
+            return self.send_shell()
         return super().do_GET()
 
+    def send_shell(self):
+        """index.html со встроенными стилями и меню заведения (mini_app_shell.py)"""
+        query = parse_qs(urlsplit(self.path).query)
+        venue_id = query.get('venue', [DEFAULT_VENUE])[0]
+        # С фильтром в ссылке карточки рисует script.js: сервер не знает, какие из них скрыть
+        with_dishes = not any(param in query for param in FILTER_PARAMS)
+        try:
+            body, etag = mini_app_shell.render(venue_id, with_dishes)
+        except Exception as e:
+            print(f"❌ WEB SERVER: Error rendering Mini App shell: {e}")
+            self.path = '/index.html'
+            return super().do_GET()
+        self.send_cached(body, etag, 'text/html; charset=utf-8')
+
+    def send_menu(self):
+        """/api/menu?venue=<id>: меню заведения из снимка, который пишет бот (без запросов к базе)"""
+        venue_id = parse_qs(urlsplit(self.path).query).get('venue', [DEFAULT_VENUE])[0]
+        found = menu_snapshot.get_entry(venue_id)
+        if found is None:
+            # Снимка еще нет (бот не запущен) — Mini App загрузит меню из Supabase напрямую
+            self.send_error(503 if menu_snapshot.generation() is None else 404)
+            return
+
+        body, etag, version = found
+        # С какой версии Mini App будет спрашивать /api/menu/changes
+        headers = {'X-Menu-Version': str(version)} if version is not None else {}
+        self.send_cached(body, etag, 'application/json; charset=utf-8', headers)
+
+    def send_menu_changes(self):
+        """/api/menu/changes?venue=<id>&since=<версия>: блюда и категории, изменившиеся после since"""
+        query = parse_qs(urlsplit(self.path).query)
+        venue_id = query.get('venue', [DEFAULT_VENUE])[0]
+        try:
+            since = int(query['since'][0])
+        except (KeyError, ValueError):
+            self.send_error(400, "since must be an integer version")
+            return
+
+        try:
+            changes = menu_change_log.changes(venue_id, since)
+        except Exception as e:
+            print(f"❌ WEB SERVER: Error reading menu changes: {e}")
+            self.send_error(503)
+            return
+
+        body = json.dumps(changes, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_cached(self, body, etag, content_type, headers=None):
+        """Ответ с ETag: если у браузера та же версия, только 304 без тела"""
+        etag = f'"{etag}"'
+        headers = headers or {}
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        # Браузер каждый раз сверяет ETag: меню обновляется сразу после изменения в боте
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
 
 def start_web_server():
     PORT = int(os.getenv('PORT', 8000))